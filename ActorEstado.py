@@ -0,0 +1,76 @@
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class ActorEstado:
+    """Único hilo dueño del estado de recursos (patrón actor / single-writer).
+
+    Los demás hilos no tocan el almacén: le envían comandos (funciones) por una cola y
+    esperan su Future. El hilo dueño drena de una vez todo lo que llegó junto y lo
+    ejecuta en orden de llegada con una sola toma del lock, que queda solo para los
+    lectores externos (snapshot, recarga de cuotas)."""
+
+    def __init__(self, lock, nombre="DTI", al_terminar_lote=None, max_lote=256):
+        self.lock = lock
+        self.nombre = nombre
+        self.al_terminar_lote = al_terminar_lote  # Se llama dentro del lote, antes de liberar los resultados
+        self.max_lote = max_lote
+        self.cola = queue.SimpleQueue()  # (funcion, args, futuro)
+        self.lotes = 0
+        self.comandos = 0
+
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def enviar(self, funcion, *args):
+        futuro = Future()
+        self.cola.put((funcion, args, futuro))
+        return futuro
+
+    def ejecutar(self, funcion, *args):
+        """Envía el comando y espera su resultado (la excepción del comando se propaga)"""
+        if threading.current_thread() is self.hilo:
+            return funcion(*args)
+        return self.enviar(funcion, *args).result()
+
+    def notificar(self, funcion, *args):
+        """Comando sin esperar respuesta; los errores se reportan por consola"""
+        self.enviar(funcion, *args).add_done_callback(self._reportar_error)
+
+    def _reportar_error(self, futuro):
+        if futuro.exception() is not None:
+            print(f"[{self.nombre}] ❌ Error en comando sobre el estado: {futuro.exception()}")
+
+    def pendientes(self):
+        return self.cola.qsize()
+
+    def _bucle(self):
+        while True:
+            lote = [self.cola.get()]
+            while len(lote) < self.max_lote:
+                try:
+                    lote.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            resultados = []
+            with self.lock:
+                for funcion, args, futuro in lote:
+                    try:
+                        resultados.append((futuro, True, funcion(*args)))
+                    except Exception as e:
+                        resultados.append((futuro, False, e))
+                if self.al_terminar_lote:
+                    try:
+                        self.al_terminar_lote()
+                    except Exception as e:
+                        print(f"[{self.nombre}] ❌ Error cerrando lote de comandos: {e}")
+            self.lotes += 1
+            self.comandos += len(lote)
+
+            for futuro, ok, valor in resultados:
+                if ok:
+                    futuro.set_result(valor)
+                else:
+                    futuro.set_exception(valor)
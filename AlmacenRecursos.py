@@ -0,0 +1,850 @@
+import base64
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from EstadoMapeado import EstadoMapeado
+from TiposRecursos import TiposRecursos
+
+# Modos de durabilidad del WAL:
+#   "fsync"  -> un fsync por solicitud antes de responder
+#   "grupo"  -> las solicitudes que llegan dentro de la ventana comparten un fsync
+#   "buffer" -> se confía en el buffer del sistema operativo (sin fsync)
+MODOS_DURABILIDAD = ("fsync", "grupo", "buffer")
+
+# Formato binario de los snapshots:
+#   cabecera  = magic(4s) versión(H) lsn(Q) longitud_payload(I)
+#   payload   = secciones [etiqueta(4s) longitud(I) datos]
+#   cola      = crc32(I) de cabecera + payload
+SNAPSHOT_MAGIC = b"SNRC"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_CABECERA = struct.Struct("<4sHQI")
+SNAPSHOT_SECCION = struct.Struct("<4sI")
+SNAPSHOT_CRC = struct.Struct("<I")
+SECCION_CONTADORES = struct.Struct("<qq")
+# Los contadores de salones y laboratorios van en b"CONT"; los demás tipos en b"OTRO" (JSON por nombre)
+# Secciones opcionales: b"INVS" bitsets del inventario por franja (InventarioSalones.serializar)
+#                       b"RESV" reservas por rango de tiempo (IndiceReservas.serializar)
+#                       b"USOF" uso por facultad en JSON (CuotasFacultades)
+#                       b"IDEM" respuestas por id_solicitud en JSON (CacheIdempotencia.exportar)
+#                       b"ARRE" arriendos de cupo por facultad en JSON
+#                       b"OTRO" disponibles de los tipos de recurso extra en JSON
+
+SNAPSHOTS_RETENIDOS = 2  # El anterior se conserva por si el último está corrupto
+
+
+class AlmacenRecursos:
+    """Estado de recursos en memoria respaldado por un registro de escritura anticipada (WAL)"""
+
+    def __init__(self, ruta_json, nombre="DTI", recursos_iniciales=None,
+                 modo_durabilidad="grupo", ventana_grupo_ms=2, lock=None,
+                 intervalo_snapshot_s=30, max_registros_snapshot=5000, usar_estado_mapeado=False,
+                 inventario=None, reservas=None, cuotas=None, idempotencia=None, actor=None, tipos=None):
+        if modo_durabilidad not in MODOS_DURABILIDAD:
+            raise ValueError(f"Modo de durabilidad inválido: {modo_durabilidad}")
+
+        self.nombre = nombre
+        self.ruta_json = ruta_json
+        self.base = os.path.splitext(ruta_json)[0]
+        # Tipos de recurso: los disponibles son un vector en el orden del catálogo
+        self.tipos = tipos or TiposRecursos()
+        self.recursos_iniciales = recursos_iniciales or self.tipos.como_recursos(self.tipos.iniciales)
+        # Total de cada tipo: ninguna devolución puede dejar el pool por encima
+        self.totales = self.tipos.desde_recursos(self.recursos_iniciales, self.tipos.iniciales)
+
+        # Lock que protege el estado; lo comparte el servidor que usa el almacén
+        self.lock = lock or threading.Lock()
+        # Si el servidor tiene un hilo dueño del estado, la captura del snapshot se le pide a él
+        self.actor = actor
+        # Lock del descriptor del WAL (fsync vs. rotación de segmento)
+        self.lock_fd = threading.Lock()
+        # Evita que el hilo periódico y el cierre escriban el mismo snapshot a la vez
+        self.lock_snapshot = threading.Lock()
+
+        self.disponibles = self.tipos.iniciales.copy()
+        # Inventario opcional de salas concretas por franja; los contadores siguen
+        # siendo el cupo global para las solicitudes sin franja
+        self.inventario = inventario
+        # Índice opcional de reservas por rango de tiempo arbitrario
+        self.reservas = reservas
+        # Cuotas opcionales por facultad; el uso se reconstruye desde el WAL ("fac" en los registros)
+        self.cuotas = cuotas
+        # Respuestas recientes por id_solicitud para que un reintento no vuelva a asignar
+        self.idempotencia = idempotencia
+        # Arriendos de cupo (escrow): bloque ya descontado del pool que la facultad aprueba
+        # localmente. Vencimiento en hora de pared y servidor que lo concedió.
+        self.arriendos = {}  # facultad -> {"s", "l", "v", "srv"}
+        self.lsn = 0  # Número de secuencia del último registro aplicado
+        self.lsn_snapshot = 0
+
+        inicio = time.perf_counter()
+        self._recuperar()
+        self.tiempo_recuperacion_ms = (time.perf_counter() - inicio) * 1000
+
+        self.ruta_log = self._ruta_segmento(self.lsn + 1)
+        self.fd_log = os.open(self.ruta_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        # Backend opcional: contadores vivos en un archivo mapeado que los monitores
+        # locales pueden leer sin parsear JSON ni pasar por el lock del servidor
+        self.estado_mapeado = None
+        if usar_estado_mapeado:
+            self.ruta_mmap = f"{self.base}.mmap"
+            self.estado_mapeado = EstadoMapeado(self.ruta_mmap)
+            self._publicar_estado()
+            print(f"[{self.nombre}] 🗺️ Estado mapeado en memoria: {self.ruta_mmap}")
+
+        # Durabilidad
+        self.modo_durabilidad = modo_durabilidad
+        self.ventana_grupo = ventana_grupo_ms / 1000.0
+        self.lsn_durable = self.lsn
+        self.cond_durable = threading.Condition()
+        self.cerrado = False
+        self.estadisticas_commit = {"commits": 0, "registros": 0, "latencia_total_ms": 0.0}
+
+        # Snapshots periódicos
+        self.intervalo_snapshot = intervalo_snapshot_s
+        self.max_registros_snapshot = max_registros_snapshot
+
+        if self.modo_durabilidad == "grupo":
+            threading.Thread(target=self._hilo_commit_grupo, daemon=True).start()
+        threading.Thread(target=self._hilo_snapshots, daemon=True).start()
+
+        print(f"[{self.nombre}] 💾 WAL en {self.ruta_log} | Durabilidad: {self.modo_durabilidad}"
+              + (f" (ventana {ventana_grupo_ms} ms)" if self.modo_durabilidad == "grupo" else ""))
+
+    # Recuperación
+
+    def _ruta_segmento(self, primer_lsn):
+        return f"{self.base}.wal.{primer_lsn:012d}"
+
+    def _ruta_snapshot(self, lsn):
+        return f"{self.base}.snap.{lsn:012d}"
+
+    def _listar_segmentos(self):
+        """Segmentos del WAL ordenados por su primer lsn: [(primer_lsn, ruta)]"""
+        segmentos = []
+        # WAL de un solo archivo de versiones anteriores: se trata como el más antiguo
+        if os.path.exists(f"{self.base}.wal"):
+            segmentos.append((0, f"{self.base}.wal"))
+        for ruta in glob.glob(f"{self.base}.wal.*"):
+            sufijo = ruta.rsplit(".", 1)[1]
+            if sufijo.isdigit():
+                segmentos.append((int(sufijo), ruta))
+        return sorted(segmentos)
+
+    def _listar_snapshots(self):
+        """Snapshots ordenados del más nuevo al más viejo: [(lsn, ruta)]"""
+        snapshots = []
+        for ruta in glob.glob(f"{self.base}.snap.*"):
+            sufijo = ruta.rsplit(".", 1)[1]
+            if sufijo.isdigit():
+                snapshots.append((int(sufijo), ruta))
+        return sorted(snapshots, reverse=True)
+
+    def _recuperar(self):
+        """Carga el snapshot válido más reciente y reaplica solo la cola del WAL"""
+        origen = None
+        for lsn, ruta in self._listar_snapshots():
+            try:
+                self._cargar_snapshot(ruta)
+                origen = f"snapshot lsn={lsn}"
+                break
+            except ValueError as e:
+                print(f"[{self.nombre}] ⚠️ Snapshot inválido {ruta}: {e}")
+
+        if origen is None:
+            # Sin snapshots: el JSON hace de semilla (o de checkpoint de versiones anteriores)
+            if not os.path.exists(self.ruta_json):
+                with open(self.ruta_json, 'w') as f:
+                    json.dump(self.recursos_iniciales, f)
+
+            with open(self.ruta_json, 'r') as f:
+                data = json.load(f)
+
+            self.lsn = data.get("lsn", 0)
+            # Un tipo agregado al catálogo después de escrito el JSON arranca con su cantidad inicial
+            self.disponibles = self.tipos.desde_recursos(data, self.tipos.iniciales)
+            if self.cuotas and "uso_facultades" in data:
+                self.cuotas.reemplazar_uso(data["uso_facultades"])
+            origen = f"{self.ruta_json} lsn={self.lsn}"
+
+        self.lsn_snapshot = self.lsn
+
+        aplicados = 0
+        segmentos = self._listar_segmentos()
+        for i, (_, ruta) in enumerate(segmentos):
+            # Se salta el segmento si el siguiente empieza antes de nuestro lsn
+            if i + 1 < len(segmentos) and segmentos[i + 1][0] <= self.lsn + 1:
+                continue
+            aplicados += self._reaplicar_segmento(ruta)
+
+        print(f"[{self.nombre}] 🔁 Estado recuperado desde {origen} + {aplicados} registros del WAL (lsn={self.lsn})")
+
+    def _reaplicar_segmento(self, ruta):
+        aplicados = 0
+        offset_valido = 0
+        with open(ruta, 'rb') as f:
+            for linea in f:
+                try:
+                    registro = json.loads(linea)
+                except ValueError:
+                    # Cola truncada por una caída a mitad de escritura
+                    break
+                offset_valido += len(linea)
+                if registro["lsn"] <= self.lsn:
+                    continue
+                self._aplicar(registro)
+                aplicados += 1
+
+        if offset_valido < os.path.getsize(ruta):
+            print(f"[{self.nombre}] ⚠️ Registro truncado en {ruta} byte {offset_valido} - Descartando cola corrupta")
+            os.truncate(ruta, offset_valido)
+        return aplicados
+
+    def _aplicar(self, registro):
+        """Aplica un registro del WAL sobre el estado en memoria"""
+        if registro["op"] == "a":
+            self.disponibles -= self.tipos.vector(registro["s"], registro["l"], registro.get("o"), estricto=False)
+            self._consumir_cuota(registro.get("fac"), registro["s"], registro["l"])
+        elif registro["op"] == "d":
+            self.disponibles += self.tipos.vector(registro["s"], registro["l"], registro.get("o"), estricto=False)
+            self._consumir_cuota(registro.get("fac"), -registro["s"], -registro["l"])
+        elif registro["op"] == "r":
+            self._fijar_disponibles(registro["s"], registro["l"], registro.get("o", {}))
+            if self.cuotas and "u" in registro:
+                self.cuotas.reemplazar_uso(registro["u"])
+        elif registro["op"] == "i" and self.inventario:
+            try:
+                self._marcar_franjas(registro["f"], registro["s"], registro["l"])
+            except IndexError:
+                print(f"[{self.nombre}] ⚠️ Reserva lsn={registro['lsn']} fuera del inventario configurado - Ignorada")
+        elif registro["op"] == "I" and self.inventario:
+            self._cargar_inventario(base64.b64decode(registro["d"]))
+        elif registro["op"] == "v" and self.reservas:
+            self.reservas.agregar(registro["id"], registro["t"][0], registro["t"][1],
+                                  {"salones": registro["s"], "laboratorios": registro["l"]})
+        elif registro["op"] == "c" and self.reservas:
+            self.reservas.cancelar(registro["id"])
+        elif registro["op"] == "R" and self.reservas:
+            self._cargar_reservas(base64.b64decode(registro["d"]))
+        elif registro["op"] == "k" and self.idempotencia is not None:
+            self.idempotencia.guardar(registro["id"], registro["resp"], registro["v"])
+        elif registro["op"] == "K" and self.idempotencia is not None:
+            self.idempotencia.importar(registro["e"])
+        elif registro["op"] == "e":
+            self.arriendos[registro["fac"]] = {campo: registro[campo] for campo in ("s", "l", "v", "srv")}
+        elif registro["op"] == "x":
+            self.arriendos.pop(registro["fac"], None)
+        elif registro["op"] == "E":
+            self.arriendos = registro["e"]
+        self.lsn = registro["lsn"]
+
+    def _fijar_disponibles(self, salones, laboratorios, otros):
+        """Valores absolutos; los extra que no vienen (o que el catálogo no tiene) no cambian"""
+        self.disponibles[0], self.disponibles[1] = salones, laboratorios
+        for nombre, cantidad in otros.items():
+            if nombre in self.tipos.indice:
+                self.disponibles[self.tipos.indice[nombre]] = cantidad
+
+    def _campos_demanda(self, demanda):
+        """Campos del registro del WAL para un vector: s, l y los extra dispersos en "o" """
+        campos = {"s": int(demanda[0]), "l": int(demanda[1])}
+        otros = self.tipos.otros(demanda)
+        if otros:
+            campos["o"] = otros
+        return campos
+
+    def _marcar_franjas(self, franjas, salones, laboratorios):
+        self.inventario.marcar("salones", salones, franjas, True)
+        self.inventario.marcar("laboratorios", laboratorios, franjas, True)
+
+    def _cargar_inventario(self, datos):
+        try:
+            self.inventario.cargar(datos)
+        except ValueError as e:
+            # Cambió el tamaño configurado: se arranca con el inventario vacío
+            print(f"[{self.nombre}] ⚠️ {e} - Inventario reiniciado")
+
+    def _cargar_reservas(self, datos):
+        try:
+            self.reservas.cargar(datos)
+        except ValueError as e:
+            print(f"[{self.nombre}] ⚠️ {e} - Reservas por rango reiniciadas")
+
+    # Snapshots y compactación
+
+    def _serializar_snapshot(self, lsn, recursos, inventario=None, reservas=None, idempotencia=None,
+                             arriendos=None):
+        secciones = [
+            (b"CONT", SECCION_CONTADORES.pack(recursos["salones_disponibles"],
+                                              recursos["laboratorios_disponibles"]))
+        ]
+        if inventario is not None:
+            secciones.append((b"INVS", inventario))
+        if reservas is not None:
+            secciones.append((b"RESV", reservas))
+        otros = {nombre: recursos[f"{nombre}_disponibles"] for nombre in self.tipos.extras}
+        if otros:
+            secciones.append((b"OTRO", json.dumps(otros).encode()))
+        if "uso_facultades" in recursos:
+            secciones.append((b"USOF", json.dumps(recursos["uso_facultades"]).encode()))
+        if idempotencia is not None:
+            secciones.append((b"IDEM", json.dumps(idempotencia).encode()))
+        if arriendos:
+            secciones.append((b"ARRE", json.dumps(arriendos).encode()))
+        payload = b"".join(SNAPSHOT_SECCION.pack(etiqueta, len(datos)) + datos
+                           for etiqueta, datos in secciones)
+        cuerpo = SNAPSHOT_CABECERA.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, lsn, len(payload)) + payload
+        return cuerpo + SNAPSHOT_CRC.pack(zlib.crc32(cuerpo))
+
+    def _cargar_snapshot(self, ruta):
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+
+        if len(contenido) < SNAPSHOT_CABECERA.size + SNAPSHOT_CRC.size:
+            raise ValueError("archivo incompleto")
+        cuerpo, (crc,) = contenido[:-SNAPSHOT_CRC.size], SNAPSHOT_CRC.unpack(contenido[-SNAPSHOT_CRC.size:])
+        if zlib.crc32(cuerpo) != crc:
+            raise ValueError("checksum incorrecto")
+
+        magic, version, lsn, longitud = SNAPSHOT_CABECERA.unpack_from(cuerpo)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError(f"formato desconocido {magic!r} v{version}")
+
+        secciones = {}
+        offset = SNAPSHOT_CABECERA.size
+        while offset < SNAPSHOT_CABECERA.size + longitud:
+            etiqueta, largo = SNAPSHOT_SECCION.unpack_from(cuerpo, offset)
+            offset += SNAPSHOT_SECCION.size
+            secciones[etiqueta] = cuerpo[offset:offset + largo]
+            offset += largo
+
+        salones, laboratorios = SECCION_CONTADORES.unpack(secciones[b"CONT"])
+        self.disponibles = self.tipos.iniciales.copy()
+        self._fijar_disponibles(salones, laboratorios, json.loads(secciones[b"OTRO"]) if b"OTRO" in secciones else {})
+        if self.inventario and b"INVS" in secciones:
+            self._cargar_inventario(secciones[b"INVS"])
+        if self.reservas and b"RESV" in secciones:
+            self._cargar_reservas(secciones[b"RESV"])
+        if self.cuotas and b"USOF" in secciones:
+            self.cuotas.reemplazar_uso(json.loads(secciones[b"USOF"]))
+        if self.idempotencia is not None and b"IDEM" in secciones:
+            self.idempotencia.importar(json.loads(secciones[b"IDEM"]))
+        self.arriendos = json.loads(secciones[b"ARRE"]) if b"ARRE" in secciones else {}
+        self.lsn = lsn
+
+    def tomar_snapshot(self):
+        """Rota el segmento del WAL, escribe un snapshot y compacta los segmentos viejos"""
+        with self.lock_snapshot:
+            self._tomar_snapshot()
+
+    def _capturar_snapshot(self):
+        """Copia el estado y rota el segmento. Corre en el actor o con el lock tomado."""
+        if self.lsn == self.lsn_snapshot:
+            return None
+        lsn = self.lsn
+        recursos = self.obtener_recursos()
+        inventario = self.inventario.serializar() if self.inventario else None
+        reservas = self.reservas.serializar() if self.reservas else None
+        idempotencia = self.idempotencia.exportar() if self.idempotencia is not None else None
+        arriendos = dict(self.arriendos)  # Las entradas se reemplazan, nunca se modifican en el lugar
+        self._rotar_segmento()
+        return lsn, recursos, inventario, reservas, idempotencia, arriendos
+
+    def _tomar_snapshot(self):
+        if self.actor is not None:
+            captura = self.actor.ejecutar(self._capturar_snapshot)
+        else:
+            with self.lock:
+                captura = self._capturar_snapshot()
+        if captura is None:
+            return
+        lsn, recursos, inventario, reservas, idempotencia, arriendos = captura
+
+        inicio = time.perf_counter()
+        ruta = self._ruta_snapshot(lsn)
+        ruta_tmp = ruta + ".tmp"
+        with open(ruta_tmp, 'wb') as f:
+            f.write(self._serializar_snapshot(lsn, recursos, inventario, reservas, idempotencia, arriendos))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(ruta_tmp, ruta)
+
+        # Vista legible para las herramientas que leen el JSON (incluye su lsn)
+        ruta_json_tmp = self.ruta_json + ".tmp"
+        with open(ruta_json_tmp, 'w') as f:
+            json.dump(dict(recursos, lsn=lsn), f, indent=4)
+        os.replace(ruta_json_tmp, self.ruta_json)
+
+        self.lsn_snapshot = lsn
+        eliminados = self._compactar()
+        print(f"[{self.nombre}] 📸 Snapshot lsn={lsn} escrito en {(time.perf_counter() - inicio) * 1000:.2f} ms"
+              f" | Segmentos compactados: {eliminados}")
+
+    def _rotar_segmento(self):
+        """Cierra el segmento actual y abre uno nuevo. El llamador debe tener el lock."""
+        with self.lock_fd:
+            os.fsync(self.fd_log)
+            os.close(self.fd_log)
+            self.ruta_log = self._ruta_segmento(self.lsn + 1)
+            self.fd_log = os.open(self.ruta_log, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        with self.cond_durable:
+            self.lsn_durable = max(self.lsn_durable, self.lsn)
+            self.cond_durable.notify_all()
+
+    def _compactar(self):
+        """Borra snapshots viejos y los segmentos que ningún snapshot retenido necesita"""
+        snapshots = self._listar_snapshots()
+        for _, ruta in snapshots[SNAPSHOTS_RETENIDOS:]:
+            os.remove(ruta)
+        retenidos = snapshots[:SNAPSHOTS_RETENIDOS]
+        if not retenidos:
+            return 0
+        lsn_minimo = retenidos[-1][0]
+
+        eliminados = 0
+        segmentos = self._listar_segmentos()
+        for i, (_, ruta) in enumerate(segmentos[:-1]):
+            # El segmento i cubre hasta el lsn anterior al inicio del siguiente
+            if segmentos[i + 1][0] - 1 <= lsn_minimo and ruta != self.ruta_log:
+                os.remove(ruta)
+                eliminados += 1
+        return eliminados
+
+    def _hilo_snapshots(self):
+        """Toma snapshots por tiempo o por cantidad de registros para acotar el reinicio"""
+        ultimo = time.time()
+        while not self.cerrado:
+            time.sleep(1)
+            pendientes = self.lsn - self.lsn_snapshot
+            if pendientes and (pendientes >= self.max_registros_snapshot
+                               or time.time() - ultimo >= self.intervalo_snapshot):
+                try:
+                    self.tomar_snapshot()
+                except Exception as e:
+                    print(f"[{self.nombre}] ❌ Error tomando snapshot: {e}")
+                ultimo = time.time()
+
+    # WAL y durabilidad
+
+    def _registrar(self, op, **campos):
+        """Agrega un registro compacto al final del WAL"""
+        lsn = self.lsn + 1
+        registro = {"lsn": lsn, "op": op, **campos}
+        os.write(self.fd_log, (json.dumps(registro, separators=(',', ':')) + "\n").encode())
+        # Se publica el lsn solo después de escribir, así el hilo de commit nunca
+        # hace fsync "por delante" de un registro a medio escribir
+        self.lsn = lsn
+        return lsn
+
+    def _fsync_log(self):
+        with self.lock_fd:
+            # Ya cerrado: cerrar() hizo el fsync final de todo lo escrito
+            if self.fd_log is not None:
+                os.fsync(self.fd_log)
+
+    def _hilo_commit_grupo(self):
+        """Agrupa los registros que llegan dentro de la ventana en un solo fsync"""
+        while True:
+            with self.cond_durable:
+                while self.lsn <= self.lsn_durable and not self.cerrado:
+                    self.cond_durable.wait()
+                cerrado = self.cerrado
+
+            if cerrado:
+                # Último commit: nadie queda esperando un fsync que ya no va a llegar
+                objetivo = self.lsn
+                self._fsync_log()
+                with self.cond_durable:
+                    self.lsn_durable = max(self.lsn_durable, objetivo)
+                    self.cond_durable.notify_all()
+                return
+
+            # Esperar la ventana para que otras asignaciones concurrentes se sumen al lote
+            time.sleep(self.ventana_grupo)
+
+            objetivo = self.lsn
+            self._fsync_log()
+
+            with self.cond_durable:
+                self.lsn_durable = max(self.lsn_durable, objetivo)
+                self.cond_durable.notify_all()
+
+    def esperar_durable(self, lsn):
+        """Bloquea hasta que el registro lsn sea durable según el modo configurado.
+        Debe llamarse fuera del lock. Retorna (latencia_ms, tamaño_lote)."""
+        inicio = time.perf_counter()
+
+        if self.modo_durabilidad == "buffer":
+            lote = 1
+        elif self.modo_durabilidad == "fsync":
+            self._fsync_log()
+            with self.cond_durable:
+                lote = max(1, lsn - self.lsn_durable)
+                self.lsn_durable = max(self.lsn_durable, lsn)
+        else:
+            with self.cond_durable:
+                base = self.lsn_durable
+                self.cond_durable.notify_all()
+                while self.lsn_durable < lsn and not self.cerrado:
+                    self.cond_durable.wait()
+                pendiente = self.lsn_durable < lsn
+            if pendiente:
+                # Cierre en curso: el hilo de commit puede haber terminado, el fsync se hace aquí
+                self._fsync_log()
+            with self.cond_durable:
+                self.lsn_durable = max(self.lsn_durable, lsn)
+                lote = max(1, self.lsn_durable - base)
+
+        latencia_ms = (time.perf_counter() - inicio) * 1000
+        with self.cond_durable:
+            self.estadisticas_commit["commits"] += 1
+            self.estadisticas_commit["registros"] += lote
+            self.estadisticas_commit["latencia_total_ms"] += latencia_ms
+        return latencia_ms, lote
+
+    def resumen_commits(self):
+        """Promedios de latencia de commit y tamaño de lote desde el arranque"""
+        with self.cond_durable:
+            commits = self.estadisticas_commit["commits"]
+            if not commits:
+                return 0.0, 0.0
+            return (self.estadisticas_commit["latencia_total_ms"] / commits,
+                    self.estadisticas_commit["registros"] / commits)
+
+    # Operaciones sobre el estado
+
+    def _publicar_estado(self):
+        """Actualiza en el lugar los contadores del archivo mapeado, si está activo"""
+        if self.estado_mapeado:
+            self.estado_mapeado.escribir(int(self.disponibles[0]), int(self.disponibles[1]), self.lsn)
+
+    @property
+    def recursos(self):
+        """Vista por nombre del vector de disponibles ("salones_disponibles", ...)"""
+        return self.tipos.como_recursos(self.disponibles)
+
+    def obtener_recursos(self):
+        """Devuelve una copia del estado actual sin tocar disco"""
+        recursos = self.recursos
+        if self.cuotas:
+            recursos["uso_facultades"] = self.cuotas.copiar_uso()
+        return recursos
+
+    def _limites(self, facultad):
+        """Vector de lo máximo que la facultad puede tomar ahora: el pool, con salones y
+        laboratorios acotados por su cuota si hay cuotas (los tipos extra no tienen cuota)"""
+        limites = self.disponibles.copy()
+        if self.cuotas:
+            cuota = self.cuotas.limites(facultad, {"salones_disponibles": int(limites[0]),
+                                                   "laboratorios_disponibles": int(limites[1])})
+            limites[0], limites[1] = cuota["salones"], cuota["laboratorios"]
+        return limites
+
+    def _consumir_cuota(self, facultad, salones, laboratorios):
+        """Suma el uso a la cuota de la facultad. Lo que no trae facultad solo mueve el pool."""
+        if self.cuotas and facultad is not None:
+            self.cuotas.consumir(facultad, salones, laboratorios)
+
+    def asignar(self, salones, laboratorios, facultad=None, otros=None):
+        """Verifica y descuenta recursos en memoria; otros = {tipo extra: cantidad}.
+        El llamador debe tener el lock."""
+        demanda = self.tipos.vector(salones, laboratorios, otros)
+        if (demanda <= self._limites(facultad)).all():
+            self.disponibles -= demanda
+            self._consumir_cuota(facultad, salones, laboratorios)
+            lsn = self._registrar("a", **self._campos_demanda(demanda), fac=facultad)
+            self._publicar_estado()
+            return True, self.obtener_recursos(), lsn
+        return False, self.obtener_recursos(), None
+
+    def liberar(self, salones, laboratorios, facultad=None, otros=None):
+        """Devuelve al pool recursos asignados antes. Con cuotas, una facultad no puede
+        devolver más salones o laboratorios de los que tiene en uso, sin contar el saldo de
+        su arriendo abierto (ese saldo vuelve al cerrar el arriendo). Con o sin cuotas, el pool
+        de ningún tipo puede quedar por encima de su total menos los saldos arrendados.
+        El llamador debe tener el lock."""
+        try:
+            devolucion = self.tipos.vector(salones, laboratorios, otros)
+        except ValueError:
+            return False, self.obtener_recursos(), None
+        if (devolucion < 0).any() or not devolucion.any():
+            return False, self.obtener_recursos(), None
+        if self.cuotas:
+            uso = self.cuotas.uso.get(facultad, {})
+            arriendo = self.arriendos.get(facultad) or {"s": 0, "l": 0}
+            if (uso.get("salones", 0) - arriendo["s"] < salones
+                    or uso.get("laboratorios", 0) - arriendo["l"] < laboratorios):
+                return False, self.obtener_recursos(), None
+        techo = self.totales.copy()
+        for arriendo in self.arriendos.values():
+            techo[0] -= arriendo["s"]
+            techo[1] -= arriendo["l"]
+        if (self.disponibles + devolucion > techo).any():
+            return False, self.obtener_recursos(), None
+        self.disponibles += devolucion
+        self._consumir_cuota(facultad, -salones, -laboratorios)
+        lsn = self._registrar("d", **self._campos_demanda(devolucion), fac=facultad)
+        self._publicar_estado()
+        return True, self.obtener_recursos(), lsn
+
+    def asignar_lote(self, salones, laboratorios, todo_o_nada=False, facultad=None, otros=None):
+        """Evalúa un lote completo con un solo registro en el WAL; otros = lista con los tipos
+        extra de cada ítem (o None). El llamador debe tener el lock.
+        Retorna (lista de aceptados por ítem, recursos restantes, lsn o None)."""
+        # Matriz ítems x tipos: cada paso compara todos los tipos a la vez
+        demanda, validos = self.tipos.matriz(salones, laboratorios, otros)
+        # Los ítems inválidos no consumen nada y nunca se aceptan
+        demanda[~validos] = 0
+
+        n = len(demanda)
+        aceptados = np.zeros(n, dtype=bool)
+        # Con cuotas el límite de la facultad es un tope fijo para todo el lote
+        restante = self._limites(facultad)
+
+        if todo_o_nada:
+            if validos.all() and (demanda.sum(axis=0) <= restante).all():
+                aceptados[:] = True
+        else:
+            # Mejor esfuerzo en orden: con demandas no negativas las sumas acumuladas son
+            # crecientes, así que lo que cabe es siempre un prefijo; se acepta de una vez,
+            # se salta el primer ítem que no cabe y se repite con el resto
+            inicio = 0
+            while inicio < n:
+                cabe = (np.cumsum(demanda[inicio:], axis=0) <= restante).all(axis=1)
+                largo = n - inicio if cabe.all() else int(np.argmin(cabe))
+                fin = inicio + largo
+                aceptados[inicio:fin] = True
+                restante = restante - demanda[inicio:fin].sum(axis=0)
+                inicio = fin + 1
+
+        aceptados &= validos
+        total = demanda[aceptados].sum(axis=0)
+
+        lsn = None
+        if aceptados.any():
+            self.disponibles -= total
+            self._consumir_cuota(facultad, int(total[0]), int(total[1]))
+            # Para la recuperación solo importa el total del lote
+            lsn = self._registrar("a", **self._campos_demanda(total), fac=facultad)
+            self._publicar_estado()
+        return aceptados.tolist(), self.obtener_recursos(), lsn
+
+    def reemplazar(self, data):
+        """Reemplaza el estado con el recibido de un par. El llamador debe tener el lock."""
+        if data.get("tipo") == "sync_completa":
+            data = data.get("recursos", {})
+        salones = data["salones_disponibles"]
+        laboratorios = data["laboratorios_disponibles"]
+        # Los tipos que el par no conoce no vienen y conservan su valor
+        otros = {nombre: data[f"{nombre}_disponibles"] for nombre in self.tipos.extras
+                 if f"{nombre}_disponibles" in data}
+        self._fijar_disponibles(salones, laboratorios, otros)
+        campos = {"s": salones, "l": laboratorios}
+        if otros:
+            campos["o"] = otros
+        if self.cuotas and "uso_facultades" in data:
+            self.cuotas.reemplazar_uso(data["uso_facultades"])
+            self._registrar("r", **campos, u=data["uso_facultades"])
+        else:
+            self._registrar("r", **campos)
+        self._publicar_estado()
+
+    def reservar_franjas(self, salones, laboratorios, franjas, campus=None, edificio=None):
+        """Reserva salas concretas en todas las franjas pedidas, opcionalmente dentro de un
+        campus o edificio. El llamador debe tener el lock. Retorna (aceptado, {tipo: [índices]}, lsn o None)."""
+        # Las salas ya reservadas por rango en alguna de esas horas de la semana no se eligen
+        bloqueadas = self.reservas.bloqueadas_en_franjas(franjas) if self.reservas else None
+        aceptado, elegidas = self.inventario.reservar(salones, laboratorios, franjas, campus, edificio, bloqueadas)
+        if not aceptado:
+            return False, {}, None
+        lsn = self._registrar("i", f=franjas, s=elegidas["salones"], l=elegidas["laboratorios"])
+        return True, elegidas, lsn
+
+    def reservar_intervalo(self, salones, laboratorios, inicio, fin):
+        """Reserva salas concretas entre inicio y fin. El llamador debe tener el lock.
+        Retorna (id de reserva o None, {tipo: [índices]}, lsn o None)."""
+        id_reserva, elegidas = self.reservas.reservar(salones, laboratorios, inicio, fin,
+                                                      self._ocupadas_en_grilla(inicio, fin))
+        if id_reserva is None:
+            return None, {}, None
+        lsn = self._registrar("v", id=id_reserva, t=[inicio, fin],
+                              s=elegidas["salones"], l=elegidas["laboratorios"])
+        return id_reserva, elegidas, lsn
+
+    def salas_libres_intervalo(self, tipo, inicio, fin):
+        """Índices de las salas sin reserva por rango ni por franjas entre inicio y fin.
+        El llamador debe tener el lock."""
+        bloqueadas = self._ocupadas_en_grilla(inicio, fin)
+        return self.reservas.buscar_libres(tipo, inicio, fin, bloqueadas=bloqueadas and bloqueadas[tipo])
+
+    def _ocupadas_en_grilla(self, inicio, fin):
+        """{tipo: máscara} de las salas reservadas por franjas en las horas que toca el rango"""
+        if not self.inventario:
+            return None
+        return self.inventario.ocupadas_en_franjas(self.inventario.franjas_de_intervalo(inicio, fin))
+
+    def cancelar_reserva(self, id_reserva):
+        """Cancela una reserva por rango. El llamador debe tener el lock.
+        Retorna (reserva eliminada o None, lsn o None)."""
+        reserva = self.reservas.cancelar(id_reserva)
+        if reserva is None:
+            return None, None
+        return reserva, self._registrar("c", id=id_reserva)
+
+    def arrendar(self, facultad, salones, laboratorios, vence, servidor):
+        """Crea o amplía el arriendo de la facultad con lo que quepa de lo pedido y extiende su
+        vencimiento. Lo arrendado sale del pool y cuenta en la cuota como una asignación.
+        El llamador debe tener el lock. Retorna (salones, laboratorios concedidos, arriendo o None, lsn)."""
+        limites = self._limites(facultad)
+        salones = max(0, min(salones, int(limites[0])))
+        laboratorios = max(0, min(laboratorios, int(limites[1])))
+        previo = self.arriendos.get(facultad)
+        if previo is None and salones + laboratorios == 0:
+            return 0, 0, None, None
+        # Primero el descuento y después el arriendo: una caída entre ambos registros
+        # deja cupo sin usar, nunca cupo entregado dos veces
+        if salones + laboratorios:
+            self.asignar(salones, laboratorios, facultad)
+        arriendo = {
+            "s": salones + (previo["s"] if previo else 0),
+            "l": laboratorios + (previo["l"] if previo else 0),
+            "v": max(vence, previo["v"] if previo else 0),
+            "srv": servidor
+        }
+        self.arriendos[facultad] = arriendo
+        return salones, laboratorios, arriendo, self._registrar("e", fac=facultad, **arriendo)
+
+    def consumir_arriendo(self, facultad, salones, laboratorios):
+        """Registra lo que la facultad aprobó localmente. Sale del saldo del arriendo (ya estaba
+        fuera del pool); lo que el saldo no cubre, porque el arriendo se recuperó por vencido
+        antes de que llegara el informe, se cobra como una asignación normal contra pool y cuota.
+        El llamador debe tener el lock. Retorna (arriendo o None, lsn o None,
+        {"salones", "laboratorios", "aceptado"} cobrado aparte o None)."""
+        salones, laboratorios = max(0, salones), max(0, laboratorios)
+        arriendo = self.arriendos.get(facultad)
+        del_saldo_s = min(salones, arriendo["s"]) if arriendo else 0
+        del_saldo_l = min(laboratorios, arriendo["l"]) if arriendo else 0
+        lsn = None
+        if del_saldo_s + del_saldo_l:
+            arriendo = dict(arriendo, s=arriendo["s"] - del_saldo_s, l=arriendo["l"] - del_saldo_l)
+            self.arriendos[facultad] = arriendo
+            lsn = self._registrar("e", fac=facultad, **arriendo)
+
+        tardio = None
+        resto_s, resto_l = salones - del_saldo_s, laboratorios - del_saldo_l
+        if resto_s + resto_l:
+            # El saldo que lo cubría ya volvió al pool al recuperar el arriendo
+            aceptado, _, lsn_tardio = self.asignar(resto_s, resto_l, facultad)
+            if aceptado:
+                lsn = lsn_tardio
+            tardio = {"salones": resto_s, "laboratorios": resto_l, "aceptado": aceptado}
+        return arriendo, lsn, tardio
+
+    def cerrar_arriendo(self, facultad):
+        """Termina el arriendo y devuelve su saldo al pool. El llamador debe tener el lock.
+        Retorna (arriendo cerrado o None, lsn o None)."""
+        arriendo = self.arriendos.pop(facultad, None)
+        if arriendo is None:
+            return None, None
+        # Primero se borra el arriendo y después se devuelve el saldo: una caída entre
+        # ambos registros pierde ese saldo en lugar de devolverlo dos veces
+        lsn = self._registrar("x", fac=facultad)
+        if arriendo["s"] + arriendo["l"]:
+            devuelto, _, lsn_devolucion = self.liberar(arriendo["s"], arriendo["l"], facultad)
+            if devuelto:
+                lsn = lsn_devolucion
+            else:
+                print(f"[{self.nombre}] ⚠️ Saldo del arriendo de '{facultad}' mayor que su uso - No se devolvió")
+        return arriendo, lsn
+
+    def respuesta_previa(self, id_solicitud):
+        """Respuesta ya dada a este id_solicitud, o None. El llamador debe tener el lock."""
+        return self.idempotencia.obtener(id_solicitud)
+
+    def recordar_respuesta(self, id_solicitud, respuesta):
+        """Guarda la respuesta de una solicitud en la caché y en el WAL. El llamador debe tener el lock.
+        Retorna (vencimiento, lsn)."""
+        vence = self.idempotencia.guardar(id_solicitud, respuesta)
+        return vence, self._registrar("k", id=id_solicitud, v=vence, resp=respuesta)
+
+    def aplicar_sincronizacion(self, data):
+        """Aplica un mensaje de sincronización de un par. El llamador debe tener el lock."""
+        tipo = data.get("tipo")
+        if tipo == "reserva_franjas":
+            if self.inventario:
+                self._marcar_franjas(data["franjas"], data["salones"], data["laboratorios"])
+                self._registrar("i", f=data["franjas"], s=data["salones"], l=data["laboratorios"])
+        elif tipo == "inventario_completo":
+            if self.inventario:
+                self._cargar_inventario(base64.b64decode(data["datos"]))
+                self._registrar("I", d=data["datos"])
+        elif tipo == "reserva_intervalo":
+            if self.reservas:
+                self.reservas.agregar(data["id_reserva"], data["inicio"], data["fin"],
+                                      {"salones": data["salones"], "laboratorios": data["laboratorios"]})
+                self._registrar("v", id=data["id_reserva"], t=[data["inicio"], data["fin"]],
+                                s=data["salones"], l=data["laboratorios"])
+        elif tipo == "cancelacion_reserva":
+            if self.reservas and self.reservas.cancelar(data["id_reserva"]) is not None:
+                self._registrar("c", id=data["id_reserva"])
+        elif tipo == "reservas_completas":
+            if self.reservas:
+                self._cargar_reservas(base64.b64decode(data["datos"]))
+                self._registrar("R", d=data["datos"])
+        elif tipo == "idempotencia":
+            if self.idempotencia is not None:
+                self.idempotencia.guardar(data["id_solicitud"], data["respuesta"], data["vence"])
+                self._registrar("k", id=data["id_solicitud"], v=data["vence"], resp=data["respuesta"])
+        elif tipo == "idempotencia_completa":
+            if self.idempotencia is not None:
+                self.idempotencia.importar(data["entradas"])
+                self._registrar("K", e=data["entradas"])
+        elif tipo == "arriendo":
+            self.arriendos[data["facultad"]] = data["arriendo"]
+            self._registrar("e", fac=data["facultad"], **data["arriendo"])
+        elif tipo == "cierre_arriendo":
+            if self.arriendos.pop(data["facultad"], None) is not None:
+                self._registrar("x", fac=data["facultad"])
+        elif tipo == "arriendos_completos":
+            self.arriendos = data["arriendos"]
+            self._registrar("E", e=data["arriendos"])
+        else:
+            self.reemplazar(data)
+
+    def mensajes_estado_completo(self):
+        """Inventario, reservas, caché de idempotencia y arriendos para la sincronización con un par que vuelve.
+        El llamador debe tener el lock."""
+        mensajes = []
+        if self.inventario:
+            mensajes.append({"tipo": "inventario_completo",
+                             "datos": base64.b64encode(self.inventario.serializar()).decode()})
+        if self.reservas:
+            mensajes.append({"tipo": "reservas_completas",
+                             "datos": base64.b64encode(self.reservas.serializar()).decode()})
+        if self.idempotencia is not None:
+            mensajes.append({"tipo": "idempotencia_completa", "entradas": self.idempotencia.exportar()})
+        mensajes.append({"tipo": "arriendos_completos", "arriendos": dict(self.arriendos)})
+        return mensajes
+
+    def cerrar(self):
+        """Toma un snapshot final y cierra el WAL"""
+        with self.cond_durable:
+            self.cerrado = True
+            self.cond_durable.notify_all()
+        try:
+            self.tomar_snapshot()
+        finally:
+            with self.lock_fd:
+                os.fsync(self.fd_log)
+                os.close(self.fd_log)
+                self.fd_log = None
+            with self.cond_durable:
+                self.lsn_durable = max(self.lsn_durable, self.lsn)
+                self.cond_durable.notify_all()
+            if self.estado_mapeado:
+                self.estado_mapeado.cerrar()
@@ -0,0 +1,44 @@
+import numpy as np
+
+
+class ArbolFenwick:
+    """Árbol de Fenwick (binary indexed tree) sobre columnas, con una fila independiente por franja.
+
+    Suma de un rango de columnas y actualización puntual en O(log n); cada paso opera sobre
+    todas las filas pedidas a la vez, así consultar o marcar muchas franjas no agrega bucles."""
+
+    def __init__(self, valores):
+        valores = np.asarray(valores, dtype=np.int64)
+        self.filas, self.n = valores.shape
+        # arbol[:, i] (base 1) suma las columnas (i - (i & -i), i]
+        self.arbol = np.zeros((self.filas, self.n + 1), dtype=np.int64)
+        self.arbol[:, 1:] = valores
+        # Construcción en O(n): cada nodo le pasa su suma al padre
+        for i in range(1, self.n + 1):
+            padre = i + (i & -i)
+            if padre <= self.n:
+                self.arbol[:, padre] += self.arbol[:, i]
+
+    def sumar(self, filas, columnas, delta):
+        """Suma delta en las celdas (filas[k], columnas[k]); admite repetidas"""
+        filas = np.asarray(filas, dtype=np.int64)
+        indices = np.asarray(columnas, dtype=np.int64) + 1
+        delta = np.broadcast_to(np.asarray(delta, dtype=np.int64), indices.shape)
+        while len(indices):
+            np.add.at(self.arbol, (filas, indices), delta)
+            indices = indices + (indices & -indices)
+            vigentes = indices <= self.n
+            filas, indices, delta = filas[vigentes], indices[vigentes], delta[vigentes]
+
+    def prefijo(self, filas, fin):
+        """Suma de las columnas [0, fin) en cada fila pedida"""
+        total = np.zeros(len(filas), dtype=np.int64)
+        i = fin
+        while i > 0:
+            total += self.arbol[filas, i]
+            i -= i & -i
+        return total
+
+    def rango(self, filas, inicio, fin):
+        """Suma de las columnas [inicio, fin) en cada fila pedida"""
+        return self.prefijo(filas, fin) - self.prefijo(filas, inicio)
@@ -0,0 +1,76 @@
+import random
+
+
+class _Nodo:
+    __slots__ = ("inicio", "fin", "prioridad", "izq", "der")
+
+    def __init__(self, inicio, fin):
+        self.inicio = inicio
+        self.fin = fin
+        self.prioridad = random.random()
+        self.izq = None
+        self.der = None
+
+
+def _dividir(nodo, clave):
+    """Parte el árbol en (inicios < clave, inicios >= clave)"""
+    if nodo is None:
+        return None, None
+    if nodo.inicio < clave:
+        nodo.der, mayores = _dividir(nodo.der, clave)
+        return nodo, mayores
+    menores, nodo.izq = _dividir(nodo.izq, clave)
+    return menores, nodo
+
+
+def _unir(menores, mayores):
+    """Une dos árboles donde todo inicio de menores es anterior a los de mayores"""
+    if menores is None:
+        return mayores
+    if mayores is None:
+        return menores
+    if menores.prioridad > mayores.prioridad:
+        menores.der = _unir(menores.der, mayores)
+        return menores
+    mayores.izq = _unir(menores, mayores.izq)
+    return mayores
+
+
+class ArbolIntervalos:
+    """Intervalos [inicio, fin) disjuntos de una sala, ordenados por inicio en un treap.
+
+    Insertar, quitar y buscar el último intervalo que empieza antes de un instante cuestan
+    O(log n) esperado: con intervalos disjuntos, ese es el único que puede chocar con un
+    rango que termina en ese instante."""
+
+    def __init__(self):
+        self.raiz = None
+        self.cantidad = 0
+
+    def __len__(self):
+        return self.cantidad
+
+    def agregar(self, inicio, fin):
+        menores, mayores = _dividir(self.raiz, inicio)
+        self.raiz = _unir(_unir(menores, _Nodo(inicio, fin)), mayores)
+        self.cantidad += 1
+
+    def quitar(self, inicio):
+        """Quita el intervalo que empieza en inicio. Retorna True si existía."""
+        menores, resto = _dividir(self.raiz, inicio)
+        iguales, mayores = _dividir(resto, inicio + 1)
+        self.raiz = _unir(menores, mayores)
+        if iguales is None:
+            return False
+        self.cantidad -= 1
+        return True
+
+    def anterior(self, instante):
+        """(inicio, fin) del último intervalo que empieza antes de instante, o None"""
+        encontrado, nodo = None, self.raiz
+        while nodo is not None:
+            if nodo.inicio < instante:
+                encontrado, nodo = nodo, nodo.der
+            else:
+                nodo = nodo.izq
+        return None if encontrado is None else (encontrado.inicio, encontrado.fin)
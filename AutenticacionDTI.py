@@ -1,75 +1,79 @@
 import json
 import hashlib
+import hmac
 import os
 import secrets
 import base64
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import threading
+import time
+from concurrent.futures import Future
+import PoliticaKDF
+from PoolKDF import PoolSaturado
+
+# Clave de firma de los tokens de sesión, en hexadecimal. DTI y backup deben leer la misma;
+# la variable de entorno tiene prioridad sobre el archivo.
+VARIABLE_CLAVE_SESIONES = "DTI_CLAVE_SESIONES"
+LONGITUD_MINIMA_CLAVE = 32
+
+
+class ClaveSesionesInvalida(ValueError):
+    """La clave de sesiones pedida explícitamente falta o no es válida"""
+
+
+def generar_clave_sesiones(ruta="clave_sesiones.key"):
+    """Crea el archivo de clave de sesiones (solo legible por el dueño). Se copia tal cual al otro servidor."""
+    fd = os.open(ruta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(secrets.token_hex(LONGITUD_MINIMA_CLAVE))
+    print(f"[AutenticacionDTI] 🔑 Clave de sesiones creada: {ruta} - Copiarla al otro servidor")
+
 
 class AutenticacionDTI:
-    def __init__(self, archivo="autenticacion_DTI.json"):
+    def __init__(self, archivo="autenticacion_DTI.json", archivo_clave="clave_sesiones.key", duracion_token_s=3600,
+                 intervalo_recarga_s=2, pool=None, ruta_politica="politica_kdf.json", clave_requerida=False):
         self.archivo = archivo
-        self.salt_size = 32  # 256 bits
-        self.iterations = 100000  # Número de iteraciones para PBKDF2
+        # Algoritmo y costo de derivación de esta instalación. Cada credencial guarda los
+        # suyos; las derivadas con otros se re-derivan tras el próximo login exitoso.
+        self.politica = PoliticaKDF.cargar_politica(ruta_politica, nombre="AutenticacionDTI")
+        self.salt_size = self.politica["salt_size"]
+        self.iterations = self.politica["iteraciones"]
+        # Con pool (PoolKDF) la derivación de verificar_facultad corre en sus hilos/procesos
+        self.pool = pool
+
+        # Tabla en memoria ya decodificada: facultad -> (parámetros, salt, hash). Verificar no toca el
+        # disco; el archivo se relee solo si cambió su inode/mtime (revisado como mucho una
+        # vez por intervalo) o con recargar(forzar=True).
+        self.lock = threading.RLock()
+        self.datos = {}
+        self.credenciales = {}
+        self.firma_archivo = None
+        self.intervalo_recarga = intervalo_recarga_s
+        self.ultima_revision = 0.0
         self._inicializar_credenciales()
-    
-    def _generar_salt(self):
-        """Genera un salt aleatorio para cada contraseña"""
-        return secrets.token_bytes(self.salt_size)
-    
-    def _generar_clave_encriptacion(self, password, salt):
-        """Genera una clave de encriptación usando PBKDF2"""
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=self.iterations,
-        )
-        key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-        return key
+        self.recargar(forzar=True)
+
+        # Tokens de sesión: el PBKDF2 corre una vez por conexión y las solicitudes siguientes
+        # se verifican con un HMAC. DTI y backup deben compartir la misma clave para aceptar
+        # los tokens del otro tras un failover; con clave_requerida, sin ella no arranca.
+        self.archivo_clave = archivo_clave
+        self.clave_requerida = clave_requerida
+        self.duracion_token = duracion_token_s
+        self.clave_sesiones = self._cargar_clave_sesiones()
     
     def _encriptar_password(self, password):
-        """Encripta una contraseña con salt y múltiples iteraciones"""
-        # Generar salt único para esta contraseña
-        salt = self._generar_salt()
-        
-        # Crear hash con PBKDF2
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=self.iterations,
-        )
-        password_hash = kdf.derive(password.encode())
-        
-        # Combinar salt + hash para almacenamiento
-        combined = salt + password_hash
-        
-        # Codificar en base64 para almacenamiento JSON
-        return base64.b64encode(combined).decode('utf-8')
+        """Encripta una contraseña con salt único y los parámetros de la política vigente"""
+        return PoliticaKDF.codificar(password, self.politica)
     
-    def _verificar_password(self, password, hash_almacenado):
-        """Verifica una contraseña contra el hash almacenado"""
+    def _decodificar(self, hash_almacenado, data):
+        """(parámetros, salt, hash) de una credencial; las del formato anterior usan las
+        iteraciones y el tamaño de salt del encabezado del archivo"""
+        return PoliticaKDF.decodificar(hash_almacenado, data.get("iteraciones", 100000), data.get("salt_size", 32))
+
+    def _verificar_password(self, password, parametros, salt, hash_original):
+        """Verifica una contraseña contra la credencial ya decodificada"""
         try:
-            # Decodificar desde base64
-            combined = base64.b64decode(hash_almacenado.encode('utf-8'))
-            
-            # Extraer salt (primeros 32 bytes) y hash (resto)
-            salt = combined[:self.salt_size]
-            hash_original = combined[self.salt_size:]
-            
-            # Recrear el hash con la contraseña proporcionada
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=self.iterations,
-            )
-            hash_nuevo = kdf.derive(password.encode())
-            
-            # Comparar los hashes de forma segura
-            return secrets.compare_digest(hash_original, hash_nuevo)
+            # Recrear el hash con la contraseña proporcionada y comparar de forma segura
+            return PoliticaKDF.verificar(password, salt, hash_original, parametros)
             
         except Exception as e:
             print(f"[AutenticacionDTI] Error verificando password: {e}")
@@ -79,7 +83,7 @@ class AutenticacionDTI:
         """Inicializa las credenciales de las facultades si no existen"""
         if not os.path.exists(self.archivo):
             print(f"[AutenticacionDTI] Inicializando sistema de encriptación...")
-            print(f"[AutenticacionDTI] Usando PBKDF2 con {self.iterations:,} iteraciones")
+            print(f"[AutenticacionDTI] Usando {PoliticaKDF.describir(self.politica)}")
             
             # Contraseñas predefinidas para las facultades
             credenciales = {
@@ -96,61 +100,212 @@ class AutenticacionDTI:
             }
             
             # Agregar metadatos de seguridad
+            # iteraciones/salt_size del encabezado solo aplican a credenciales del formato
+            # anterior; las nuevas llevan sus propios parámetros
             archivo_datos = {
-                "version": "2.0",
-                "encriptacion": "PBKDF2-SHA256",
+                "version": "3.0",
+                "encriptacion": self.politica["kdf"],
                 "iteraciones": self.iterations,
                 "salt_size": self.salt_size,
                 "credenciales": credenciales
             }
             
-            with open(self.archivo, 'w') as f:
-                json.dump(archivo_datos, f, indent=4)
+            self._guardar(archivo_datos)
             
             print(f"[AutenticacionDTI] ✓ Archivo de credenciales encriptadas creado: {self.archivo}")
-    
-    def verificar_facultad(self, nombre_facultad, password):
-        """Verifica las credenciales de una facultad con encriptación"""
+
+    def _guardar(self, data):
+        """Escritura atómica: archivo temporal + fsync + rename, así un lector (este u otro
+        proceso) ve el archivo anterior completo o el nuevo completo"""
+        temporal = f"{self.archivo}.tmp"
+        with open(temporal, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo)
+
+    def _revisar_archivo(self):
+        """Mira si el archivo cambió como mucho una vez por intervalo"""
+        ahora = time.monotonic()
+        if ahora - self.ultima_revision < self.intervalo_recarga:
+            return
+        self.ultima_revision = ahora
+        self.recargar()
+
+    def recargar(self, forzar=False):
+        """Relee las credenciales si el archivo cambió (o siempre, con forzar=True).
+        Retorna True si se recargaron."""
         try:
+            info = os.stat(self.archivo)
+            firma = (info.st_ino, info.st_mtime_ns, info.st_size)
+            if firma == self.firma_archivo and not forzar:
+                return False
             with open(self.archivo, 'r') as f:
                 data = json.load(f)
-            
-            # Verificar estructura del archivo
-            if "credenciales" not in data:
-                print(f"[AutenticacionDTI] Error: Formato de archivo inválido")
+            credenciales = {facultad: self._decodificar(valor, data) for facultad, valor in data["credenciales"].items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # Se sigue con la tabla anterior
+            print(f"[AutenticacionDTI] ⚠️ No se pudieron cargar las credenciales de {self.archivo}: {e}")
+            return False
+        with self.lock:
+            self.datos, self.credenciales, self.firma_archivo = data, credenciales, firma
+        print(f"[AutenticacionDTI] 🔁 Credenciales cargadas: {len(credenciales)} facultades")
+        return True
+
+    def _actualizar_credencial(self, nombre_facultad, password, nueva, anterior=None):
+        """Escribe la credencial de una facultad en disco y en memoria. Retorna False si
+        nueva=False y la facultad no existe, o si se pasó anterior y la credencial ya no es esa."""
+        hash_almacenado = self._encriptar_password(password)  # La derivación va fuera del lock
+        with self.lock:
+            self.recargar()  # No pisar un cambio hecho al archivo desde afuera
+            if not nueva and nombre_facultad not in self.credenciales:
                 return False
+            if anterior is not None and self.credenciales.get(nombre_facultad) != anterior:
+                return False
+            data = json.loads(json.dumps(self.datos))
+            data.setdefault("credenciales", {})[nombre_facultad] = hash_almacenado
+            self._guardar(data)
+            info = os.stat(self.archivo)
+            self.datos = data
+            # Se publica un dict nuevo: los lectores sin lock ven la tabla anterior o la nueva
+            credenciales = dict(self.credenciales)
+            credenciales[nombre_facultad] = self._decodificar(hash_almacenado, data)
+            self.credenciales = credenciales
+            self.firma_archivo = (info.st_ino, info.st_mtime_ns, info.st_size)
+        return True
+    
+    def _cargar_clave_sesiones(self):
+        """Lee la clave compartida de firma de tokens (variable de entorno o archivo). Una clave
+        presente pero inválida, o ausente cuando se pidió explícitamente, es ClaveSesionesInvalida.
+        Si no hay ninguna se usa una clave propia de este proceso: funciona, pero los tokens no
+        sobreviven a un failover y todas las facultades vuelven al PBKDF2 a la vez."""
+        origen = VARIABLE_CLAVE_SESIONES
+        texto = os.environ.get(VARIABLE_CLAVE_SESIONES)
+        if texto is None:
+            origen = self.archivo_clave
+            try:
+                with open(self.archivo_clave, 'r') as f:
+                    texto = f.read()
+            except FileNotFoundError:
+                if self.clave_requerida:
+                    raise ClaveSesionesInvalida(
+                        f"Falta la clave de sesiones {self.archivo_clave}: crearla con "
+                        f"'python AutenticacionDTI.py --generar-clave {self.archivo_clave}' y copiarla al otro servidor"
+                    ) from None
+                print(f"[AutenticacionDTI] ❌ Sin clave de sesiones compartida ({self.archivo_clave} o "
+                      f"{VARIABLE_CLAVE_SESIONES}): los tokens no sobreviven a un failover - Crearla con "
+                      f"'python AutenticacionDTI.py --generar-clave' y copiarla a ambos servidores")
+                return secrets.token_bytes(LONGITUD_MINIMA_CLAVE)
+        try:
+            clave = bytes.fromhex(texto.strip())
+        except ValueError:
+            raise ClaveSesionesInvalida(f"Clave de sesiones inválida en {origen}: se espera hexadecimal") from None
+        if len(clave) < LONGITUD_MINIMA_CLAVE:
+            raise ClaveSesionesInvalida(f"Clave de sesiones en {origen} demasiado corta: {len(clave)} bytes "
+                                        f"(mínimo {LONGITUD_MINIMA_CLAVE})")
+        print(f"[AutenticacionDTI] 🔑 Clave de sesiones cargada desde {origen}")
+        return clave
+
+    def _firmar(self, datos):
+        return hmac.new(self.clave_sesiones, datos, hashlib.sha256).digest()
+
+    def emitir_token(self, nombre_facultad):
+        """Token de sesión firmado para una facultad ya autenticada. Retorna (token, vence)."""
+        vence = int(time.time()) + self.duracion_token
+        datos = base64.urlsafe_b64encode(json.dumps({"f": nombre_facultad, "v": vence}).encode())
+        firma = base64.urlsafe_b64encode(self._firmar(datos))
+        return (datos + b"." + firma).decode(), vence
+
+    def verificar_token(self, nombre_facultad, token):
+        """Verifica firma, facultad y vencimiento de un token sin tocar el PBKDF2"""
+        try:
+            datos, firma = token.encode().split(b".")
+            if not hmac.compare_digest(base64.urlsafe_b64decode(firma), self._firmar(datos)):
+                return False
+            contenido = json.loads(base64.urlsafe_b64decode(datos))
+        except (AttributeError, ValueError, TypeError):
+            return False
+        return contenido.get("f") == nombre_facultad and contenido.get("v", 0) > time.time()
+
+    def verificar_facultad(self, nombre_facultad, password):
+        """Verifica las credenciales de una facultad con encriptación"""
+        try:
+            self._revisar_archivo()
+            credencial = self.credenciales.get(nombre_facultad)
             
-            credenciales = data["credenciales"]
-            
-            if nombre_facultad not in credenciales:
+            if credencial is None:
                 print(f"[AutenticacionDTI] ✗ Facultad no encontrada: {nombre_facultad}")
                 return False
             
-            hash_almacenado = credenciales[nombre_facultad]
-            es_valida = self._verificar_password(password, hash_almacenado)
+            parametros, salt, hash_original = credencial
+            if self.pool is not None:
+                es_valida = self.pool.verificar(password, salt, hash_original, parametros).result()
+            else:
+                es_valida = self._verificar_password(password, parametros, salt, hash_original)
             
             if es_valida:
                 print(f"[AutenticacionDTI] ✓ Autenticación exitosa para: {nombre_facultad}")
+                if PoliticaKDF.desactualizada(parametros, salt, self.politica):
+                    self._rederivar(nombre_facultad, password, credencial)
             else:
                 print(f"[AutenticacionDTI] ✗ Autenticación fallida para: {nombre_facultad}")
             
             return es_valida
             
+        except PoolSaturado:
+            raise  # No es un fallo de credenciales: el llamador responde "Ocupado"
         except Exception as e:
             print(f"[AutenticacionDTI] Error verificando credenciales: {e}")
             return False
+
+    def verificar_facultad_diferido(self, nombre_facultad, password):
+        """Como verificar_facultad, pero sin esperar al pool. Retorna un Future[bool], ya resuelto
+        si no hizo falta derivar; PoolSaturado si el pool no tiene cupo."""
+        resuelto = Future()
+        try:
+            self._revisar_archivo()
+            credencial = self.credenciales.get(nombre_facultad)
+            if credencial is None:
+                print(f"[AutenticacionDTI] ✗ Facultad no encontrada: {nombre_facultad}")
+                resuelto.set_result(False)
+                return resuelto
+            parametros, salt, hash_original = credencial
+            future = self.pool.verificar(password, salt, hash_original, parametros)
+        except PoolSaturado:
+            raise
+        except Exception as e:
+            print(f"[AutenticacionDTI] Error verificando credenciales: {e}")
+            resuelto.set_result(False)
+            return resuelto
+
+        def terminada(future):
+            if not future.cancelled() and future.exception() is None and future.result():
+                print(f"[AutenticacionDTI] ✓ Autenticación exitosa para: {nombre_facultad}")
+                if PoliticaKDF.desactualizada(parametros, salt, self.politica):
+                    # Fuera del hilo que entrega los resultados del pool
+                    threading.Thread(target=self._rederivar, daemon=True,
+                                     args=(nombre_facultad, password, credencial)).start()
+            else:
+                print(f"[AutenticacionDTI] ✗ Autenticación fallida para: {nombre_facultad}")
+
+        future.add_done_callback(terminada)
+        return future
     
+    def _rederivar(self, nombre_facultad, password, anterior):
+        """Tras un login exitoso, vuelve a derivar la credencial con la política vigente. Solo
+        aquí se tiene la contraseña en claro; si mientras tanto cambió, no se toca."""
+        try:
+            if self._actualizar_credencial(nombre_facultad, password, nueva=False, anterior=anterior):
+                print(f"[AutenticacionDTI] 🔁 Credencial de {nombre_facultad} actualizada a "
+                      f"{PoliticaKDF.describir(self.politica)}")
+        except Exception as e:
+            # La verificación ya fue exitosa: se reintenta en el próximo login
+            print(f"[AutenticacionDTI] ⚠️ No se pudo actualizar la credencial de {nombre_facultad}: {e}")
+
     def agregar_facultad(self, nombre_facultad, password):
         """Agrega una nueva facultad al sistema"""
         try:
-            with open(self.archivo, 'r') as f:
-                data = json.load(f)
-            
-            data["credenciales"][nombre_facultad] = self._encriptar_password(password)
-            
-            with open(self.archivo, 'w') as f:
-                json.dump(data, f, indent=4)
-            
+            self._actualizar_credencial(nombre_facultad, password, nueva=True)
             print(f"[AutenticacionDTI] ✓ Facultad agregada: {nombre_facultad}")
             return True
             
@@ -161,18 +316,10 @@ class AutenticacionDTI:
     def cambiar_password(self, nombre_facultad, password_nuevo):
         """Cambia la contraseña de una facultad"""
         try:
-            with open(self.archivo, 'r') as f:
-                data = json.load(f)
-            
-            if nombre_facultad not in data["credenciales"]:
+            if not self._actualizar_credencial(nombre_facultad, password_nuevo, nueva=False):
                 print(f"[AutenticacionDTI] Facultad no encontrada: {nombre_facultad}")
                 return False
             
-            data["credenciales"][nombre_facultad] = self._encriptar_password(password_nuevo)
-            
-            with open(self.archivo, 'w') as f:
-                json.dump(data, f, indent=4)
-            
             print(f"[AutenticacionDTI] ✓ Contraseña actualizada para: {nombre_facultad}")
             return True
             
@@ -183,17 +330,18 @@ class AutenticacionDTI:
     def mostrar_info_seguridad(self):
         """Muestra información del sistema de seguridad"""
         try:
-            with open(self.archivo, 'r') as f:
-                data = json.load(f)
+            data = self.datos
             
             print("\n" + "="*50)
             print("INFORMACIÓN DE SEGURIDAD DTI")
             print("="*50)
             print(f"Versión: {data.get('version', 'N/A')}")
-            print(f"Encriptación: {data.get('encriptacion', 'N/A')}")
-            print(f"Iteraciones: {data.get('iteraciones', 'N/A'):,}")
-            print(f"Tamaño Salt: {data.get('salt_size', 'N/A')} bytes")
+            print(f"Política vigente: {PoliticaKDF.describir(self.politica)}")
+            print(f"Tamaño Salt: {self.salt_size} bytes")
             print(f"Facultades registradas: {len(data.get('credenciales', {}))}")
+            desactualizadas = sum(PoliticaKDF.desactualizada(parametros, salt, self.politica)
+                                  for parametros, salt, _ in self.credenciales.values())
+            print(f"Pendientes de actualizar (próximo login): {desactualizadas}")
             print("="*50)
             
         except Exception as e:
@@ -220,6 +368,18 @@ class AutenticacionDTI:
         for facultad, password in credenciales_texto.items():
             print(f"{facultad}: {password}")
         print("="*60)
-        print("⚠️  NOTA: Contraseñas encriptadas con PBKDF2-SHA256")
-        print(f"⚠️  Salt único por contraseña + {self.iterations:,} iteraciones")
-        print("="*60)
\ No newline at end of file
+        print(f"⚠️  NOTA: Contraseñas encriptadas con {PoliticaKDF.describir(self.politica)}")
+        print(f"⚠️  Salt único de {self.salt_size} bytes por contraseña")
+        print("="*60)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Utilidades de autenticación del DTI")
+    parser.add_argument("--generar-clave", metavar="RUTA", nargs="?", const="clave_sesiones.key",
+                        help="Crea la clave de sesiones compartida por DTI y backup")
+    args = parser.parse_args()
+    if args.generar_clave:
+        generar_clave_sesiones(args.generar_clave)
+    else:
+        parser.print_help()
\ No newline at end of file
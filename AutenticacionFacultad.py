@@ -1,56 +1,50 @@
 import json
 import hashlib
+import hmac
 import os
 import secrets
-import base64
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import PoliticaKDF
+from PoolKDF import PoolSaturado
 
 class AutenticacionFacultad:
-    def __init__(self, nombre_facultad, archivo=None):
+    MAX_CACHE = 1024  # Verificaciones exitosas recordadas (LRU)
+    TTL_CACHE_S = 300
+
+    def __init__(self, nombre_facultad, archivo=None, pool=None, ruta_politica="politica_kdf.json"):
         if archivo is None:
             archivo = f"autenticacion_Facultad_{nombre_facultad.replace(' ', '_')}.json"
         self.archivo = archivo
         self.nombre_facultad = nombre_facultad
-        self.salt_size = 32
-        self.iterations = 100000
+        # Misma política de derivación que el DTI; las credenciales con otros parámetros
+        # se re-derivan tras el próximo login exitoso
+        self.politica = PoliticaKDF.cargar_politica(ruta_politica, nombre="AutenticacionFacultad")
+        self.salt_size = self.politica["salt_size"]
+        self.iterations = self.politica["iteraciones"]
+        self.lock_archivo = threading.Lock()  # Escrituras: administración y re-derivaciones
         self._inicializar_credenciales()
-    
-    def _generar_salt(self):
-        """Genera un salt aleatorio para cada contraseña"""
-        return secrets.token_bytes(self.salt_size)
+
+        # Caché de verificaciones exitosas: (usuario, HMAC de la contraseña presentada) ->
+        # (hash almacenado, vencimiento). La clave HMAC vive solo en este proceso, así la
+        # caché no guarda nada que sirva para adivinar contraseñas. Un acierto solo vale si
+        # el hash del archivo sigue siendo el mismo, así un cambio de contraseña rige al instante.
+        self.clave_cache = secrets.token_bytes(32)
+        self.cache = OrderedDict()
+        self.lock_cache = threading.Lock()  # Las verificaciones del pool terminan en otro hilo
+        self.pool = pool  # PoolKDF para verificar_programa_diferido
     
     def _encriptar_password(self, password):
-        """Encripta una contraseña con salt y múltiples iteraciones"""
-        salt = self._generar_salt()
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=self.iterations,
-        )
-        password_hash = kdf.derive(password.encode())
-        
-        combined = salt + password_hash
-        return base64.b64encode(combined).decode('utf-8')
+        """Encripta una contraseña con salt único y los parámetros de la política vigente"""
+        return PoliticaKDF.codificar(password, self.politica)
     
-    def _verificar_password(self, password, hash_almacenado):
-        """Verifica una contraseña contra el hash almacenado"""
+    def _verificar_password(self, password, credencial):
+        """Verifica una contraseña contra la credencial decodificada (parámetros, salt, hash)"""
         try:
-            combined = base64.b64decode(hash_almacenado.encode('utf-8'))
-            salt = combined[:self.salt_size]
-            hash_original = combined[self.salt_size:]
-            
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=salt,
-                iterations=self.iterations,
-            )
-            hash_nuevo = kdf.derive(password.encode())
-            
-            return secrets.compare_digest(hash_original, hash_nuevo)
+            parametros, salt, hash_original = credencial
+            return PoliticaKDF.verificar(password, salt, hash_original, parametros)
             
         except Exception as e:
             print(f"[AutenticacionFacultad] Error verificando password: {e}")
@@ -72,41 +66,114 @@ class AutenticacionFacultad:
                 "profesor": self._encriptar_password("prof2024")
             }
             
+            # iteraciones/salt_size del encabezado solo aplican a credenciales del formato anterior
             archivo_datos = {
-                "version": "2.0",
+                "version": "3.0",
                 "facultad": self.nombre_facultad,
-                "encriptacion": "PBKDF2-SHA256",
+                "encriptacion": self.politica["kdf"],
                 "iteraciones": self.iterations,
                 "salt_size": self.salt_size,
                 "credenciales": credenciales
             }
             
-            with open(self.archivo, 'w') as f:
-                json.dump(archivo_datos, f, indent=4)
+            self._guardar(archivo_datos)
             
             print(f"[AutenticacionFacultad] ✓ Archivo encriptado creado: {self.archivo}")
+
+    def _guardar(self, data):
+        """Escritura atómica (temporal + rename): una re-derivación en segundo plano nunca
+        deja el archivo a medio escribir para el bucle que lo lee"""
+        temporal = f"{self.archivo}.tmp"
+        with open(temporal, 'w') as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo)
     
+    def _clave_cache(self, usuario, password):
+        return usuario, hmac.new(self.clave_cache, password.encode(), hashlib.sha256).digest()
+
+    def _en_cache(self, clave, hash_almacenado):
+        with self.lock_cache:
+            entrada = self.cache.get(clave)
+            if entrada is None:
+                return False
+            if entrada[0] != hash_almacenado or entrada[1] < time.monotonic():
+                del self.cache[clave]
+                return False
+            self.cache.move_to_end(clave)
+            return True
+
+    def _recordar_verificacion(self, clave, hash_almacenado):
+        with self.lock_cache:
+            self.cache[clave] = (hash_almacenado, time.monotonic() + self.TTL_CACHE_S)
+            self.cache.move_to_end(clave)
+            if len(self.cache) > self.MAX_CACHE:
+                self.cache.popitem(last=False)
+
+    def _olvidar_usuario(self, usuario):
+        with self.lock_cache:
+            for clave in [clave for clave in self.cache if clave[0] == usuario]:
+                del self.cache[clave]
+
+    def _credencial_de(self, usuario):
+        """(valor almacenado, credencial decodificada) de un usuario, o None si no existe"""
+        with open(self.archivo, 'r') as f:
+            data = json.load(f)
+        
+        if "credenciales" not in data:
+            print(f"[AutenticacionFacultad] Error: Formato de archivo inválido")
+            return None
+        
+        if usuario not in data["credenciales"]:
+            print(f"[AutenticacionFacultad] ✗ Usuario no encontrado: {usuario}")
+            return None
+        hash_almacenado = data["credenciales"][usuario]
+        return hash_almacenado, PoliticaKDF.decodificar(
+            hash_almacenado, data.get("iteraciones", 100000), data.get("salt_size", 32))
+
+    def _rederivar_si_corresponde(self, usuario, password, hash_almacenado, credencial):
+        """Tras un login exitoso, vuelve a derivar la credencial si sus parámetros no son los
+        vigentes. Si mientras tanto la contraseña cambió, no se toca."""
+        parametros, salt, _ = credencial
+        if not PoliticaKDF.desactualizada(parametros, salt, self.politica):
+            return
+        try:
+            nuevo = self._encriptar_password(password)
+            with self.lock_archivo:
+                with open(self.archivo, 'r') as f:
+                    data = json.load(f)
+                if data["credenciales"].get(usuario) != hash_almacenado:
+                    return
+                data["credenciales"][usuario] = nuevo
+                self._guardar(data)
+            self._recordar_verificacion(self._clave_cache(usuario, password), nuevo)
+            print(f"[AutenticacionFacultad] 🔁 Credencial de {usuario} actualizada a "
+                  f"{PoliticaKDF.describir(self.politica)}")
+        except Exception as e:
+            # La verificación ya fue exitosa: se reintenta en el próximo login
+            print(f"[AutenticacionFacultad] ⚠️ No se pudo actualizar la credencial de {usuario}: {e}")
+
     def verificar_programa(self, usuario, password):
-        """Verifica las credenciales de un programa académico"""
+        """Verifica las credenciales de un programa académico. Una verificación exitosa
+        repetida se resuelve desde la caché sin recalcular el PBKDF2."""
         try:
-            with open(self.archivo, 'r') as f:
-                data = json.load(f)
-            
-            if "credenciales" not in data:
-                print(f"[AutenticacionFacultad] Error: Formato de archivo inválido")
+            encontrada = self._credencial_de(usuario)
+            if encontrada is None:
                 return False
+            hash_almacenado, credencial = encontrada
             
-            credenciales = data["credenciales"]
-            
-            if usuario not in credenciales:
-                print(f"[AutenticacionFacultad] ✗ Usuario no encontrado: {usuario}")
-                return False
-            
-            hash_almacenado = credenciales[usuario]
-            es_valida = self._verificar_password(password, hash_almacenado)
+            clave = self._clave_cache(usuario, password)
+            if self._en_cache(clave, hash_almacenado):
+                print(f"[AutenticacionFacultad] ✓ Autenticación exitosa para usuario: {usuario} (caché)")
+                return True
+
+            es_valida = self._verificar_password(password, credencial)
             
             if es_valida:
+                self._recordar_verificacion(clave, hash_almacenado)
                 print(f"[AutenticacionFacultad] ✓ Autenticación exitosa para usuario: {usuario}")
+                self._rederivar_si_corresponde(usuario, password, hash_almacenado, credencial)
             else:
                 print(f"[AutenticacionFacultad] ✗ Autenticación fallida para usuario: {usuario}")
             
@@ -116,20 +183,60 @@ class AutenticacionFacultad:
             print(f"[AutenticacionFacultad] Error verificando credenciales: {e}")
             return False
     
+    def verificar_programa_diferido(self, usuario, password):
+        """Como verificar_programa, pero la derivación corre en el pool. Retorna un Future[bool],
+        ya resuelto si no hizo falta derivar; PoolSaturado si el pool no tiene cupo."""
+        resuelto = Future()
+        try:
+            encontrada = self._credencial_de(usuario)
+            if encontrada is None:
+                resuelto.set_result(False)
+                return resuelto
+            hash_almacenado, credencial = encontrada
+            
+            clave = self._clave_cache(usuario, password)
+            if self._en_cache(clave, hash_almacenado):
+                print(f"[AutenticacionFacultad] ✓ Autenticación exitosa para usuario: {usuario} (caché)")
+                resuelto.set_result(True)
+                return resuelto
+
+            parametros, salt, hash_original = credencial
+            future = self.pool.verificar(password, salt, hash_original, parametros)
+        except PoolSaturado:
+            raise
+        except Exception as e:
+            print(f"[AutenticacionFacultad] Error verificando credenciales: {e}")
+            resuelto.set_result(False)
+            return resuelto
+
+        def terminada(future):
+            if not future.cancelled() and future.exception() is None and future.result():
+                self._recordar_verificacion(clave, hash_almacenado)
+                print(f"[AutenticacionFacultad] ✓ Autenticación exitosa para usuario: {usuario}")
+                if PoliticaKDF.desactualizada(credencial[0], credencial[1], self.politica):
+                    # Fuera del hilo que entrega los resultados del pool
+                    threading.Thread(target=self._rederivar_si_corresponde, daemon=True,
+                                     args=(usuario, password, hash_almacenado, credencial)).start()
+            else:
+                print(f"[AutenticacionFacultad] ✗ Autenticación fallida para usuario: {usuario}")
+
+        future.add_done_callback(terminada)
+        return future
+    
     def agregar_usuario(self, usuario, password):
         """Agrega un nuevo usuario al sistema"""
         try:
-            with open(self.archivo, 'r') as f:
-                data = json.load(f)
-            
-            if usuario in data["credenciales"]:
-                print(f"[AutenticacionFacultad] Usuario ya existe: {usuario}")
-                return False
-            
-            data["credenciales"][usuario] = self._encriptar_password(password)
-            
-            with open(self.archivo, 'w') as f:
-                json.dump(data, f, indent=4)
+            nuevo = self._encriptar_password(password)
+            with self.lock_archivo:
+                with open(self.archivo, 'r') as f:
+                    data = json.load(f)
+                
+                if usuario in data["credenciales"]:
+                    print(f"[AutenticacionFacultad] Usuario ya existe: {usuario}")
+                    return False
+                
+                data["credenciales"][usuario] = nuevo
+                self._guardar(data)
             
             print(f"[AutenticacionFacultad] ✓ Usuario agregado: {usuario}")
             return True
@@ -141,17 +248,18 @@ class AutenticacionFacultad:
     def cambiar_password(self, usuario, password_nuevo):
         """Cambia la contraseña de un usuario"""
         try:
-            with open(self.archivo, 'r') as f:
-                data = json.load(f)
-            
-            if usuario not in data["credenciales"]:
-                print(f"[AutenticacionFacultad] Usuario no encontrado: {usuario}")
-                return False
-            
-            data["credenciales"][usuario] = self._encriptar_password(password_nuevo)
-            
-            with open(self.archivo, 'w') as f:
-                json.dump(data, f, indent=4)
+            nuevo = self._encriptar_password(password_nuevo)
+            with self.lock_archivo:
+                with open(self.archivo, 'r') as f:
+                    data = json.load(f)
+                
+                if usuario not in data["credenciales"]:
+                    print(f"[AutenticacionFacultad] Usuario no encontrado: {usuario}")
+                    return False
+                
+                data["credenciales"][usuario] = nuevo
+                self._guardar(data)
+            self._olvidar_usuario(usuario)
             
             print(f"[AutenticacionFacultad] ✓ Contraseña actualizada para: {usuario}")
             return True
@@ -188,9 +296,15 @@ class AutenticacionFacultad:
             print("="*50)
             print(f"Versión: {data.get('version', 'N/A')}")
             print(f"Encriptación: {data.get('encriptacion', 'N/A')}")
-            print(f"Iteraciones: {data.get('iteraciones', 'N/A'):,}")
-            print(f"Tamaño Salt: {data.get('salt_size', 'N/A')} bytes")
+            print(f"Política vigente: {PoliticaKDF.describir(self.politica)}")
+            print(f"Tamaño Salt: {self.politica['salt_size']} bytes")
             print(f"Usuarios registrados: {len(data.get('credenciales', {}))}")
+            desactualizadas = 0
+            for valor in data.get('credenciales', {}).values():
+                parametros, salt, _ = PoliticaKDF.decodificar(
+                    valor, data.get('iteraciones', 100000), data.get('salt_size', 32))
+                desactualizadas += PoliticaKDF.desactualizada(parametros, salt, self.politica)
+            print(f"Pendientes de actualizar (próximo login): {desactualizadas}")
             print("="*50)
             
         except Exception as e:
@@ -214,6 +328,6 @@ class AutenticacionFacultad:
         for usuario, password in credenciales_texto.items():
             print(f"Usuario: {usuario:15} | Contraseña: {password}")
         print("="*60)
-        print("⚠️  NOTA: Contraseñas encriptadas con PBKDF2-SHA256")
-        print(f"⚠️  Salt único por contraseña + {self.iterations:,} iteraciones")
+        print(f"⚠️  NOTA: Contraseñas encriptadas con {PoliticaKDF.describir(self.politica)}")
+        print(f"⚠️  Salt único de {self.salt_size} bytes por contraseña")
         print("="*60)
\ No newline at end of file
@@ -0,0 +1,62 @@
+import time
+from collections import OrderedDict
+
+
+class CacheIdempotencia:
+    """Respuestas recientes por id_solicitud, acotadas en cantidad (LRU) y en tiempo (TTL).
+
+    Los vencimientos son hora de pared para que sobrevivan a un reinicio vía WAL/snapshot
+    y signifiquen lo mismo en el par que recibe la réplica."""
+
+    def __init__(self, max_entradas=20000, ttl_s=300):
+        self.max_entradas = max_entradas
+        self.ttl = ttl_s
+        self.entradas = OrderedDict()  # id_solicitud -> (vence, respuesta), de la más vieja a la más nueva
+        self.aciertos = 0
+
+    def obtener(self, id_solicitud):
+        entrada = self.entradas.get(id_solicitud)
+        if entrada is None:
+            return None
+        vence, respuesta = entrada
+        if vence <= time.time():
+            del self.entradas[id_solicitud]
+            return None
+        self.entradas.move_to_end(id_solicitud)
+        self.aciertos += 1
+        return respuesta
+
+    def guardar(self, id_solicitud, respuesta, vence=None):
+        """Registra una respuesta. Retorna el vencimiento usado (para el WAL y la réplica)."""
+        vence = vence if vence is not None else time.time() + self.ttl
+        if vence <= time.time():
+            return vence
+        self.entradas[id_solicitud] = (vence, respuesta)
+        self.entradas.move_to_end(id_solicitud)
+        self._recortar()
+        return vence
+
+    def _recortar(self):
+        while len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+        # Las vencidas se limpian desde la más vieja mientras la cabeza esté vencida
+        ahora = time.time()
+        while self.entradas:
+            id_solicitud, (vence, _) = next(iter(self.entradas.items()))
+            if vence > ahora:
+                break
+            del self.entradas[id_solicitud]
+
+    def exportar(self):
+        """Entradas vigentes en orden LRU: [[id, vence, respuesta], ...]"""
+        ahora = time.time()
+        return [[id_solicitud, vence, respuesta]
+                for id_solicitud, (vence, respuesta) in self.entradas.items() if vence > ahora]
+
+    def importar(self, entradas):
+        """Suma entradas exportadas por un snapshot o por el par"""
+        for id_solicitud, vence, respuesta in entradas:
+            self.guardar(id_solicitud, respuesta, vence)
+
+    def __len__(self):
+        return len(self.entradas)
@@ -0,0 +1,143 @@
+import heapq
+import json
+import os
+import threading
+import time
+from collections import deque
+
+POR_DEFECTO = "_por_defecto"
+SIN_FACULTAD = "(sin facultad)"
+
+
+class ColaJusta:
+    """Cola de solicitudes con reparto justo ponderado entre facultades (WFQ auto-sincronizado).
+
+    Cada facultad tiene su propia cola. Al encolar, la solicitud recibe una etiqueta de
+    fin virtual = max(tiempo virtual, fin de la anterior de su facultad) + costo / peso,
+    y siempre se despacha la cabeza con la etiqueta menor. Una facultad que inunda el
+    servidor solo alarga su propia cola; las demás siguen pasando a su ritmo."""
+
+    def __init__(self, ruta_pesos, nombre="DTI", intervalo_recarga_s=2):
+        self.ruta_pesos = ruta_pesos
+        self.nombre = nombre
+        self.intervalo_recarga = intervalo_recarga_s
+        self.pesos = {}
+        self.mtime = None
+        self.ultima_revision = 0.0
+
+        self.colas = {}  # facultad -> deque[(fin_virtual, llegada, item)]
+        self.ultimo_fin = {}  # facultad -> etiqueta de su última solicitud encolada
+        self.cabezas = []  # heap [(fin_virtual, secuencia, facultad)] de colas no vacías
+        self.tiempo_virtual = 0.0
+        self.secuencia = 0
+        self.total = 0
+
+        # Métricas por facultad desde el último reporte
+        self.lock_metricas = threading.Lock()
+        self.metricas = {}
+        self.esperas_recientes = deque(maxlen=1000)  # Para el p99 del endpoint de salud
+
+        self._revisar_pesos()
+
+    @staticmethod
+    def clasificar(mensaje):
+        """Facultad, costo y solicitud ya parseada (None si no es válida) de un mensaje crudo.
+        Un lote cuesta lo que sus solicitudes."""
+        try:
+            solicitud = json.loads(mensaje)
+        except ValueError:
+            return SIN_FACULTAD, 1, None
+        if not isinstance(solicitud, dict):
+            return SIN_FACULTAD, 1, None
+        costo = len(solicitud.get("solicitudes", [])) if solicitud.get("tipo") == "lote" else 1
+        return solicitud.get("facultad") or SIN_FACULTAD, max(1, costo), solicitud
+
+    def _revisar_pesos(self):
+        """Recarga los pesos si el archivo cambió (como mucho una vez por intervalo)"""
+        ahora = time.monotonic()
+        if ahora - self.ultima_revision < self.intervalo_recarga:
+            return
+        self.ultima_revision = ahora
+        try:
+            mtime = os.path.getmtime(self.ruta_pesos)
+            if mtime == self.mtime:
+                return
+            with open(self.ruta_pesos, 'r') as f:
+                self.pesos = json.load(f)
+            self.mtime = mtime
+            print(f"[{self.nombre}] ⚖️ Pesos de reparto cargados: {self.pesos}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[{self.nombre}] ⚠️ No se pudieron cargar los pesos de {self.ruta_pesos}: {e}")
+
+    def _peso(self, facultad):
+        peso = self.pesos.get(facultad, self.pesos.get(POR_DEFECTO, 1))
+        return peso if peso > 0 else 1
+
+    def encolar(self, facultad, item, costo=1):
+        self._revisar_pesos()
+        inicio = max(self.tiempo_virtual, self.ultimo_fin.get(facultad, 0.0))
+        fin = inicio + costo / self._peso(facultad)
+        self.ultimo_fin[facultad] = fin
+
+        cola = self.colas.setdefault(facultad, deque())
+        cola.append((fin, time.perf_counter(), item))
+        if len(cola) == 1:
+            self._empujar_cabeza(facultad)
+        self.total += 1
+
+    def _empujar_cabeza(self, facultad):
+        self.secuencia += 1
+        heapq.heappush(self.cabezas, (self.colas[facultad][0][0], self.secuencia, facultad))
+
+    def desencolar(self):
+        """Saca la solicitud con la menor etiqueta de fin. Retorna (facultad, item, espera_ms)."""
+        _, _, facultad = heapq.heappop(self.cabezas)
+        cola = self.colas[facultad]
+        fin, llegada, item = cola.popleft()
+        self.tiempo_virtual = fin
+        if cola:
+            self._empujar_cabeza(facultad)
+        else:
+            del self.colas[facultad]
+        self.total -= 1
+
+        espera_ms = (time.perf_counter() - llegada) * 1000
+        with self.lock_metricas:
+            metrica = self.metricas.setdefault(facultad, {"atendidas": 0, "espera_total_ms": 0.0, "espera_max_ms": 0.0})
+            metrica["atendidas"] += 1
+            metrica["espera_total_ms"] += espera_ms
+            metrica["espera_max_ms"] = max(metrica["espera_max_ms"], espera_ms)
+            self.esperas_recientes.append(espera_ms)
+        return facultad, item, espera_ms
+
+    def __len__(self):
+        return self.total
+
+    def profundidades(self):
+        return {facultad: len(cola) for facultad, cola in list(self.colas.items())}
+
+    def espera_p99_ms(self):
+        """p99 de la espera en cola de las últimas solicitudes despachadas"""
+        with self.lock_metricas:
+            esperas = sorted(self.esperas_recientes)
+        return esperas[int(len(esperas) * 0.99)] if esperas else 0.0
+
+    def reporte(self):
+        """Profundidad y espera por facultad desde el último reporte (reinicia las métricas)"""
+        with self.lock_metricas:
+            metricas, self.metricas = self.metricas, {}
+        profundidades = self.profundidades()
+        reporte = {}
+        for facultad in sorted(set(metricas) | set(profundidades)):
+            metrica = metricas.get(facultad, {"atendidas": 0, "espera_total_ms": 0.0, "espera_max_ms": 0.0})
+            atendidas = metrica["atendidas"]
+            reporte[facultad] = {
+                "en_cola": profundidades.get(facultad, 0),
+                "atendidas": atendidas,
+                "espera_media_ms": metrica["espera_total_ms"] / atendidas if atendidas else 0.0,
+                "espera_max_ms": metrica["espera_max_ms"],
+                "peso": self._peso(facultad)
+            }
+        return reporte
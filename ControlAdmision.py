@@ -0,0 +1,63 @@
+import math
+import time
+
+
+class ControlAdmision:
+    """Descarte temprano por demora en cola al estilo CoDel.
+
+    Mientras la espera de las solicitudes que salen de la cola se mantenga por encima
+    del objetivo durante todo un intervalo, el servidor entra en modo de descarte y
+    responde "Ocupado" a algunas, cada vez más seguido (intervalo / sqrt(n)). Apenas
+    una solicitud sale con espera bajo el objetivo, se vuelve a atender todo."""
+
+    def __init__(self, objetivo_ms=100, intervalo_ms=500):
+        self.objetivo = objetivo_ms / 1000.0
+        self.intervalo = intervalo_ms / 1000.0
+        self.primera_sobre_objetivo = 0.0
+        self.descartando = False
+        self.descartes = 0
+        self.proximo_descarte = 0.0
+        self.total_descartes = 0
+
+    def _control(self, descartes):
+        return self.intervalo / math.sqrt(descartes)
+
+    def debe_rechazar(self, espera_ms, quedan_en_cola):
+        """Decide al desencolar si la solicitud se atiende o se rechaza con "Ocupado" """
+        ahora = time.monotonic()
+        espera = espera_ms / 1000.0
+
+        # Nunca se descarta si la espera es buena o si la cola ya se vació
+        if espera < self.objetivo or not quedan_en_cola:
+            self.primera_sobre_objetivo = 0.0
+            sobre_objetivo = False
+        elif not self.primera_sobre_objetivo:
+            self.primera_sobre_objetivo = ahora + self.intervalo
+            sobre_objetivo = False
+        else:
+            sobre_objetivo = ahora >= self.primera_sobre_objetivo
+
+        if self.descartando:
+            if not sobre_objetivo:
+                self.descartando = False
+                return False
+            if ahora >= self.proximo_descarte:
+                self.descartes += 1
+                self.proximo_descarte += self._control(self.descartes)
+                self.total_descartes += 1
+                return True
+            return False
+
+        if sobre_objetivo:
+            self.descartando = True
+            # Si se acaba de salir del modo de descarte, se retoma cerca del ritmo anterior
+            reciente = ahora - self.proximo_descarte < 16 * self.intervalo
+            self.descartes = self.descartes - 2 if reciente and self.descartes > 2 else 1
+            self.proximo_descarte = ahora + self._control(self.descartes)
+            self.total_descartes += 1
+            return True
+        return False
+
+    def reintentar_en_ms(self, espera_ms):
+        """Sugerencia para el cliente: lo que tarda en vaciarse la demora actual"""
+        return int(max(self.intervalo * 1000, espera_ms))
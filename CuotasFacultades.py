@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+
+TIPOS = ("salones", "laboratorios")
+CLAVE_DISPONIBLE = {"salones": "salones_disponibles", "laboratorios": "laboratorios_disponibles"}
+POR_DEFECTO = "_por_defecto"
+
+
+class CuotasFacultades:
+    """Cuotas por facultad sobre el pool global: una parte garantizada y un máximo de ráfaga.
+
+    Una facultad puede tomar hasta su máximo mientras al pool le quede lo que las demás
+    tienen garantizado y aún no usan. Ese total se mantiene incremental, así que la
+    admisión es aritmética O(1) dentro del lock del servidor, sin recorrer facultades."""
+
+    def __init__(self, ruta, lock, nombre="DTI", intervalo_recarga_s=2):
+        self.ruta = ruta
+        self.lock = lock  # El mismo lock del servidor que protege el pool
+        self.nombre = nombre
+        self.config = {}
+        self.uso = {}  # facultad -> {tipo: unidades asignadas}
+        self.reserva_pendiente = {tipo: 0 for tipo in TIPOS}  # Garantías aún no usadas (todas las facultades)
+        self.mtime = None
+
+        self.recargar()
+        threading.Thread(target=self._vigilar_archivo, args=(intervalo_recarga_s,), daemon=True).start()
+
+    # Configuración
+
+    def _cuota(self, facultad):
+        cuota = self.config.get(facultad) or self.config.get(POR_DEFECTO) or {}
+        garantizado = cuota.get("garantizado", {})
+        maximo = cuota.get("maximo", {})
+        return ({tipo: garantizado.get(tipo, 0) for tipo in TIPOS},
+                {tipo: maximo.get(tipo, float("inf")) for tipo in TIPOS})
+
+    def _pendiente(self, facultad, tipo):
+        garantizado, _ = self._cuota(facultad)
+        return max(0, garantizado[tipo] - self.uso.get(facultad, {}).get(tipo, 0))
+
+    def _recalcular_reserva(self):
+        facultades = set(self.uso) | {f for f in self.config if f != POR_DEFECTO}
+        self.reserva_pendiente = {tipo: sum(self._pendiente(f, tipo) for f in facultades) for tipo in TIPOS}
+
+    def recargar(self):
+        """Relee el archivo de cuotas. Si falla se conserva la configuración anterior."""
+        try:
+            mtime = os.path.getmtime(self.ruta)
+            with open(self.ruta, 'r') as f:
+                config = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            print(f"[{self.nombre}] ⚠️ No se pudo recargar {self.ruta}: {e}")
+            return False
+
+        with self.lock:
+            self.config = config
+            self.mtime = mtime
+            self._recalcular_reserva()
+        print(f"[{self.nombre}] 📋 Cuotas cargadas para {len([f for f in config if f != POR_DEFECTO])} facultades "
+              f"(garantías pendientes: {self.reserva_pendiente})")
+        return True
+
+    def _vigilar_archivo(self, intervalo):
+        """Recarga las cuotas en caliente cuando cambia el archivo"""
+        while True:
+            time.sleep(intervalo)
+            try:
+                if os.path.getmtime(self.ruta) != self.mtime:
+                    self.recargar()
+            except OSError:
+                pass
+
+    # Admisión. Todo lo que sigue se llama con el lock del servidor tomado.
+
+    def limite(self, facultad, tipo, disponible):
+        """Máximo que la facultad puede tomar ahora de un tipo de recurso"""
+        garantizado, maximo = self._cuota(facultad)
+        usado = self.uso.get(facultad, {}).get(tipo, 0)
+        propio = max(0, garantizado[tipo] - usado)
+        # Lo que queda del pool después de apartar las garantías de las demás facultades
+        libre = disponible - (self.reserva_pendiente[tipo] - propio)
+        return max(0, min(maximo[tipo] - usado, disponible, max(libre, propio)))
+
+    def limites(self, facultad, recursos):
+        return {tipo: self.limite(facultad, tipo, recursos[CLAVE_DISPONIBLE[tipo]]) for tipo in TIPOS}
+
+    def consumir(self, facultad, salones, laboratorios):
+        """Suma el uso de la facultad y actualiza las garantías pendientes en O(1)"""
+        uso = self.uso.setdefault(facultad, {tipo: 0 for tipo in TIPOS})
+        for tipo, cantidad in (("salones", salones), ("laboratorios", laboratorios)):
+            antes = self._pendiente(facultad, tipo)
+            uso[tipo] += cantidad
+            self.reserva_pendiente[tipo] += self._pendiente(facultad, tipo) - antes
+
+    def copiar_uso(self):
+        return {facultad: dict(uso) for facultad, uso in self.uso.items()}
+
+    def reemplazar_uso(self, uso):
+        # "null" es la clave que dejaron en el JSON las asignaciones sin facultad
+        self.uso = {facultad: dict(valores) for facultad, valores in uso.items() if facultad not in (None, "null")}
+        self._recalcular_reserva()
+
+    def resumen(self):
+        """Uso, garantía y máximo por facultad para el reporte de consumo"""
+        facultades = sorted(set(self.uso) | {f for f in self.config if f != POR_DEFECTO})
+        resumen = {}
+        for facultad in facultades:
+            garantizado, maximo = self._cuota(facultad)
+            resumen[facultad] = {
+                "uso": {tipo: self.uso.get(facultad, {}).get(tipo, 0) for tipo in TIPOS},
+                "garantizado": garantizado,
+                "maximo": {tipo: None if valor == float("inf") else valor for tipo, valor in maximo.items()}
+            }
+        return resumen
@@ -1,16 +1,64 @@
+import argparse
 import zmq
+import zmq.asyncio
+import asyncio
 import json
-import os
+import queue
 import threading
 import time
-from AutenticacionDTI import AutenticacionDTI
+import uuid
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from AutenticacionDTI import AutenticacionDTI, ClaveSesionesInvalida
+from PoolKDF import PoolKDF, PoolSaturado
+from AlmacenRecursos import AlmacenRecursos, MODOS_DURABILIDAD
+from InventarioSalones import InventarioSalones
+from IndiceReservas import IndiceReservas
+from CuotasFacultades import CuotasFacultades
+from ColaJusta import ColaJusta, SIN_FACULTAD
+from ControlAdmision import ControlAdmision
+from CacheIdempotencia import CacheIdempotencia
+from ActorEstado import ActorEstado
+from ListaEspera import ListaEspera
+from TiposRecursos import TiposRecursos
+
+# Primer frame del sobre de una solicitud en modo ticket: la decisión se publica, no se responde
+SOBRE_TICKET = b"TICKET"
 
 class DTI:
-    def __init__(self, puerto_rep=6000, backup_ip="10.43.102.243", backup_port=6006):
+    # Consultas sin efecto sobre el estado: no pasan por la caché de idempotencia
+    TIPOS_CONSULTA = ("salas_libres", "uso_facultades", "disponibilidad", "recargar_credenciales")
+    # Arriendos de cupo: duración pedida por defecto y máxima, y gracia antes de recuperar
+    # un arriendo vencido (la facultad deja de aprobar localmente antes de que venza)
+    DURACION_ARRIENDO_S = 60
+    MAX_DURACION_ARRIENDO_S = 300
+    GRACIA_ARRIENDO_S = 10
+    REINTENTO_KDF_MS = 200  # Espera sugerida cuando el pool de verificación está lleno
+
+    def __init__(self, puerto_rep=6000, backup_ip="10.43.102.243", backup_port=6006,
+                 modo_durabilidad="grupo", ventana_grupo_ms=2, usar_estado_mapeado=False,
+                 modo_servidor="rep", num_workers=4, puerto_pub=6001, puerto_salud=6010,
+                 workers_kdf=0, tipo_pool_kdf="procesos", archivo_clave_sesiones=None):
+        inicio_arranque = time.perf_counter()
         self.context = zmq.Context()
-        self.receptor = self.context.socket(zmq.REP)
+
+        # "rep": un solo hilo atiende de a una | "rep-simple": lo mismo con un socket REP, sin cola justa
+        # ni CoDel (línea base de las comparaciones) | "workers": ROUTER al frente de un pool de workers
+        # "asyncio": solicitudes, sincronización, healthcheck y timers como corrutinas de un solo event loop
+        self.modo_servidor = modo_servidor
+        self.num_workers = num_workers
+        self.es_asyncio = modo_servidor == "asyncio"
+        # Los sockets de entrada del modo asyncio comparten el mismo contexto ZMQ (shadow)
+        contexto_entrada = zmq.asyncio.Context.shadow(self.context) if self.es_asyncio else self.context
+        # ROUTER en los demás modos: lo que llega se drena a la cola justa (los REQ no cambian)
+        self.receptor = contexto_entrada.socket(zmq.REP if modo_servidor == "rep-simple" else zmq.ROUTER)
         self.receptor.bind(f"tcp://*:{puerto_rep}")
 
+        # PUB de decisiones del modo ticket; tópico = nombre de la facultad
+        self.publicador = contexto_entrada.socket(zmq.PUB)
+        self.publicador.bind(f"tcp://*:{puerto_pub}")
+        print(f"[DTI] 📣 Decisiones del modo ticket en PUB puerto {puerto_pub}")
+
         # Este servidor debe usar la ip 10.43.103.206
 
         # Socket PUSH para sincronizar con el backup
@@ -18,77 +66,176 @@ class DTI:
         self.push_backup.connect(f"tcp://{backup_ip}:{backup_port}")
 
         # Socket PULL para recibir sincronización desde backup
-        self.pull_backup_sync = self.context.socket(zmq.PULL)
+        self.pull_backup_sync = contexto_entrada.socket(zmq.PULL)
         self.pull_backup_sync.bind("tcp://*:6007")
-        threading.Thread(target=self.recibir_sincronizacion_backup, daemon=True).start()
+        if not self.es_asyncio:
+            threading.Thread(target=self.recibir_sincronizacion_backup, daemon=True).start()
 
         # Socket SUB para escuchar notificaciones del HealthCheck
-        self.subscriber_healthcheck = self.context.socket(zmq.SUB)
+        self.subscriber_healthcheck = contexto_entrada.socket(zmq.SUB)
         self.subscriber_healthcheck.connect("tcp://10.43.96.34:6008")  # Puerto de notificaciones para DTI
         self.subscriber_healthcheck.setsockopt_string(zmq.SUBSCRIBE, "peer_status")
-        # Configurar timeout para evitar bloqueos
-        self.subscriber_healthcheck.setsockopt(zmq.RCVTIMEO, 1000)  # 1 segundo timeout
         
         print(f"[DTI] 📡 Suscrito a notificaciones HealthCheck en puerto 6008")
-        threading.Thread(target=self.escuchar_notificaciones_healthcheck, daemon=True).start()
+        if not self.es_asyncio:
+            # Configurar timeout para evitar bloqueos
+            self.subscriber_healthcheck.setsockopt(zmq.RCVTIMEO, 1000)  # 1 segundo timeout
+            threading.Thread(target=self.escuchar_notificaciones_healthcheck, daemon=True).start()
 
         self.RUTA_JSON = "recursos_dti.json"
+        self.RUTA_CUOTAS = "cuotas_facultades.json"  # Se recarga en caliente al cambiar
+        self.RUTA_PESOS = "pesos_facultades.json"
+        self.RUTA_UBICACION = "ubicacion_salas.json"  # Campus y edificios de las salas del inventario
+        self.RUTA_TIPOS = "tipos_recursos.json"  # Tipos de recurso y su cantidad inicial
+        # Reparto justo ponderado entre facultades antes de la asignación
+        self.cola_justa = ColaJusta(self.RUTA_PESOS, nombre="DTI")
+        # Rechazo temprano con "Ocupado" cuando la demora en esa cola se sostiene sobre el objetivo
+        self.control_admision = ControlAdmision()
+        # Todas las mutaciones y lecturas del estado pasan por un único hilo dueño. El lock
+        # solo lo toma ese hilo (una vez por lote) y los lectores externos: snapshot y cuotas.
         self.lock = threading.Lock()
+        self.actor = ActorEstado(self.lock, nombre="DTI", al_terminar_lote=self._enviar_sincronizacion_pendiente)
+        self.sincronizacion_pendiente = None  # Último estado de contadores a replicar en el lote actual
+        # id_solicitud -> Future de su decisión mientras se procesa (solo lo toca el actor)
+        self.solicitudes_en_curso = {}
+        # Solicitudes rechazadas que pidieron esperar capacidad (solo las toca el actor). Vive en
+        # memoria de este servidor y "En espera" no se registra como decisión: tras un reinicio o
+        # failover el reenvío periódico de la facultad la vuelve a encolar donde llegue.
+        self.lista_espera = ListaEspera()
+        # Decisiones diferidas (lista de espera) que publica el dueño del socket PUB
+        self.notificaciones = queue.SimpleQueue()
+        self.modo_durabilidad = modo_durabilidad  # "fsync", "grupo" o "buffer"
+        self.ventana_grupo_ms = ventana_grupo_ms
+        self.usar_estado_mapeado = usar_estado_mapeado  # Contadores en archivo mmap para monitoreo local
+        self.contexto_hilo = threading.local()  # ultimo_commit = (latencia_ms, tamaño_lote) por hilo
+        # Executor para el PBKDF2 y la espera de durabilidad en el modo asyncio
+        self.executor = ThreadPoolExecutor(max_workers=num_workers) if self.es_asyncio else None
+
+        # Métricas de throughput, comparables entre el modo REP y el pool de workers
+        self.lock_metricas = threading.Lock()
+        self.solicitudes_atendidas = 0
+        # Indicadores de carga para el endpoint de salud (nunca toman self.lock)
+        self.latencias_recientes = deque(maxlen=1000)
+        self.en_proceso = 0
+        self.ultima_respuesta = time.monotonic()
         self.backup_online = False  # Estado del backup
         
         # Sistema de autenticación
-        self.auth = AutenticacionDTI()
+        # workers_kdf > 0: el PBKDF2 de conexiones y contraseñas va a un pool acotado
+        # ("procesos" o "hilos"); los workers siguen atendiendo solicitudes con token mientras tanto
+        self.pool_kdf = PoolKDF(workers_kdf, tipo_pool_kdf, nombre="DTI") if workers_kdf else None
+        # Con archivo_clave_sesiones la clave compartida es obligatoria; sin él se usa
+        # clave_sesiones.key si existe, o una clave propia del proceso (avisando)
+        self.auth = AutenticacionDTI(pool=self.pool_kdf, archivo_clave=archivo_clave_sesiones or "clave_sesiones.key",
+                                     clave_requerida=archivo_clave_sesiones is not None)
         #self.auth.mostrar_credenciales_iniciales()
 
         print(f"[DTI] Servidor iniciado en puerto {puerto_rep} y esperando solicitudes...")
         print(f"[DTI] Escuchando notificaciones de HealthCheck en puerto 6008")
         self._inicializar_recursos()
+        print(f"[DTI] ⏱️ Listo para atender en {(time.perf_counter() - inicio_arranque) * 1000:.1f} ms "
+              f"(recuperación de estado: {self.almacen.tiempo_recuperacion_ms:.1f} ms)")
+
+        # Socket REP de salud en su propio hilo: responde aunque la cola de asignaciones esté llena
+        self.receptor_salud = self.context.socket(zmq.REP)
+        self.receptor_salud.setsockopt(zmq.LINGER, 0)
+        self.receptor_salud.bind(f"tcp://*:{puerto_salud}")
+        threading.Thread(target=self.atender_salud, daemon=True).start()
+        print(f"[DTI] 💓 Endpoint de salud en puerto {puerto_salud}")
 
 
     def _inicializar_recursos(self):
-        if not os.path.exists(self.RUTA_JSON):
-            with open(self.RUTA_JSON, 'w') as f:
-                json.dump({
-                    "salones_disponibles": 380,
-                    "laboratorios_disponibles": 60
-                }, f)
+        # Estado en memoria + WAL segmentado con snapshots periódicos
+        inventario = InventarioSalones(ruta_ubicacion=self.RUTA_UBICACION)
+        self.almacen = AlmacenRecursos(self.RUTA_JSON, nombre="DTI",
+                                       modo_durabilidad=self.modo_durabilidad,
+                                       ventana_grupo_ms=self.ventana_grupo_ms,
+                                       lock=self.lock,
+                                       actor=self.actor,
+                                       usar_estado_mapeado=self.usar_estado_mapeado,
+                                       inventario=inventario,
+                                       reservas=IndiceReservas(inventario.ids, inventario.franjas_de_intervalo,
+                                                               inventario.num_franjas),
+                                       idempotencia=CacheIdempotencia(),
+                                       tipos=TiposRecursos(self.RUTA_TIPOS),
+                                       cuotas=CuotasFacultades(self.RUTA_CUOTAS, self.lock, nombre="DTI"))
 
     def cargar_recursos(self):
-        with open(self.RUTA_JSON, 'r') as f:
-            return json.load(f)
+        return self.almacen.obtener_recursos()
 
     def guardar_recursos(self, data, sincronizar=True):
-        with open(self.RUTA_JSON, 'w') as f:
-            json.dump(data, f, indent=4)
+        self.almacen.aplicar_sincronizacion(data)
         if sincronizar and self.backup_online:
-            self.sincronizar_backup(data)
+            self.sincronizar_backup(self.almacen.obtener_recursos())
 
     def sincronizar_backup(self, data):
+        """Se llama desde el actor. El estado de contadores es absoluto, así que dentro de un
+        lote basta enviar el último; cualquier otro mensaje sale después de él, en orden."""
+        if "tipo" not in data:
+            self.sincronizacion_pendiente = data
+            return
+        self._enviar_sincronizacion_pendiente()
+        self._enviar_al_par(data)
+
+    def _enviar_sincronizacion_pendiente(self):
+        if self.sincronizacion_pendiente is not None:
+            data, self.sincronizacion_pendiente = self.sincronizacion_pendiente, None
+            self._enviar_al_par(data)
+
+    def _enviar_al_par(self, data):
         try:
             self.push_backup.send_json(data)
             print("[DTI] Sincronización enviada al backup.")
         except Exception as e:
             print(f"[DTI] Error al sincronizar con backup: {e}")
 
+    def _guardar_sincronizacion(self, data):
+        # NO sincronizar de vuelta para evitar bucle
+        self.guardar_recursos(data, sincronizar=False)
+        print("[DTI] Recursos sincronizados desde Backup.")
+
+    def _aplicar_sincronizacion_backup(self, data):
+        """Aplica una sincronización recibida del backup (modo hilos y asyncio)"""
+        # Solo procesar sincronización si el backup está online
+        if self.backup_online:
+            # Se encola al actor sin esperar: su cola conserva el orden de llegada
+            self.actor.notificar(self._guardar_sincronizacion, data)
+        else:
+            print("[DTI] ⚠️ Backup offline - Ignorando sincronización entrante")
+
     def recibir_sincronizacion_backup(self):
         """Recibe sincronización desde el backup"""
         while True:
             try:
                 data = self.pull_backup_sync.recv_json()
-                
-                # Solo procesar sincronización si el backup está online
-                if self.backup_online:
-                    with self.lock:
-                        # NO sincronizar de vuelta para evitar bucle
-                        self.guardar_recursos(data, sincronizar=False)
-                    print("[DTI] Recursos sincronizados desde Backup.")
-                else:
-                    print("[DTI] ⚠️ Backup offline - Ignorando sincronización entrante")
+                self._aplicar_sincronizacion_backup(data)
                     
             except Exception as e:
                 print(f"[DTI] Error recibiendo sincronización desde backup: {e}")
                 time.sleep(1)
 
+    def _procesar_notificacion_healthcheck(self, mensaje_completo):
+        """Actualiza el estado del backup. Retorna True si el backup acaba de volver online."""
+        if not mensaje_completo.startswith("peer_status "):
+            return False
+
+        payload = mensaje_completo[12:]
+        data = json.loads(payload)
+        
+        if data.get("peer") != "backup":
+            return False
+
+        estado_backup = data.get("estado") == "online"
+        
+        # Detectar si el BACKUP volvió online
+        backup_volvio = not self.backup_online and estado_backup
+        
+        self.actor.notificar(setattr, self, "backup_online", estado_backup)
+
+        if backup_volvio:
+            print(f"[DTI] 🔄 BACKUP volvió online - Enviando nuestra información...")
+        return backup_volvio
+
     def escuchar_notificaciones_healthcheck(self):
         """Escucha notificaciones del HealthCheck sobre el estado del Backup"""
         
@@ -98,23 +245,9 @@ class DTI:
             try:
                 mensaje_completo = self.subscriber_healthcheck.recv_string(zmq.NOBLOCK)
                 
-                if mensaje_completo.startswith("peer_status "):
-                    payload = mensaje_completo[12:]
-                    data = json.loads(payload)
-                    
-                    if data.get("peer") == "backup":
-                        estado_backup = data.get("estado") == "online"
-                        
-                        # Detectar si el BACKUP volvió online
-                        backup_volvio = not self.backup_online and estado_backup
-                        
-                        with self.lock:
-                            self.backup_online = estado_backup
-                        
-                        # Si el backup volvió online, enviarle nuestra información
-                        if backup_volvio:
-                            print(f"[DTI] 🔄 BACKUP volvió online - Enviando nuestra información...")
-                            threading.Timer(2.0, self.enviar_sincronizacion_completa).start()
+                # Si el backup volvió online, enviarle nuestra información
+                if self._procesar_notificacion_healthcheck(mensaje_completo):
+                    threading.Timer(2.0, self.enviar_sincronizacion_completa).start()
                 
             except zmq.Again:
                 time.sleep(0.5)
@@ -123,19 +256,120 @@ class DTI:
                 time.sleep(1)
 
     def enviar_sincronizacion_completa(self):
-        """Envía sincronización completa al backup cuando vuelve online"""
+        """Envía sincronización completa a el backup cuando vuelve online. La foto se toma
+        en el actor, así queda ordenada respecto de las asignaciones en curso."""
+        self.actor.notificar(self._enviar_estado_completo)
+
+    def _enviar_estado_completo(self):
+        recursos = self.cargar_recursos()
+        print(f"[DTI] 📤 Enviando sincronización completa al Backup: {recursos}")
+        self.sincronizar_backup(recursos)
+        for mensaje in self.almacen.mensajes_estado_completo():
+            self.sincronizar_backup(mensaje)
+
+
+    def procesar_solicitud(self, solicitud, autenticada=False):
+        if not autenticada:
+            respuesta = self.autenticar_solicitud(solicitud)
+            if respuesta is not None:
+                return respuesta
+        return self.asignar_idempotente(solicitud)
+
+    def asignar_idempotente(self, solicitud):
+        """Aplica cada id_solicitud una sola vez: un reintento (failover del broker) recibe la
+        decisión original sin volver a tocar el estado"""
+        id_solicitud = solicitud.get("id_solicitud")
+        if not id_solicitud or solicitud.get("tipo") in self.TIPOS_CONSULTA:
+            return self.asignar_recursos(solicitud)
+
+        def buscar_o_marcar():
+            # Búsqueda y marca "en curso" en un mismo comando: dos copias del mismo id que llegan
+            # a la vez (workers, asyncio) no pueden fallar ambas la búsqueda y asignar dos veces
+            previa = self.almacen.respuesta_previa(id_solicitud)
+            # "En espera" no es final (las versiones anteriores la registraban): cuenta la lista
+            if previa is not None and previa.get("estado") != "En espera":
+                return previa, None, None
+            if id_solicitud in self.solicitudes_en_curso:
+                return None, self.solicitudes_en_curso[id_solicitud], None
+            entrada = self.lista_espera.buscar(id_solicitud)
+            if entrada is not None:
+                return self._respuesta_en_espera(entrada), None, None
+            propia = self.solicitudes_en_curso[id_solicitud] = Future()
+            return None, None, propia
+
+        previa, en_curso, propia = self.actor.ejecutar(buscar_o_marcar)
+        if en_curso is not None:
+            print(f"[DTI] ♻️ Solicitud repetida {id_solicitud} en curso - Esperando la decisión original")
+            return dict(en_curso.result(), repetida=True)
+        if previa is not None:
+            if previa.get("estado") == "En espera":
+                print(f"[DTI] ♻️ Solicitud repetida {id_solicitud} - Sigue en lista de espera (id {previa['id_espera']})")
+            else:
+                print(f"[DTI] ♻️ Solicitud repetida {id_solicitud} - Devolviendo la decisión original")
+            return dict(previa, repetida=True)
+
         try:
-            with self.lock:
-                recursos = self.cargar_recursos()
-            
-            print(f"[DTI] 📤 Enviando sincronización completa al Backup: {recursos}")
-            self.sincronizar_backup(recursos)
-            
+            respuesta = self.asignar_recursos(solicitud)
+
+            def recordar():
+                del self.solicitudes_en_curso[id_solicitud]
+                if respuesta.get("estado") == "En espera":
+                    # No es final: los reenvíos los contesta la entrada de la lista, y la decisión
+                    # que la atienda la registra _atender_lista_espera
+                    return None
+                return self._recordar_respuesta(id_solicitud, respuesta)
+
+            lsn = self.actor.ejecutar(recordar)
+            if lsn is not None:
+                self.almacen.esperar_durable(lsn)
         except Exception as e:
-            print(f"[DTI] ❌ Error enviando sincronización completa: {e}")
+            # Sin decisión: las copias que esperaban reciben el error y un reintento vuelve a empezar
+            self.actor.ejecutar(self.solicitudes_en_curso.pop, id_solicitud, None)
+            propia.set_exception(e)
+            raise
+        # Las copias que llegaron mientras tanto reciben la misma decisión, ya durable
+        propia.set_result(respuesta)
+        return respuesta
 
+    def _recordar_respuesta(self, id_solicitud, respuesta):
+        """Registra la decisión para id_solicitud y la replica. Corre en el actor; retorna el lsn."""
+        vence, lsn = self.almacen.recordar_respuesta(id_solicitud, respuesta)
+        # Se replica detrás del cambio de estado, por el mismo canal y en orden
+        if self.backup_online:
+            self.sincronizar_backup({"tipo": "idempotencia", "id_solicitud": id_solicitud,
+                         "vence": vence, "respuesta": respuesta})
+        return lsn
 
-    def procesar_solicitud(self, solicitud):
+    def autenticar_solicitud(self, solicitud):
+        """Autenticación de una solicitud: PBKDF2 en la conexión, HMAC del token de sesión
+        después. Retorna la respuesta final para healthcheck/conexión/accesos denegados,
+        o None si la asignación puede seguir."""
+        try:
+            return self._autenticar_solicitud(solicitud)
+        except PoolSaturado:
+            return self._respuesta_kdf_saturado(solicitud)
+
+    def _respuesta_kdf_saturado(self, solicitud):
+        print(f"[DTI] 🚦 Ocupado: {self.pool_kdf.pendientes()} verificaciones de credenciales pendientes")
+        return {
+            "facultad": solicitud.get("facultad"),
+            "estado": "Ocupado",
+            "mensaje": "Verificación de credenciales saturada, reintente más tarde",
+            "reintentar_en_ms": self.REINTENTO_KDF_MS,
+            "servidor": "DTI"
+        }
+
+    def _respuesta_conexion(self, nombre_facultad, es_valida):
+        """Respuesta a una conexión ya verificada: token de sesión o acceso denegado"""
+        if es_valida:
+            print(f"[DTI] ✓ Facultad autenticada: {nombre_facultad}")
+            token, vence = self.auth.emitir_token(nombre_facultad)
+            return {"estado": "Conexión aceptada", "mensaje": "Autenticación exitosa",
+                    "token_sesion": token, "vence_token": vence, "servidor": "DTI"}
+        print(f"[DTI] ✗ Autenticación fallida para: {nombre_facultad}")
+        return {"estado": "Acceso denegado", "mensaje": "Credenciales inválidas", "servidor": "DTI"}
+
+    def _autenticar_solicitud(self, solicitud):
         if solicitud.get("tipo") == "healthcheck":
             return {"estado": "OK", "servidor": "DTI"}
 
@@ -148,15 +382,25 @@ class DTI:
                 print(f"[DTI] ✗ Conexión rechazada: Falta contraseña para {nombre_facultad}")
                 return {"estado": "Autenticación requerida", "mensaje": "Falta contraseña", "servidor": "DTI"}
             
-            if self.auth.verificar_facultad(nombre_facultad, password_facultad):
-                print(f"[DTI] ✓ Facultad autenticada: {nombre_facultad}")
-                return {"estado": "Conexión aceptada", "mensaje": "Autenticación exitosa", "servidor": "DTI"}
-            else:
-                print(f"[DTI] ✗ Autenticación fallida para: {nombre_facultad}")
-                return {"estado": "Acceso denegado", "mensaje": "Credenciales inválidas", "servidor": "DTI"}
+            return self._respuesta_conexion(nombre_facultad,
+                                            self.auth.verificar_facultad(nombre_facultad, password_facultad))
 
         # Verificar que la solicitud venga de una facultad autenticada
         nombre_facultad = solicitud.get("facultad")
+        token_sesion = solicitud.get("token_sesion")
+        if token_sesion:
+            if self.auth.verificar_token(nombre_facultad, token_sesion):
+                return None
+            print(f"[DTI] ✗ Token de sesión inválido o vencido - {nombre_facultad}")
+            return {
+                "facultad": nombre_facultad,
+                "estado": "Acceso denegado",
+                "mensaje": "Token de sesión inválido o vencido",
+                "renovar_sesion": True,
+                "servidor": "DTI"
+            }
+
+        # Sin token (clientes anteriores): contraseña en cada solicitud
         password_facultad = solicitud.get("password_facultad")
         
         if not password_facultad or not self.auth.verificar_facultad(nombre_facultad, password_facultad):
@@ -167,21 +411,68 @@ class DTI:
                 "mensaje": "Facultad no autenticada",
                 "servidor": "DTI"
             }
+        return None
 
-        with self.lock:
-            recursos = self.cargar_recursos()
-            salones = solicitud.get("salones", 0)
-            laboratorios = solicitud.get("laboratorios", 0)
-    
-            if recursos["salones_disponibles"] >= salones and recursos["laboratorios_disponibles"] >= laboratorios:
-                recursos["salones_disponibles"] -= salones
-                recursos["laboratorios_disponibles"] -= laboratorios
-                estado = "Aceptado"
-            else:
-                estado = "Rechazado"
-    
-            # Usar el flag sincronizar=True para que sincronice con el backup
-            self.guardar_recursos(recursos, sincronizar=True)
+    def asignar_recursos(self, solicitud):
+        """Verifica y descuenta recursos para una solicitud ya autenticada"""
+        if solicitud.get("tipo") == "lote":
+            return self.asignar_lote(solicitud)
+        if solicitud.get("tipo") == "reserva_intervalo":
+            return self.reservar_intervalo(solicitud)
+        if solicitud.get("tipo") == "cancelar_reserva":
+            return self.cancelar_reserva(solicitud)
+        if solicitud.get("tipo") == "liberar":
+            return self.liberar_recursos(solicitud)
+        if solicitud.get("tipo") == "cancelar_espera":
+            return self.cancelar_espera(solicitud)
+        if solicitud.get("tipo") in ("arrendar", "renovar_arriendo"):
+            return self.arrendar(solicitud)
+        if solicitud.get("tipo") == "devolver_arriendo":
+            return self.devolver_arriendo(solicitud)
+        if solicitud.get("tipo") == "salas_libres":
+            return self.consultar_salas_libres(solicitud)
+        if solicitud.get("tipo") == "disponibilidad":
+            return self.consultar_disponibilidad(solicitud)
+        if solicitud.get("tipo") == "uso_facultades":
+            return self.consultar_uso_facultades()
+        if solicitud.get("tipo") == "recargar_credenciales":
+            return self.recargar_credenciales(solicitud)
+        if "franjas" in solicitud or "dia" in solicitud:
+            return self.reservar_franjas(solicitud)
+
+        salones = solicitud.get("salones", 0)
+        laboratorios = solicitud.get("laboratorios", 0)
+        prioridad = int(solicitud.get("prioridad", 0))
+        otros = solicitud.get("recursos")  # Tipos extra dispersos: {"proyectores": 2, ...}
+        respuesta_error = self._validar_recursos(solicitud, salones, laboratorios, otros)
+        if respuesta_error is not None:
+            return respuesta_error
+
+        def asignar():
+            # Solo verificación y descuento en memoria + un append al WAL
+            resultado = self.almacen.asignar(salones, laboratorios, facultad=solicitud.get("facultad"), otros=otros)
+
+            # Solo se sincroniza si hubo cambio en el estado
+            if resultado[0] and self.backup_online:
+                self.sincronizar_backup(resultado[1])
+
+            # El alta en la lista de espera va en el mismo comando que el rechazo, así
+            # ninguna liberación puede colarse entre ambos
+            id_espera = None
+            if not resultado[0] and solicitud.get("lista_espera"):
+                id_espera = self.lista_espera.agregar(
+                    solicitud.get("facultad"), salones, laboratorios, prioridad,
+                    {"programa": solicitud.get("programa"), "id_solicitud": solicitud.get("id_solicitud"),
+                     "recursos": otros},
+                    clave=solicitud.get("id_solicitud"))
+            return resultado + (id_espera,)
+
+        aceptado, recursos, lsn, id_espera = self.actor.ejecutar(asignar)
+
+        estado = "Aceptado" if aceptado else ("En espera" if id_espera is not None else "Rechazado")
+
+        # La respuesta espera a que el registro sea durable (fuera del lock)
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if aceptado else None
     
         respuesta = {
             "facultad": solicitud.get("facultad", "Desconocida"),
@@ -191,11 +482,533 @@ class DTI:
             "laboratorios": laboratorios,
             "servidor": "DTI"
         }
+        if otros:
+            respuesta["recursos"] = otros
+        if id_espera is not None:
+            respuesta["id_espera"] = id_espera
+            respuesta["en_espera"] = len(self.lista_espera)
     
         print(f"[DTI] Solicitud procesada: {respuesta}")
         print(f"[DTI] Recursos restantes: Salones={recursos['salones_disponibles']}, Labs={recursos['laboratorios_disponibles']}\n")
         return respuesta
+
+    def _validar_recursos(self, solicitud, salones, laboratorios, otros):
+        """Respuesta de error si la demanda trae tipos de recurso desconocidos, o None"""
+        try:
+            self.almacen.tipos.vector(salones, laboratorios, otros)
+        except (ValueError, TypeError, AttributeError) as e:
+            return {"facultad": solicitud.get("facultad"), "estado": "Error",
+                    "mensaje": f"Recursos inválidos: {e}", "servidor": "DTI"}
+        return None
     
+    def liberar_recursos(self, solicitud):
+        """Devuelve recursos al pool y atiende con ellos la lista de espera"""
+        salones = solicitud.get("salones", 0)
+        laboratorios = solicitud.get("laboratorios", 0)
+        otros = solicitud.get("recursos")
+        respuesta_error = self._validar_recursos(solicitud, salones, laboratorios, otros)
+        if respuesta_error is not None:
+            return respuesta_error
+
+        def liberar():
+            liberado, recursos, lsn = self.almacen.liberar(salones, laboratorios, facultad=solicitud.get("facultad"),
+                                                           otros=otros)
+            if not liberado:
+                return False, recursos, None, []
+            if self.backup_online:
+                self.sincronizar_backup(recursos)
+            decisiones, lsn_espera = self._atender_lista_espera()
+            return True, self.cargar_recursos(), max(lsn, lsn_espera), decisiones
+
+        liberado, recursos, lsn, decisiones = self.actor.ejecutar(liberar)
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if lsn is not None else None
+
+        # Las decisiones se publican recién cuando sus asignaciones son durables
+        self._encolar_decisiones(decisiones)
+
+        respuesta = {
+            "facultad": solicitud.get("facultad", "Desconocida"),
+            "programa": solicitud.get("programa", "Desconocido"),
+            "estado": "Liberado" if liberado else "Rechazado",
+            "salones": salones,
+            "laboratorios": laboratorios,
+            "atendidas_lista_espera": len(decisiones),
+            "servidor": "DTI"
+        }
+        if otros:
+            respuesta["recursos"] = otros
+        print(f"[DTI] Liberación procesada: {respuesta}")
+        print(f"[DTI] Recursos restantes: Salones={recursos['salones_disponibles']}, Labs={recursos['laboratorios_disponibles']}\n")
+        return respuesta
+
+    def _respuesta_en_espera(self, entrada):
+        """Respuesta a un reenvío de una solicitud que sigue en la lista de espera. Corre en el actor."""
+        respuesta = {
+            "facultad": entrada["facultad"] or "Desconocida",
+            "programa": entrada["datos"].get("programa") or "Desconocido",
+            "estado": "En espera",
+            "salones": entrada["salones"],
+            "laboratorios": entrada["laboratorios"],
+            "id_espera": entrada["id_espera"],
+            "en_espera": len(self.lista_espera),
+            "servidor": "DTI"
+        }
+        if entrada["datos"].get("recursos"):
+            respuesta["recursos"] = entrada["datos"]["recursos"]
+        return respuesta
+
+    def _atender_lista_espera(self):
+        """Asigna a la lista de espera lo que ahora cabe. Corre en el actor.
+        Retorna (decisiones a publicar, último lsn escrito)."""
+        decisiones = []
+        ultimo_lsn = 0
+
+        def disponibles():
+            return int(self.almacen.disponibles[0]), int(self.almacen.disponibles[1])
+
+        def asignar(entrada):
+            nonlocal ultimo_lsn
+            # La lista se indexa por salones y laboratorios; los tipos extra se verifican aquí
+            aceptado, recursos, lsn = self.almacen.asignar(entrada["salones"], entrada["laboratorios"],
+                                                           facultad=entrada["facultad"],
+                                                           otros=entrada["datos"].get("recursos"))
+            if not aceptado:
+                return False
+            ultimo_lsn = lsn
+            if self.backup_online:
+                self.sincronizar_backup(recursos)
+
+            id_solicitud = entrada["datos"].get("id_solicitud")
+            decision = {
+                "facultad": entrada["facultad"],
+                "programa": entrada["datos"].get("programa", "Desconocido"),
+                "estado": "Aceptado",
+                "salones": entrada["salones"],
+                "laboratorios": entrada["laboratorios"],
+                "id_espera": entrada["id_espera"],
+                "desde_lista_espera": True,
+                "servidor": "DTI"
+            }
+            if entrada["datos"].get("recursos"):
+                decision["recursos"] = entrada["datos"]["recursos"]
+            if id_solicitud:
+                # Un reenvío de la solicitud original recibe ahora la decisión final
+                decision["ticket"] = id_solicitud
+                ultimo_lsn = self._recordar_respuesta(id_solicitud, decision)
+            decisiones.append(decision)
+            return True
+
+        atendidas = self.lista_espera.atender(disponibles, asignar)
+        if atendidas:
+            print(f"[DTI] ⏳ Lista de espera: {len(atendidas)} atendidas, quedan {len(self.lista_espera)}")
+        return decisiones, ultimo_lsn
+
+    def cancelar_espera(self, solicitud):
+        """Saca de la lista de espera una solicitud de la misma facultad"""
+        id_espera = solicitud.get("id_espera")
+
+        def cancelar():
+            entrada = self.lista_espera.entradas.get(id_espera)
+            if entrada is None or entrada["facultad"] != solicitud.get("facultad"):
+                return None
+            return self.lista_espera.cancelar(id_espera)
+
+        entrada = self.actor.ejecutar(cancelar)
+        print(f"[DTI] Cancelación en lista de espera {id_espera}: {'OK' if entrada else 'no existe'}")
+        return {
+            "facultad": solicitud.get("facultad", "Desconocida"),
+            "estado": "Cancelada" if entrada is not None else "No encontrada",
+            "id_espera": id_espera,
+            "servidor": "DTI"
+        }
+
+    def _encolar_decisiones(self, decisiones):
+        for decision in decisiones:
+            self.notificaciones.put(((decision["facultad"] or SIN_FACULTAD).encode(), json.dumps(decision).encode()))
+
+    # Arriendos de cupo: la facultad aprueba localmente contra un bloque ya descontado del pool
+
+    def arrendar(self, solicitud):
+        """Concede o renueva el arriendo de la facultad: registra lo que aprobó localmente,
+        lo amplía con lo pedido (hasta donde alcancen pool y cuota) y extiende su vencimiento"""
+        facultad = solicitud.get("facultad")
+        salones = int(solicitud.get("salones", 0))
+        laboratorios = int(solicitud.get("laboratorios", 0))
+        consumido = solicitud.get("consumido") or {}
+        duracion = min(max(float(solicitud.get("duracion_s", self.DURACION_ARRIENDO_S)), 1.0),
+                       self.MAX_DURACION_ARRIENDO_S)
+
+        def arrendar():
+            lsn, tardio = self._consumir_arriendo(facultad, consumido)
+            if solicitud.get("tipo") == "renovar_arriendo" and facultad not in self.almacen.arriendos:
+                # Ya se recuperó por vencido: la facultad debe pedir uno nuevo
+                return 0, 0, None, lsn, tardio
+            concedido_s, concedido_l, arriendo, lsn_arriendo = self.almacen.arrendar(
+                facultad, salones, laboratorios, time.time() + duracion, "DTI")
+            if arriendo is None:
+                return 0, 0, None, lsn, tardio
+            if self.backup_online:
+                if concedido_s + concedido_l:
+                    self.sincronizar_backup(self.cargar_recursos())
+                self.sincronizar_backup({"tipo": "arriendo", "facultad": facultad, "arriendo": arriendo})
+            return concedido_s, concedido_l, arriendo, lsn_arriendo, tardio
+
+        concedido_s, concedido_l, arriendo, lsn, tardio = self.actor.ejecutar(arrendar)
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if lsn is not None else None
+
+        if arriendo is None:
+            respuesta = {"facultad": facultad, "estado": "Sin arriendo", "servidor": "DTI"}
+        else:
+            respuesta = {
+                "facultad": facultad,
+                "estado": "Arrendado",
+                "salones": concedido_s,
+                "laboratorios": concedido_l,
+                "saldo": {"salones": arriendo["s"], "laboratorios": arriendo["l"]},
+                # Relativo, para no depender de que los relojes de ambas máquinas coincidan
+                "vence_en_s": round(arriendo["v"] - time.time(), 3),
+                "servidor": "DTI"
+            }
+        if tardio is not None:
+            respuesta["consumo_tardio"] = tardio
+        print(f"[DTI] 📦 Arriendo procesado: {respuesta}")
+        return respuesta
+
+    def devolver_arriendo(self, solicitud):
+        """Registra lo último aprobado localmente, cierra el arriendo y devuelve su saldo al pool"""
+        facultad = solicitud.get("facultad")
+        consumido = solicitud.get("consumido") or {}
+
+        def devolver():
+            lsn_consumo, tardio = self._consumir_arriendo(facultad, consumido)
+            arriendo, lsn = self._cerrar_arriendo(facultad)
+            if arriendo is None:
+                return None, lsn_consumo, [], tardio
+            decisiones, lsn_espera = self._atender_lista_espera()
+            return arriendo, max(lsn, lsn_espera), decisiones, tardio
+
+        arriendo, lsn, decisiones, tardio = self.actor.ejecutar(devolver)
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if lsn is not None else None
+        self._encolar_decisiones(decisiones)
+
+        respuesta = {
+            "facultad": facultad,
+            "estado": "Devuelto" if arriendo is not None else "Sin arriendo",
+            "salones": arriendo["s"] if arriendo is not None else 0,
+            "laboratorios": arriendo["l"] if arriendo is not None else 0,
+            "atendidas_lista_espera": len(decisiones),
+            "servidor": "DTI"
+        }
+        if tardio is not None:
+            respuesta["consumo_tardio"] = tardio
+        print(f"[DTI] 📦 Devolución de arriendo: {respuesta}")
+        return respuesta
+
+    def _consumir_arriendo(self, facultad, consumido):
+        """Registra lo aprobado localmente por la facultad. Corre en el actor; retorna (lsn o None,
+        consumo cobrado fuera del arriendo o None)."""
+        if not consumido:
+            return None, None
+        _, lsn, tardio = self.almacen.consumir_arriendo(facultad, int(consumido.get("salones", 0)),
+                                                        int(consumido.get("laboratorios", 0)))
+        if tardio is None:
+            return lsn, None
+        if tardio["aceptado"]:
+            print(f"[DTI] 📦 '{facultad}' informó {tardio['salones']} salones y {tardio['laboratorios']} "
+                  f"laboratorios después de recuperado su arriendo - Cobrados como asignación")
+            if self.backup_online:
+                self.sincronizar_backup(self.cargar_recursos())
+        else:
+            print(f"[DTI] ❌ '{facultad}' aprobó localmente {tardio['salones']} salones y {tardio['laboratorios']} "
+                  f"laboratorios que ya no caben en el pool ni en su cuota")
+        return lsn, tardio
+
+    def _cerrar_arriendo(self, facultad):
+        """Cierra el arriendo y lo replica. Corre en el actor; retorna (arriendo o None, lsn)."""
+        arriendo, lsn = self.almacen.cerrar_arriendo(facultad)
+        if arriendo is not None and self.backup_online:
+            # El cierre viaja antes que los contadores: el par nunca ve el saldo devuelto
+            # con el arriendo todavía abierto
+            self.sincronizar_backup({"tipo": "cierre_arriendo", "facultad": facultad})
+            self.sincronizar_backup(self.cargar_recursos())
+        return arriendo, lsn
+
+    def _recuperar_arriendos_vencidos(self):
+        """Cierra los arriendos vencidos hace más que la gracia. Corre en el actor. Cada servidor
+        recupera los que concedió; los del backup solo si este está caído.
+        Retorna (decisiones de la lista de espera, último lsn escrito)."""
+        ahora = time.time()
+        lsn = 0
+        for facultad, arriendo in list(self.almacen.arriendos.items()):
+            if arriendo["v"] + self.GRACIA_ARRIENDO_S > ahora:
+                continue
+            if arriendo["srv"] != "DTI" and self.backup_online:
+                continue
+            _, lsn = self._cerrar_arriendo(facultad)
+            print(f"[DTI] ⌛ Arriendo de '{facultad}' vencido - Recuperados {arriendo['s']} salones "
+                  f"y {arriendo['l']} laboratorios")
+        if not lsn:
+            return [], 0
+        decisiones, lsn_espera = self._atender_lista_espera()
+        return decisiones, max(lsn, lsn_espera)
+
+    def recuperar_arriendos_vencidos(self):
+        decisiones, lsn = self.actor.ejecutar(self._recuperar_arriendos_vencidos)
+        if lsn:
+            self.almacen.esperar_durable(lsn)
+        self._encolar_decisiones(decisiones)
+
+    def vigilar_arriendos(self, intervalo=1.0):
+        """Hilo que recupera los arriendos vencidos"""
+        while True:
+            time.sleep(intervalo)
+            try:
+                self.recuperar_arriendos_vencidos()
+            except Exception as e:
+                print(f"[DTI] ❌ Error recuperando arriendos vencidos: {e}")
+
+    def _notificaciones_pendientes(self):
+        """Decisiones diferidas listas para publicar; las drena el dueño del PUB"""
+        pendientes = []
+        while not self.notificaciones.empty():
+            pendientes.append(self.notificaciones.get())
+        return pendientes
+
+    def asignar_lote(self, solicitud):
+        """Evalúa muchas solicitudes con una sola adquisición del lock, un commit y una sincronización"""
+        items = solicitud.get("solicitudes", [])
+        modo_lote = solicitud.get("modo_lote", "mejor_esfuerzo")  # "todo_o_nada" o "mejor_esfuerzo"
+        if modo_lote not in ("todo_o_nada", "mejor_esfuerzo"):
+            return {"facultad": solicitud.get("facultad"), "estado": "Error",
+                    "mensaje": f"modo_lote inválido: {modo_lote}", "servidor": "DTI"}
+
+        salones = [item.get("salones", 0) for item in items]
+        laboratorios = [item.get("laboratorios", 0) for item in items]
+        otros = [item.get("recursos") for item in items]
+
+        def asignar():
+            resultado = self.almacen.asignar_lote(
+                salones, laboratorios, todo_o_nada=(modo_lote == "todo_o_nada"),
+                facultad=solicitud.get("facultad"), otros=otros
+            )
+            if resultado[2] is not None and self.backup_online:
+                self.sincronizar_backup(resultado[1])
+            return resultado
+
+        aceptados, recursos, lsn = self.actor.ejecutar(asignar)
+
+        # Un solo registro en el WAL para todo el lote
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if lsn is not None else None
+
+        resultados = [
+            {
+                "programa": item.get("programa", "Desconocido"),
+                "estado": "Aceptado" if aceptado else "Rechazado",
+                "salones": item.get("salones", 0),
+                "laboratorios": item.get("laboratorios", 0),
+                **({"recursos": item["recursos"]} if item.get("recursos") else {})
+            }
+            for item, aceptado in zip(items, aceptados)
+        ]
+        respuesta = {
+            "facultad": solicitud.get("facultad", "Desconocida"),
+            "tipo": "lote",
+            "modo_lote": modo_lote,
+            "estado": "Aceptado" if any(aceptados) else "Rechazado",
+            "aceptadas": sum(aceptados),
+            "total": len(items),
+            "resultados": resultados,
+            "servidor": "DTI"
+        }
+
+        print(f"[DTI] Lote procesado ({modo_lote}): {respuesta['aceptadas']}/{len(items)} aceptadas")
+        print(f"[DTI] Recursos restantes: Salones={recursos['salones_disponibles']}, Labs={recursos['laboratorios_disponibles']}\n")
+        return respuesta
+
+    def reservar_franjas(self, solicitud):
+        """Asigna salones y laboratorios concretos en las franjas horarias pedidas"""
+        salones = solicitud.get("salones", 0)
+        laboratorios = solicitud.get("laboratorios", 0)
+        inventario = self.almacen.inventario
+        campus, edificio = solicitud.get("campus"), solicitud.get("edificio")
+
+        try:
+            franjas = inventario.franjas_de_solicitud(solicitud)
+            if franjas is None:
+                raise ValueError("falta \"franjas\" o \"dia\" + \"hora\"")
+        except (ValueError, TypeError) as e:
+            return {"facultad": solicitud.get("facultad"), "estado": "Error",
+                    "mensaje": f"Franja inválida: {e}", "servidor": "DTI"}
+        # Una reserva vacía no toca el inventario pero igual escribiría en el WAL y se replicaría
+        if (not isinstance(salones, int) or not isinstance(laboratorios, int)
+                or salones < 0 or laboratorios < 0 or salones + laboratorios == 0):
+            return {"facultad": solicitud.get("facultad"), "estado": "Error",
+                    "mensaje": "Cantidad inválida: se reserva al menos una sala y ninguna cantidad negativa",
+                    "servidor": "DTI"}
+        try:
+            inventario.rango("salones", campus, edificio)
+        except ValueError as e:
+            return {"facultad": solicitud.get("facultad"), "estado": "Error",
+                    "mensaje": f"Ubicación inválida: {e}", "servidor": "DTI"}
+
+        def reservar():
+            resultado = self.almacen.reservar_franjas(salones, laboratorios, franjas, campus, edificio)
+            # Al par se le envían los índices elegidos para que marque las mismas salas
+            if resultado[0] and self.backup_online:
+                self.sincronizar_backup({"tipo": "reserva_franjas", "franjas": franjas, **resultado[1]})
+            return resultado
+
+        aceptado, elegidas, lsn = self.actor.ejecutar(reservar)
+
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if aceptado else None
+
+        respuesta = {
+            "facultad": solicitud.get("facultad", "Desconocida"),
+            "programa": solicitud.get("programa", "Desconocido"),
+            "estado": "Aceptado" if aceptado else "Rechazado",
+            "salones": salones,
+            "laboratorios": laboratorios,
+            "franjas": franjas,
+            "salones_asignados": inventario.nombres("salones", elegidas.get("salones", [])),
+            "laboratorios_asignados": inventario.nombres("laboratorios", elegidas.get("laboratorios", [])),
+            "servidor": "DTI"
+        }
+        if campus is not None:
+            respuesta["campus"] = campus
+        if edificio is not None:
+            respuesta["edificio"] = edificio
+
+        print(f"[DTI] Reserva por franjas procesada: {respuesta['estado']} franjas={franjas} "
+              f"salones={respuesta['salones_asignados']} labs={respuesta['laboratorios_asignados']}\n")
+        return respuesta
+
+    def reservar_intervalo(self, solicitud):
+        """Reserva salas concretas para un rango de tiempo arbitrario (exámenes, eventos)"""
+        salones = solicitud.get("salones", 0)
+        laboratorios = solicitud.get("laboratorios", 0)
+        reservas = self.almacen.reservas
+
+        try:
+            inicio, fin = reservas.intervalo_de_solicitud(solicitud)
+        except (KeyError, ValueError, TypeError) as e:
+            return {"facultad": solicitud.get("facultad"), "estado": "Error",
+                    "mensaje": f"Rango inválido: {e}", "servidor": "DTI"}
+
+        def reservar():
+            resultado = self.almacen.reservar_intervalo(salones, laboratorios, inicio, fin)
+            if resultado[0] is not None and self.backup_online:
+                self.sincronizar_backup({"tipo": "reserva_intervalo", "id_reserva": resultado[0],
+                             "inicio": inicio, "fin": fin, **resultado[1]})
+            return resultado
+
+        id_reserva, elegidas, lsn = self.actor.ejecutar(reservar)
+
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if lsn is not None else None
+
+        respuesta = {
+            "facultad": solicitud.get("facultad", "Desconocida"),
+            "programa": solicitud.get("programa", "Desconocido"),
+            "estado": "Aceptado" if id_reserva is not None else "Rechazado",
+            "id_reserva": id_reserva,
+            "inicio": inicio,
+            "fin": fin,
+            "salones_asignados": reservas.nombres("salones", elegidas.get("salones", [])),
+            "laboratorios_asignados": reservas.nombres("laboratorios", elegidas.get("laboratorios", [])),
+            "servidor": "DTI"
+        }
+        print(f"[DTI] Reserva por rango procesada: {respuesta['estado']} id={id_reserva} "
+              f"salones={respuesta['salones_asignados']} labs={respuesta['laboratorios_asignados']}\n")
+        return respuesta
+
+    def cancelar_reserva(self, solicitud):
+        """Cancela una reserva por rango y libera sus salas"""
+        id_reserva = solicitud.get("id_reserva")
+        def cancelar():
+            resultado = self.almacen.cancelar_reserva(id_reserva)
+            if resultado[0] is not None and self.backup_online:
+                self.sincronizar_backup({"tipo": "cancelacion_reserva", "id_reserva": id_reserva})
+            return resultado
+
+        reserva, lsn = self.actor.ejecutar(cancelar)
+
+        self.contexto_hilo.ultimo_commit = self.almacen.esperar_durable(lsn) if lsn is not None else None
+
+        print(f"[DTI] Cancelación de reserva {id_reserva}: {'OK' if reserva else 'no existe'}")
+        return {
+            "facultad": solicitud.get("facultad", "Desconocida"),
+            "estado": "Cancelada" if reserva is not None else "No encontrada",
+            "id_reserva": id_reserva,
+            "servidor": "DTI"
+        }
+
+    def consultar_salas_libres(self, solicitud):
+        """Salas sin reservas (por rango ni por franjas) en el intervalo pedido"""
+        reservas = self.almacen.reservas
+        try:
+            inicio, fin = reservas.intervalo_de_solicitud(solicitud)
+        except (KeyError, ValueError, TypeError) as e:
+            return {"estado": "Error", "mensaje": f"Rango inválido: {e}", "servidor": "DTI"}
+
+        libres = self.actor.ejecutar(lambda: {tipo: reservas.nombres(tipo, self.almacen.salas_libres_intervalo(tipo, inicio, fin))
+                                              for tipo in ("salones", "laboratorios")})
+        return {
+            "estado": "OK",
+            "inicio": inicio,
+            "fin": fin,
+            "salones_libres": libres["salones"],
+            "laboratorios_libres": libres["laboratorios"],
+            "servidor": "DTI"
+        }
+
+    def consultar_disponibilidad(self, solicitud):
+        """Salas libres por franja en todo el inventario, un campus o un edificio (árbol de Fenwick)"""
+        inventario = self.almacen.inventario
+        campus, edificio = solicitud.get("campus"), solicitud.get("edificio")
+        try:
+            franjas = inventario.franjas_de_solicitud(solicitud)
+            if franjas is None:
+                raise ValueError("falta \"franjas\" o \"dia\" + \"hora\"")
+            inventario.rango("salones", campus, edificio)
+        except (ValueError, TypeError) as e:
+            return {"estado": "Error", "mensaje": f"Consulta inválida: {e}", "servidor": "DTI"}
+
+        disponibilidad = self.actor.ejecutar(inventario.disponibilidad, franjas, campus, edificio)
+        respuesta = {
+            "estado": "OK",
+            "campus": campus,
+            "edificio": edificio,
+            "franjas": franjas,
+            "salones_libres": disponibilidad["salones"],
+            "laboratorios_libres": disponibilidad["laboratorios"],
+            "servidor": "DTI"
+        }
+        if "edificios" in disponibilidad:
+            respuesta["edificios"] = disponibilidad["edificios"]
+        return respuesta
+
+    def recargar_credenciales(self, solicitud):
+        """Relee autenticacion_DTI.json tras editarlo a mano, sin esperar la revisión periódica.
+        Llega ya autenticada, como cualquier otra solicitud de una facultad."""
+        recargadas = self.auth.recargar(forzar=True)
+        print(f"[DTI] 🔁 Recarga de credenciales solicitada por {solicitud.get('facultad')}: "
+              f"{'OK' if recargadas else 'falló'}")
+        return {"estado": "OK" if recargadas else "Error", "facultades": len(self.auth.credenciales),
+                "servidor": "DTI"}
+
+    def consultar_uso_facultades(self):
+        """Consumo actual de cada facultad frente a su cuota garantizada y su máximo"""
+        recursos, facultades, pendientes = self.actor.ejecutar(
+            lambda: (self.cargar_recursos(), self.almacen.cuotas.resumen(), dict(self.almacen.cuotas.reserva_pendiente)))
+        return {
+            "estado": "OK",
+            "salones_disponibles": recursos["salones_disponibles"],
+            "laboratorios_disponibles": recursos["laboratorios_disponibles"],
+            "otros_disponibles": {nombre: recursos[f"{nombre}_disponibles"] for nombre in self.almacen.tipos.extras},
+            "garantias_pendientes": pendientes,
+            "facultades": facultades,
+            "servidor": "DTI"
+        }
+
     def verificar_conexion_healthcheck(self):
         """Método de prueba para verificar la conexión con HealthCheck"""
         try:
@@ -219,37 +1032,493 @@ class DTI:
         except Exception as e:
             print(f"[DTI] ❌ Error en verificación HealthCheck: {e}")
 
-    def ejecutar(self):
+    def atender_solicitud(self, solicitud, autenticada=False):
+        """Procesa una solicitud y reporta tiempos; la usan el bucle REP, los workers y el modo asyncio"""
+        if solicitud.get("tipo") == "healthcheck":
+            return self.procesar_solicitud(solicitud)
+
+        print(f"[DTI] Nueva solicitud recibida: {solicitud}")
+
+        # Solo mostrar tiempo de procesamiento para solicitudes que NO sean healthcheck
+        self.contexto_hilo.ultimo_commit = None
+        with self.lock_metricas:
+            self.en_proceso += 1
+        inicio = time.time()
+        try:
+            respuesta = self.procesar_solicitud(solicitud, autenticada)
+        finally:
+            fin = time.time()
+            with self.lock_metricas:
+                self.en_proceso -= 1
+        print(f"[DTI] Tiempo de procesamiento: {fin - inicio:.4f} segundos")
+        if self.contexto_hilo.ultimo_commit:
+            latencia_ms, lote = self.contexto_hilo.ultimo_commit
+            promedio_ms, lote_medio = self.almacen.resumen_commits()
+            print(f"[DTI] Commit ({self.modo_durabilidad}): latencia={latencia_ms:.3f} ms | lote={lote} "
+                  f"| promedio={promedio_ms:.3f} ms | lote medio={lote_medio:.2f}")
+
+        with self.lock_metricas:
+            self.solicitudes_atendidas += 1
+            self.latencias_recientes.append((fin - inicio) * 1000)
+            self.ultima_respuesta = time.monotonic()
+        return respuesta
+
+    def estado_salud(self):
+        """Liveness e indicadores de carga sin pasar por la cola ni por self.lock"""
+        with self.lock_metricas:
+            latencias = sorted(self.latencias_recientes)
+            atendidas = self.solicitudes_atendidas
+            en_proceso = self.en_proceso
+            sin_responder_s = time.monotonic() - self.ultima_respuesta
+        return {
+            "estado": "OK",
+            "servidor": "DTI",
+            "modo": self.modo_servidor,
+            "en_cola": len(self.cola_justa),
+            "en_proceso": en_proceso,
+            "latencia_p99_ms": round(latencias[int(len(latencias) * 0.99)], 3) if latencias else 0.0,
+            "espera_cola_p99_ms": round(self.cola_justa.espera_p99_ms(), 3),
+            "sin_responder_s": round(sin_responder_s, 3),
+            "solicitudes_atendidas": atendidas,
+            "rechazadas_ocupado": self.control_admision.total_descartes,
+            "cola_actor": self.actor.pendientes(),
+            "kdf_pendientes": self.pool_kdf.pendientes() if self.pool_kdf is not None else 0,
+            "lista_espera": len(self.lista_espera),
+            "arriendos": len(self.almacen.arriendos),
+            "lsn": self.almacen.lsn,
+            "backup_online": self.backup_online
+        }
+
+    def atender_salud(self):
+        """Hilo del endpoint de salud"""
         try:
             while True:
-                solicitud = self.receptor.recv_json()
+                self.receptor_salud.recv()
+                try:
+                    respuesta = self.estado_salud()
+                except Exception as e:
+                    respuesta = {"estado": "Error", "mensaje": str(e), "servidor": "DTI"}
+                self.receptor_salud.send_json(respuesta)
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            self.receptor_salud.close()
+
+    def _imprimir_throughput(self, anterior, intervalo):
+        with self.lock_metricas:
+            actuales = self.solicitudes_atendidas
+        if self.actor.lotes:
+            print(f"[DTI]    Actor de estado: {self.actor.comandos} comandos en {self.actor.lotes} lotes "
+                  f"(lote medio {self.actor.comandos / self.actor.lotes:.2f})")
+        if actuales != anterior:
+            modos = {"workers": f"workers x{self.num_workers}", "asyncio": "asyncio", "rep": "un hilo + cola justa",
+                     "rep-simple": "REP simple"}
+            print(f"[DTI] 📈 Throughput ({modos[self.modo_servidor]}): {(actuales - anterior) / intervalo:.1f} solicitudes/s")
+        if self.almacen.idempotencia.aciertos:
+            print(f"[DTI]    Reintentos respondidos desde la caché de idempotencia: {self.almacen.idempotencia.aciertos} "
+                  f"(entradas: {len(self.almacen.idempotencia)})")
+        if self.control_admision.total_descartes:
+            print(f"[DTI]    Rechazadas por demora en cola (Ocupado): {self.control_admision.total_descartes}")
+        for facultad, metrica in self.cola_justa.reporte().items():
+            print(f"[DTI]    {facultad} (peso {metrica['peso']}): en cola={metrica['en_cola']} "
+                  f"| atendidas={metrica['atendidas']} | espera media={metrica['espera_media_ms']:.2f} ms "
+                  f"| máx={metrica['espera_max_ms']:.2f} ms")
+        return actuales
+
+    def reportar_throughput(self, intervalo=10):
+        """Imprime periódicamente las solicitudes por segundo del modo activo"""
+        anterior = 0
+        while True:
+            time.sleep(intervalo)
+            anterior = self._imprimir_throughput(anterior, intervalo)
+
+    # Modo ticket: el cliente recibe un ticket de inmediato y la decisión sale por el PUB
+
+    def _ticket_de(self, solicitud):
+        """Ticket de una solicitud en modo ticket, o None si espera la respuesta en línea.
+        Se reusa el id_solicitud para que un reenvío de la facultad caiga en la misma decisión."""
+        if not isinstance(solicitud, dict) or solicitud.get("modo") != "ticket":
+            return None
+        return solicitud.get("id_solicitud") or uuid.uuid4().hex
+
+    def _respuesta_ticket(self, ticket):
+        return {"estado": "En proceso", "ticket": ticket, "servidor": "DTI"}
 
-                if solicitud.get("tipo") != "healthcheck":
-                    print(f"[DTI] Nueva solicitud recibida: {solicitud}")
+    @staticmethod
+    def _sobre_ticket(facultad, ticket):
+        return [SOBRE_TICKET, (facultad or SIN_FACULTAD).encode(), ticket.encode()]
 
-                # Solo mostrar tiempo de procesamiento para solicitudes que NO sean healthcheck
-                if solicitud.get("tipo") == "healthcheck":
-                    respuesta = self.procesar_solicitud(solicitud)
-                    self.receptor.send_json(respuesta)
+    @staticmethod
+    def _con_ticket(sobre, respuesta):
+        """Agrega el ticket a la decisión si la solicitud vino en modo ticket"""
+        if sobre and sobre[0] == SOBRE_TICKET:
+            return dict(respuesta, ticket=sobre[2].decode())
+        return respuesta
+
+    def _entregar(self, sobre, respuesta):
+        """Responde por el receptor o, en modo ticket, publica la decisión con tópico = facultad.
+        En el modo asyncio retorna el awaitable del envío."""
+        datos = json.dumps(self._con_ticket(sobre, respuesta)).encode()
+        if sobre and sobre[0] == SOBRE_TICKET:
+            return self.publicador.send_multipart([sobre[1], datos])
+        return self.receptor.send_multipart(sobre + [datos])
+
+    def _publicar_notificaciones(self):
+        for topico, datos in self._notificaciones_pendientes():
+            self.publicador.send_multipart([topico, datos])
+
+    def _ejecutar_rep(self):
+        """Un solo hilo atiende una solicitud a la vez, en el orden de la cola justa. Entre una
+        y otra se drena el receptor, así la espera en cola se mide y el CoDel también aplica aquí."""
+        while True:
+            if not len(self.cola_justa) and not self.receptor.poll(500):
+                # Sin tráfico: salen las decisiones de arriendos recuperados por vencimiento
+                self._publicar_notificaciones()
+                continue
+            while self.receptor.poll(0):
+                self._recibir_entrada(self.receptor.recv_multipart())
+
+            facultad, frames, espera_ms = self.cola_justa.desencolar()
+            sobre, mensaje = frames[:-1], frames[-1]
+            if self._rechazar_por_demora(facultad, espera_ms):
+                self._entregar(sobre, self._respuesta_ocupado(facultad, espera_ms))
+                continue
+            try:
+                respuesta = self.atender_solicitud(json.loads(mensaje))
+            except ValueError:
+                respuesta = {"estado": "Error", "mensaje": "Solicitud inválida", "servidor": "DTI"}
+            except Exception as e:
+                print(f"[DTI] ❌ Error atendiendo solicitud: {e}")
+                respuesta = {"estado": "Error", "mensaje": str(e), "servidor": "DTI"}
+            self._entregar(sobre, respuesta)
+            self._publicar_notificaciones()
+
+    def _ejecutar_rep_simple(self):
+        """Línea base: socket REP, una solicitud a la vez en orden de llegada, sin cola justa ni
+        rechazo por demora. En modo ticket se contesta el ticket y la decisión se publica después."""
+        while True:
+            if not self.receptor.poll(500):
+                self._publicar_notificaciones()
+                continue
+            mensaje = self.receptor.recv()
+            facultad, _, solicitud = ColaJusta.clasificar(mensaje)
+            sobre = []
+            ticket = self._ticket_de(solicitud)
+            if ticket is not None:
+                self.receptor.send(json.dumps(self._respuesta_ticket(ticket)).encode())
+                sobre = self._sobre_ticket(facultad, ticket)
+            try:
+                respuesta = self.atender_solicitud(json.loads(mensaje))
+            except ValueError:
+                respuesta = {"estado": "Error", "mensaje": "Solicitud inválida", "servidor": "DTI"}
+            except Exception as e:
+                print(f"[DTI] ❌ Error atendiendo solicitud: {e}")
+                respuesta = {"estado": "Error", "mensaje": str(e), "servidor": "DTI"}
+            self._entregar(sobre, respuesta)
+            self._publicar_notificaciones()
+
+    def _recibir_entrada(self, frames):
+        """Pasa un mensaje del receptor a la cola justa. En modo ticket el cliente recibe su
+        ticket ya y el sobre se cambia por el de publicación."""
+        facultad, costo, solicitud = ColaJusta.clasificar(frames[-1])
+        ticket = self._ticket_de(solicitud)
+        if ticket is not None:
+            self.receptor.send_multipart(frames[:-1] + [json.dumps(self._respuesta_ticket(ticket)).encode()])
+            frames = self._sobre_ticket(facultad, ticket) + frames[-1:]
+        self.cola_justa.encolar(facultad, frames, costo)
+
+    def _worker(self, indice):
+        """Worker del pool: autenticación, parseo y formato de respuesta en paralelo.
+        El descuento de recursos lo serializa el actor dueño del estado."""
+        socket = self.context.socket(zmq.DEALER)
+        socket.setsockopt(zmq.LINGER, 0)
+        socket.connect("inproc://workers_dti")
+        socket.send(b"LISTO")
+        try:
+            while True:
+                # [sobre de enrutamiento..., mensaje]
+                frames = socket.recv_multipart()
+                sobre, mensaje = frames[:-1], frames[-1]
+                try:
+                    solicitud = json.loads(mensaje)
+                except ValueError:
+                    solicitud = None
+                    respuesta = {"estado": "Error", "mensaje": "Solicitud inválida", "servidor": "DTI"}
+                try:
+                    if solicitud is not None:
+                        respuesta = self.atender_solicitud(solicitud)
+                except Exception as e:
+                    print(f"[DTI] ❌ Error en worker {indice}: {e}")
+                    respuesta = {"estado": "Error", "mensaje": str(e), "servidor": "DTI"}
+                socket.send_multipart(sobre + [json.dumps(self._con_ticket(sobre, respuesta)).encode()])
+        except zmq.ContextTerminated:
+            pass
+        finally:
+            socket.close()
+
+    def _conexion_al_pool(self, sobre, solicitud):
+        """Con pool de verificación (modos workers y asyncio), una conexión no ocupa un worker ni
+        un hilo mientras corre su PBKDF2: se envía al pool y la respuesta sale de
+        _conexiones_verificadas, en el orden de llegada. Retorna (tomada, respuesta inmediata o None)."""
+        if self.pool_kdf is None or not isinstance(solicitud, dict) or solicitud.get("tipo") != "conexion":
+            return False, None
+        nombre_facultad = solicitud.get("facultad")
+        if not solicitud.get("password"):
+            print(f"[DTI] ✗ Conexión rechazada: Falta contraseña para {nombre_facultad}")
+            return True, {"estado": "Autenticación requerida", "mensaje": "Falta contraseña", "servidor": "DTI"}
+        try:
+            future = self.auth.verificar_facultad_diferido(nombre_facultad, solicitud["password"])
+        except PoolSaturado:
+            return True, self._respuesta_kdf_saturado(solicitud)
+        self.pool_kdf.encolar(future, (sobre, nombre_facultad, time.time()))
+        return True, None
+
+    def _conexiones_verificadas(self):
+        """(sobre, respuesta) de las conexiones cuya verificación terminó, en orden de llegada"""
+        entregas = []
+        for future, (sobre, nombre_facultad, inicio) in self.pool_kdf.listos():
+            es_valida = not future.cancelled() and future.exception() is None and future.result()
+            entregas.append((sobre, self._respuesta_conexion(nombre_facultad, es_valida)))
+            with self.lock_metricas:
+                self.solicitudes_atendidas += 1
+                self.latencias_recientes.append((time.time() - inicio) * 1000)
+                self.ultima_respuesta = time.monotonic()
+        return entregas
+
+    def _rechazar_por_demora(self, facultad, espera_ms):
+        """CoDel sobre la cola justa. Lo que no trae facultad (healthcheck) nunca se descarta."""
+        return (facultad != SIN_FACULTAD
+                and self.control_admision.debe_rechazar(espera_ms, len(self.cola_justa)))
+
+    def _respuesta_ocupado(self, facultad, espera_ms):
+        reintentar_en_ms = self.control_admision.reintentar_en_ms(espera_ms)
+        print(f"[DTI] 🚦 Ocupado: '{facultad}' esperó {espera_ms:.0f} ms en cola - reintentar en {reintentar_en_ms} ms")
+        return {
+            "facultad": facultad,
+            "estado": "Ocupado",
+            "mensaje": "Servidor saturado, reintente más tarde",
+            "reintentar_en_ms": reintentar_en_ms,
+            "servidor": "DTI"
+        }
+
+    def _ejecutar_workers(self):
+        """ROUTER de entrada que reparte solicitudes a workers libres (patrón load-balancing)"""
+        self.backend_workers = self.context.socket(zmq.ROUTER)
+        self.backend_workers.bind("inproc://workers_dti")
+        for i in range(self.num_workers):
+            threading.Thread(target=self._worker, args=(i,), daemon=True).start()
+        print(f"[DTI] 👷 Pool de {self.num_workers} workers activo")
+
+        workers_libres = deque()
+
+        poller = zmq.Poller()
+        poller.register(self.receptor, zmq.POLLIN)
+        poller.register(self.backend_workers, zmq.POLLIN)
+        if self.pool_kdf is not None:
+            poller.register(self.pool_kdf.fileno(), zmq.POLLIN)
+
+        while True:
+            socks = dict(poller.poll(500))
+            if not socks:
+                # Sin tráfico: salen las decisiones de arriendos recuperados por vencimiento
+                self._publicar_notificaciones()
+
+            if self.backend_workers in socks:
+                worker_id, *resto = self.backend_workers.recv_multipart()
+                workers_libres.append(worker_id)
+                if resto and resto[0] == SOBRE_TICKET:
+                    self.publicador.send_multipart([resto[1], resto[-1]])
+                elif resto != [b"LISTO"]:
+                    self.receptor.send_multipart(resto)
+                # El worker encoló sus decisiones diferidas antes de responder
+                self._publicar_notificaciones()
+
+            if self.receptor in socks:
+                # Se drena el socket hacia la cola justa para poder reordenar entre facultades
+                self._recibir_entrada(self.receptor.recv_multipart())
+
+            if self.pool_kdf is not None:
+                for sobre, respuesta in self._conexiones_verificadas():
+                    self._entregar(sobre, respuesta)
+
+            while workers_libres and len(self.cola_justa):
+                facultad, frames, espera_ms = self.cola_justa.desencolar()
+                if self._rechazar_por_demora(facultad, espera_ms):
+                    self._entregar(frames[:-1], self._respuesta_ocupado(facultad, espera_ms))
+                    continue
+                if self.pool_kdf is not None:
+                    tomada, respuesta = self._conexion_al_pool(frames[:-1], ColaJusta.clasificar(frames[-1])[2])
+                    if tomada:
+                        if respuesta is not None:
+                            self._entregar(frames[:-1], respuesta)
+                        continue
+                self.backend_workers.send_multipart([workers_libres.popleft()] + frames)
+
+    async def _atender_async(self, sobre, mensaje):
+        """Atiende una solicitud en el loop: el PBKDF2 y la espera del fsync van al executor"""
+        loop = asyncio.get_running_loop()
+        try:
+            solicitud = json.loads(mensaje)
+            tomada, respuesta = self._conexion_al_pool(sobre, solicitud)
+            if tomada:
+                if respuesta is None:
+                    return  # La entrega _entregar_conexiones_async cuando termine el PBKDF2
+            elif solicitud.get("tipo") == "healthcheck":
+                respuesta = self.procesar_solicitud(solicitud)
+            else:
+                respuesta = await loop.run_in_executor(self.executor, self.autenticar_solicitud, solicitud)
+                if respuesta is None:
+                    respuesta = await loop.run_in_executor(self.executor, self.atender_solicitud, solicitud, True)
+        except ValueError:
+            respuesta = {"estado": "Error", "mensaje": "Solicitud inválida", "servidor": "DTI"}
+        except Exception as e:
+            print(f"[DTI] ❌ Error atendiendo solicitud: {e}")
+            respuesta = {"estado": "Error", "mensaje": str(e), "servidor": "DTI"}
+        await self._entregar(sobre, respuesta)
+        for topico, datos in self._notificaciones_pendientes():
+            await self.publicador.send_multipart([topico, datos])
+
+    def _entregar_conexiones_async(self):
+        """Lector del aviso del pool en el event loop: responde las conexiones verificadas"""
+        for sobre, respuesta in self._conexiones_verificadas():
+            asyncio.ensure_future(self._entregar(sobre, respuesta))
+
+    async def _recibir_solicitudes_async(self):
+        while True:
+            *sobre, mensaje = await self.receptor.recv_multipart()
+            facultad, costo, solicitud = ColaJusta.clasificar(mensaje)
+            ticket = self._ticket_de(solicitud)
+            if ticket is not None:
+                await self.receptor.send_multipart(sobre + [json.dumps(self._respuesta_ticket(ticket)).encode()])
+                sobre = self._sobre_ticket(facultad, ticket)
+            self.cola_justa.encolar(facultad, (sobre, mensaje), costo)
+            self.hay_pendientes.set()
+
+    async def _despachar_async(self):
+        """Consumidor de la cola justa; hay num_workers y cada uno atiende una solicitud a la vez"""
+        while True:
+            while not len(self.cola_justa):
+                self.hay_pendientes.clear()
+                await self.hay_pendientes.wait()
+            facultad, (sobre, mensaje), espera_ms = self.cola_justa.desencolar()
+            if self._rechazar_por_demora(facultad, espera_ms):
+                await self._entregar(sobre, self._respuesta_ocupado(facultad, espera_ms))
+                continue
+            await self._atender_async(sobre, mensaje)
+
+    async def _recibir_sincronizacion_async(self):
+        while True:
+            try:
+                data = await self.pull_backup_sync.recv_json()
+                self._aplicar_sincronizacion_backup(data)
+            except Exception as e:
+                print(f"[DTI] Error recibiendo sincronización desde backup: {e}")
+
+    async def _sincronizacion_completa_diferida(self, espera=2.0):
+        await asyncio.sleep(espera)
+        self.enviar_sincronizacion_completa()
+
+    async def _escuchar_healthcheck_async(self):
+        # Sin polling: la corrutina despierta en cuanto llega el peer_status
+        while True:
+            try:
+                mensaje_completo = await self.subscriber_healthcheck.recv_string()
+                if self._procesar_notificacion_healthcheck(mensaje_completo):
+                    asyncio.create_task(self._sincronizacion_completa_diferida())
+            except Exception as e:
+                print(f"[DTI] ❌ Error procesando notificación HealthCheck: {e}")
+
+    async def _vigilar_arriendos_async(self, intervalo=1.0):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(intervalo)
+            try:
+                await loop.run_in_executor(self.executor, self.recuperar_arriendos_vencidos)
+                for topico, datos in self._notificaciones_pendientes():
+                    await self.publicador.send_multipart([topico, datos])
+            except Exception as e:
+                print(f"[DTI] ❌ Error recuperando arriendos vencidos: {e}")
+
+    async def _reportar_throughput_async(self, intervalo=10):
+        anterior = 0
+        while True:
+            await asyncio.sleep(intervalo)
+            anterior = self._imprimir_throughput(anterior, intervalo)
+
+    async def _ejecutar_asyncio(self):
+        print(f"[DTI] ⚡ Modo asyncio activo (executor de {self.num_workers} hilos)")
+        self.hay_pendientes = asyncio.Event()
+        if self.pool_kdf is not None:
+            asyncio.get_running_loop().add_reader(self.pool_kdf.fileno(), self._entregar_conexiones_async)
+        await asyncio.gather(
+            self._recibir_solicitudes_async(),
+            *(self._despachar_async() for _ in range(self.num_workers)),
+            self._recibir_sincronizacion_async(),
+            self._escuchar_healthcheck_async(),
+            self._vigilar_arriendos_async(),
+            self._reportar_throughput_async()
+        )
+
+    def ejecutar(self):
+        try:
+            if self.es_asyncio:
+                asyncio.run(self._ejecutar_asyncio())
+            elif self.modo_servidor == "workers":
+                threading.Thread(target=self.reportar_throughput, daemon=True).start()
+                threading.Thread(target=self.vigilar_arriendos, daemon=True).start()
+                self._ejecutar_workers()
+            else:
+                threading.Thread(target=self.reportar_throughput, daemon=True).start()
+                threading.Thread(target=self.vigilar_arriendos, daemon=True).start()
+                if self.modo_servidor == "rep-simple":
+                    self._ejecutar_rep_simple()
                 else:
-                    inicio = time.time()
-                    respuesta = self.procesar_solicitud(solicitud)
-                    fin = time.time()
-                    print(f"[DTI] Tiempo de procesamiento: {fin - inicio:.4f} segundos")
-                    self.receptor.send_json(respuesta)
+                    self._ejecutar_rep()
         except KeyboardInterrupt:
             print("\n[DTI] Servidor detenido.")
         finally:
             print("[DTI] Cerrando conexiones...")
             try:
+                self.almacen.cerrar()
                 self.receptor.close()
+                self.publicador.close()
+                if self.modo_servidor == "workers":
+                    self.backend_workers.close()
                 self.push_backup.close()
                 self.pull_backup_sync.close()
                 self.subscriber_healthcheck.close()
+                if self.executor:
+                    self.executor.shutdown(wait=False)
+                if self.pool_kdf is not None:
+                    self.pool_kdf.cerrar()
                 self.context.term()
             except Exception as e:
                 print(f"[DTI] Error al cerrar conexiones: {e}")
 
 if __name__ == "__main__":
-    dti = DTI()
-    dti.ejecutar()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Servidor DTI de asignación de salones")
+    parser.add_argument("--modo", choices=("rep", "rep-simple", "workers", "asyncio"), default="rep",
+                        help="rep: un solo hilo con cola justa y CoDel | rep-simple: socket REP sin cola (línea base) "
+                             "| workers: ROUTER + pool de workers | asyncio: event loop")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Workers del modo workers / corrutinas y executor del modo asyncio")
+    parser.add_argument("--durabilidad", choices=MODOS_DURABILIDAD, default="grupo",
+                        help="fsync por solicitud, commit en grupo o solo buffer del sistema")
+    parser.add_argument("--ventana-grupo-ms", type=float, default=2, help="Ventana del commit en grupo")
+    parser.add_argument("--estado-mapeado", action="store_true",
+                        help="Publica los contadores en un archivo mmap para monitores locales")
+    parser.add_argument("--workers-kdf", type=int, default=0,
+                        help="Workers del pool de verificación de credenciales (0: en el hilo que atiende)")
+    parser.add_argument("--tipo-pool-kdf", choices=("procesos", "hilos"), default="procesos")
+    parser.add_argument("--clave-sesiones", metavar="RUTA",
+                        help="Clave de sesiones compartida con el otro servidor; si falta no arranca")
+    args = parser.parse_args()
+
+    try:
+        dti = DTI(modo_durabilidad=args.durabilidad, ventana_grupo_ms=args.ventana_grupo_ms,
+                  usar_estado_mapeado=args.estado_mapeado, modo_servidor=args.modo, num_workers=args.workers,
+                  workers_kdf=args.workers_kdf, tipo_pool_kdf=args.tipo_pool_kdf,
+                  archivo_clave_sesiones=args.clave_sesiones)
+    except ClaveSesionesInvalida as e:
+        raise SystemExit(f"[DTI] ❌ {e}")
+    dti.ejecutar()
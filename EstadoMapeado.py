@@ -0,0 +1,83 @@
+import mmap
+import os
+import struct
+import time
+import zlib
+
+# Distribución fija del archivo (little-endian, 64 bytes):
+#   magic(4s) versión(H) reservado(H) secuencia(Q) lsn(Q) salones(q) laboratorios(q) checksum(I)
+# La secuencia funciona como seqlock: es impar mientras el servidor escribe y par
+# cuando los valores están completos, así los lectores no necesitan ningún lock.
+MAGIC = b"RCMM"
+VERSION = 1
+TAMANO_ARCHIVO = 64
+CABECERA = struct.Struct("<4sHH")
+SECUENCIA = struct.Struct("<Q")
+VALORES = struct.Struct("<Qqq")  # lsn, salones, laboratorios
+CHECKSUM = struct.Struct("<I")
+
+OFFSET_SECUENCIA = CABECERA.size
+OFFSET_VALORES = OFFSET_SECUENCIA + SECUENCIA.size
+OFFSET_CHECKSUM = OFFSET_VALORES + VALORES.size
+
+
+class EstadoMapeado:
+    """Contadores de recursos en un archivo mapeado en memoria con distribución fija"""
+
+    def __init__(self, ruta, solo_lectura=False):
+        self.ruta = ruta
+        self.solo_lectura = solo_lectura
+
+        if solo_lectura:
+            self.archivo = open(ruta, 'rb')
+            self.mapa = mmap.mmap(self.archivo.fileno(), TAMANO_ARCHIVO, access=mmap.ACCESS_READ)
+            magic, version, _ = CABECERA.unpack_from(self.mapa, 0)
+            if magic != MAGIC or version != VERSION:
+                self.cerrar()
+                raise ValueError(f"{ruta} no es un archivo de estado válido")
+        else:
+            nuevo = not os.path.exists(ruta) or os.path.getsize(ruta) != TAMANO_ARCHIVO
+            self.archivo = open(ruta, 'r+b' if not nuevo else 'w+b')
+            if nuevo:
+                self.archivo.truncate(TAMANO_ARCHIVO)
+            self.mapa = mmap.mmap(self.archivo.fileno(), TAMANO_ARCHIVO, access=mmap.ACCESS_WRITE)
+            CABECERA.pack_into(self.mapa, 0, MAGIC, VERSION, 0)
+            self.secuencia = SECUENCIA.unpack_from(self.mapa, OFFSET_SECUENCIA)[0] & ~1
+
+    def escribir(self, salones, laboratorios, lsn):
+        """Actualiza los contadores en el lugar. Solo la llama el servidor dueño del estado."""
+        valores = VALORES.pack(lsn, salones, laboratorios)
+        self.secuencia += 1
+        SECUENCIA.pack_into(self.mapa, OFFSET_SECUENCIA, self.secuencia)
+        self.mapa[OFFSET_VALORES:OFFSET_CHECKSUM] = valores
+        CHECKSUM.pack_into(self.mapa, OFFSET_CHECKSUM, zlib.crc32(valores))
+        self.secuencia += 1
+        SECUENCIA.pack_into(self.mapa, OFFSET_SECUENCIA, self.secuencia)
+
+    def leer(self, intentos=100):
+        """Lee una copia consistente de los contadores sin bloquear al escritor"""
+        for _ in range(intentos):
+            secuencia = SECUENCIA.unpack_from(self.mapa, OFFSET_SECUENCIA)[0]
+            if secuencia & 1:
+                time.sleep(0)
+                continue
+            valores = self.mapa[OFFSET_VALORES:OFFSET_CHECKSUM]
+            checksum = CHECKSUM.unpack_from(self.mapa, OFFSET_CHECKSUM)[0]
+            if SECUENCIA.unpack_from(self.mapa, OFFSET_SECUENCIA)[0] != secuencia:
+                continue
+            if zlib.crc32(valores) != checksum:
+                continue
+            lsn, salones, laboratorios = VALORES.unpack(valores)
+            return {
+                "salones_disponibles": salones,
+                "laboratorios_disponibles": laboratorios,
+                "lsn": lsn,
+                "secuencia": secuencia
+            }
+        return None
+
+    def cerrar(self):
+        try:
+            self.mapa.close()
+        finally:
+            self.archivo.close()
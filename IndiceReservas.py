@@ -0,0 +1,148 @@
+import struct
+from datetime import datetime
+import numpy as np
+from ArbolIntervalos import ArbolIntervalos
+
+TIPOS_SALA = ("salones", "laboratorios")
+
+# Serialización: cabecera siguiente_id(Q) cantidad(I) + un registro por sala reservada
+CABECERA = struct.Struct("<QI")
+REGISTRO = np.dtype([("id", "<u8"), ("tipo", "u1"), ("sala", "<u4"), ("inicio", "<i8"), ("fin", "<i8")])
+
+
+class IndiceReservas:
+    """Reservas de salas para rangos de tiempo arbitrarios (exámenes, eventos).
+
+    Cada sala guarda sus reservas como intervalos [inicio, fin) disjuntos en un árbol
+    (ArbolIntervalos), así que verificar un conflicto, insertar y cancelar son O(log n):
+    el único intervalo que puede chocar con [t1, t2) es el último que empieza antes de t2.
+
+    Con franjas_de_intervalo (la del inventario por franjas) se cuenta además, por sala,
+    cuántas reservas tocan cada franja de la grilla semanal: así una sala no se reserva
+    por franjas y por rango a la vez para la misma hora."""
+
+    def __init__(self, ids, franjas_de_intervalo=None, num_franjas=0):
+        self.ids = ids  # {tipo: [id de sala]}, los mismos del inventario por franjas
+        self.salas = {tipo: [ArbolIntervalos() for _ in ids[tipo]] for tipo in TIPOS_SALA}
+        self.reservas = {}  # id -> (inicio, fin, {tipo: [índices]})
+        self.siguiente_id = 1
+        self.franjas_de_intervalo = franjas_de_intervalo
+        self.num_franjas = num_franjas
+        # (franja x sala): reservas por rango que tocan esa franja semanal
+        self.tocadas = ({tipo: np.zeros((num_franjas, len(ids[tipo])), dtype=np.int32) for tipo in TIPOS_SALA}
+                        if franjas_de_intervalo else None)
+
+    @staticmethod
+    def _instante(valor):
+        """Segundos desde epoch a partir de un número o de una fecha ISO 8601"""
+        if isinstance(valor, str):
+            return int(datetime.fromisoformat(valor).timestamp())
+        return int(valor)
+
+    def intervalo_de_solicitud(self, solicitud):
+        inicio = self._instante(solicitud["inicio"])
+        fin = self._instante(solicitud["fin"])
+        if fin <= inicio:
+            raise ValueError("El fin debe ser posterior al inicio")
+        return inicio, fin
+
+    def esta_libre(self, tipo, sala, inicio, fin):
+        anterior = self.salas[tipo][sala].anterior(fin)
+        return anterior is None or anterior[1] <= inicio
+
+    def buscar_libres(self, tipo, inicio, fin, cantidad=None, bloqueadas=None):
+        """Índices de las salas sin reservas entre inicio y fin (las primeras `cantidad`).
+        bloqueadas: máscara por sala de las que no se pueden elegir (ocupadas por franjas)."""
+        libres = []
+        if cantidad == 0:
+            return libres
+        for sala in range(len(self.ids[tipo])):
+            if bloqueadas is not None and bloqueadas[sala]:
+                continue
+            if self.esta_libre(tipo, sala, inicio, fin):
+                libres.append(sala)
+                if cantidad is not None and len(libres) == cantidad:
+                    break
+        return libres
+
+    def reservar(self, salones, laboratorios, inicio, fin, bloqueadas=None):
+        """Reserva salas de ambos tipos entre inicio y fin, o nada si no alcanzan. bloqueadas:
+        {tipo: máscara por sala} de las que no se pueden elegir.
+        Retorna (id de reserva o None, {tipo: [índices]})."""
+        if salones < 0 or laboratorios < 0 or salones + laboratorios == 0:
+            return None, {}
+        elegidas = {}
+        for tipo, cantidad in (("salones", salones), ("laboratorios", laboratorios)):
+            libres = self.buscar_libres(tipo, inicio, fin, cantidad, bloqueadas and bloqueadas[tipo])
+            if len(libres) < cantidad:
+                return None, {}
+            elegidas[tipo] = libres
+        id_reserva = self.siguiente_id
+        self.agregar(id_reserva, inicio, fin, elegidas)
+        return id_reserva, elegidas
+
+    def agregar(self, id_reserva, inicio, fin, elegidas):
+        """Inserta una reserva ya decidida (asignación local, WAL o sincronización)"""
+        for tipo, salas in elegidas.items():
+            for sala in salas:
+                self.salas[tipo][sala].agregar(inicio, fin)
+        self._contar_franjas(inicio, fin, elegidas, 1)
+        self.reservas[id_reserva] = (inicio, fin, elegidas)
+        self.siguiente_id = max(self.siguiente_id, id_reserva + 1)
+
+    def cancelar(self, id_reserva):
+        """Libera todas las salas de una reserva. Retorna la reserva eliminada o None."""
+        reserva = self.reservas.pop(id_reserva, None)
+        if reserva is None:
+            return None
+        inicio, fin, elegidas = reserva
+        for tipo, salas in elegidas.items():
+            for sala in salas:
+                self.salas[tipo][sala].quitar(inicio)
+        self._contar_franjas(inicio, fin, elegidas, -1)
+        return reserva
+
+    def _contar_franjas(self, inicio, fin, elegidas, delta):
+        if self.tocadas is None:
+            return
+        franjas = self.franjas_de_intervalo(inicio, fin)
+        if not franjas:
+            return
+        for tipo, salas in elegidas.items():
+            if len(salas):
+                np.add.at(self.tocadas[tipo], np.ix_(franjas, salas), delta)
+
+    def bloqueadas_en_franjas(self, franjas):
+        """{tipo: máscara por sala} de las que tienen una reserva por rango en alguna de las
+        franjas semanales dadas, o None si no se cuentan franjas"""
+        if self.tocadas is None:
+            return None
+        return {tipo: self.tocadas[tipo][franjas].any(axis=0) for tipo in TIPOS_SALA}
+
+    def nombres(self, tipo, indices):
+        return [self.ids[tipo][i] for i in indices]
+
+    def serializar(self):
+        """Una fila por sala reservada; la carga vuelve a insertar cada reserva"""
+        filas = [(id_reserva, t, sala, inicio, fin)
+                 for id_reserva, (inicio, fin, elegidas) in self.reservas.items()
+                 for t, tipo in enumerate(TIPOS_SALA)
+                 for sala in elegidas.get(tipo, [])]
+        return CABECERA.pack(self.siguiente_id, len(filas)) + np.array(filas, dtype=REGISTRO).tobytes()
+
+    def cargar(self, datos):
+        siguiente_id, cantidad = CABECERA.unpack_from(datos)
+        filas = np.frombuffer(datos, dtype=REGISTRO, count=cantidad, offset=CABECERA.size)
+        if cantidad and any((filas["sala"][filas["tipo"] == t] >= len(self.ids[tipo])).any()
+                            for t, tipo in enumerate(TIPOS_SALA)):
+            raise ValueError("Las reservas guardadas no caben en el inventario configurado")
+
+        self.__init__(self.ids, self.franjas_de_intervalo, self.num_franjas)
+        leidas = {}
+        for id_reserva, t, sala, inicio, fin in filas.tolist():
+            if id_reserva not in leidas:
+                leidas[id_reserva] = (inicio, fin, {"salones": [], "laboratorios": []})
+            leidas[id_reserva][2][TIPOS_SALA[t]].append(sala)
+        for id_reserva, (inicio, fin, elegidas) in leidas.items():
+            self.agregar(id_reserva, inicio, fin, elegidas)
+        self.siguiente_id = max(self.siguiente_id, siguiente_id)
@@ -0,0 +1,207 @@
+import json
+import struct
+from datetime import datetime, timedelta
+import numpy as np
+from ArbolFenwick import ArbolFenwick
+
+TIPOS_SALA = ("salones", "laboratorios")
+DIAS = ("lunes", "martes", "miercoles", "jueves", "viernes", "sabado")
+
+# Cabecera de la sección del snapshot: num_salones, num_laboratorios, num_franjas
+DIMENSIONES = struct.Struct("<III")
+
+
+class InventarioSalones:
+    """Salones y laboratorios individuales sobre una grilla semanal de franjas horarias.
+
+    La ocupación de cada tipo es un arreglo booleano (franja x sala), así que buscar
+    N salas libres en un conjunto de franjas o reservarlas son operaciones vectoriales
+    sobre filas contiguas, sin recorrer salas en Python.
+
+    Opcionalmente las salas se ubican en edificios y campus (ruta_ubicacion). Cada edificio
+    ocupa un tramo contiguo de salas de cada tipo y cada campus un tramo contiguo de
+    edificios, así que "libres en el edificio X" es la suma de un rango de columnas: se
+    responde con un árbol de Fenwick de salas libres por franja en O(log n)."""
+
+    def __init__(self, num_salones=380, num_laboratorios=60, franjas_por_dia=14, hora_inicio=7,
+                 ruta_ubicacion=None):
+        self.franjas_por_dia = franjas_por_dia
+        self.hora_inicio = hora_inicio
+        self.num_franjas = len(DIAS) * franjas_por_dia
+        self.ids = {
+            "salones": [f"S{i + 1:04d}" for i in range(num_salones)],
+            "laboratorios": [f"L{i + 1:04d}" for i in range(num_laboratorios)]
+        }
+        self.ocupacion = {
+            tipo: np.zeros((self.num_franjas, len(self.ids[tipo])), dtype=bool)
+            for tipo in TIPOS_SALA
+        }
+        self.edificios = {}  # edificio -> {"campus": nombre, tipo: (inicio, fin)}
+        self.campus = {}  # campus -> {tipo: (inicio, fin)}
+        if ruta_ubicacion:
+            self._cargar_ubicacion(ruta_ubicacion)
+        self._reconstruir_libres()
+
+    def _cargar_ubicacion(self, ruta):
+        """Lee {campus: {edificio: {"salones": n, "laboratorios": m}}} y asigna las salas en
+        orden. Las que sobran quedan fuera de todo edificio (solo cuentan en el total)."""
+        try:
+            with open(ruta, 'r') as f:
+                ubicacion = json.load(f)
+        except FileNotFoundError:
+            return
+        siguiente = {tipo: 0 for tipo in TIPOS_SALA}
+        for campus, edificios in ubicacion.items():
+            inicio_campus = dict(siguiente)
+            for edificio, cantidades in edificios.items():
+                if edificio in self.edificios:
+                    raise ValueError(f"Edificio repetido en {ruta}: {edificio}")
+                self.edificios[edificio] = {"campus": campus}
+                for tipo in TIPOS_SALA:
+                    inicio = siguiente[tipo]
+                    siguiente[tipo] += int(cantidades.get(tipo, 0))
+                    self.edificios[edificio][tipo] = (inicio, siguiente[tipo])
+            self.campus[campus] = {tipo: (inicio_campus[tipo], siguiente[tipo]) for tipo in TIPOS_SALA}
+        for tipo in TIPOS_SALA:
+            if siguiente[tipo] > len(self.ids[tipo]):
+                raise ValueError(f"{ruta} ubica {siguiente[tipo]} {tipo} pero el inventario tiene {len(self.ids[tipo])}")
+
+    def _reconstruir_libres(self):
+        self.libres = {tipo: ArbolFenwick(~self.ocupacion[tipo]) for tipo in TIPOS_SALA}
+
+    def rango(self, tipo, campus=None, edificio=None):
+        """Tramo [inicio, fin) de salas de un tipo en un edificio, un campus o todo el inventario"""
+        if edificio is not None:
+            if edificio not in self.edificios:
+                raise ValueError(f"Edificio desconocido: {edificio}")
+            if campus is not None and self.edificios[edificio]["campus"] != campus:
+                raise ValueError(f"El edificio {edificio} no está en el campus {campus}")
+            return self.edificios[edificio][tipo]
+        if campus is not None:
+            if campus not in self.campus:
+                raise ValueError(f"Campus desconocido: {campus}")
+            return self.campus[campus][tipo]
+        return 0, len(self.ids[tipo])
+
+    def franja(self, dia, hora):
+        """Índice de franja para un día (nombre o número 0-5) y una hora de inicio"""
+        if isinstance(dia, str):
+            dia = DIAS.index(dia.lower())
+        return dia * self.franjas_por_dia + (hora - self.hora_inicio)
+
+    def franjas_de_solicitud(self, solicitud):
+        """Extrae las franjas de una solicitud: "franjas": [i, ...] o "dia" + "hora" (+ "horas")"""
+        if "franjas" in solicitud:
+            franjas = [int(f) for f in solicitud["franjas"]]
+        elif "dia" in solicitud and "hora" in solicitud:
+            hora, horas = int(solicitud["hora"]), int(solicitud.get("horas", 1))
+            # Una reserva no puede pasar al día siguiente
+            if hora < self.hora_inicio or hora + horas > self.hora_inicio + self.franjas_por_dia:
+                raise ValueError(f"Horario fuera de la jornada: {hora}:00 por {horas} h")
+            inicio = self.franja(solicitud["dia"], hora)
+            franjas = list(range(inicio, inicio + horas))
+        else:
+            return None
+        if not franjas or min(franjas) < 0 or max(franjas) >= self.num_franjas:
+            raise ValueError(f"Franjas fuera de la grilla (0-{self.num_franjas - 1}): {franjas}")
+        return franjas
+
+    def franjas_de_intervalo(self, inicio, fin):
+        """Franjas de la grilla semanal que toca el rango [inicio, fin) en segundos desde epoch
+        (hora local). Un rango de una semana o más toca todas."""
+        if fin - inicio >= 7 * 24 * 3600:
+            return list(range(self.num_franjas))
+        franjas = set()
+        hora = datetime.fromtimestamp(inicio).replace(minute=0, second=0, microsecond=0)
+        final = datetime.fromtimestamp(fin)
+        while hora < final:
+            if hora.weekday() < len(DIAS) and self.hora_inicio <= hora.hour < self.hora_inicio + self.franjas_por_dia:
+                franjas.add(self.franja(hora.weekday(), hora.hour))
+            hora += timedelta(hours=1)
+        return sorted(franjas)
+
+    def ocupadas_en_franjas(self, franjas):
+        """{tipo: máscara por sala} de las reservadas en alguna de las franjas dadas"""
+        return {tipo: self.ocupacion[tipo][franjas].any(axis=0) for tipo in TIPOS_SALA}
+
+    def buscar_libres(self, tipo, franjas, cantidad, inicio=0, fin=None, bloqueadas=None):
+        """Índices de las primeras `cantidad` salas libres en todas las franjas dadas,
+        dentro del tramo [inicio, fin). bloqueadas: máscara por sala de las que no se
+        pueden elegir (reservadas por rango en esas franjas)."""
+        fin = len(self.ids[tipo]) if fin is None else fin
+        # Descarte en O(log n) por franja: si en alguna no hay suficientes libres en el tramo,
+        # tampoco puede haberlas libres en todas a la vez
+        if cantidad and self.libres[tipo].rango(franjas, inicio, fin).min() < cantidad:
+            return np.empty(0, dtype=np.int64)
+        ocupadas = self.ocupacion[tipo][franjas, inicio:fin].any(axis=0)
+        if bloqueadas is not None:
+            ocupadas |= bloqueadas[inicio:fin]
+        return np.flatnonzero(~ocupadas)[:cantidad] + inicio
+
+    def libres_por_franja(self, tipo):
+        """Cantidad de salas libres de un tipo en cada franja"""
+        return len(self.ids[tipo]) - self.ocupacion[tipo].sum(axis=1)
+
+    def disponibilidad(self, franjas, campus=None, edificio=None):
+        """Salas libres por franja en el alcance pedido y, si no es un edificio, en cada
+        edificio que contiene"""
+        resultado = {tipo: self.libres[tipo].rango(franjas, *self.rango(tipo, campus, edificio)).tolist()
+                     for tipo in TIPOS_SALA}
+        if edificio is None:
+            resultado["edificios"] = {
+                nombre: {tipo: self.libres[tipo].rango(franjas, *ubicacion[tipo]).tolist() for tipo in TIPOS_SALA}
+                for nombre, ubicacion in self.edificios.items()
+                if campus is None or ubicacion["campus"] == campus
+            }
+        return resultado
+
+    def reservar(self, salones, laboratorios, franjas, campus=None, edificio=None, bloqueadas=None):
+        """Reserva salas de ambos tipos en todas las franjas, o nada si no alcanzan. Con campus
+        o edificio solo se eligen salas de esa ubicación; bloqueadas: {tipo: máscara por sala}
+        de las que no se pueden elegir. Retorna (aceptado, {tipo: [índices]})."""
+        if salones < 0 or laboratorios < 0:
+            return False, {}
+        elegidas = {}
+        for tipo, cantidad in (("salones", salones), ("laboratorios", laboratorios)):
+            indices = self.buscar_libres(tipo, franjas, cantidad, *self.rango(tipo, campus, edificio),
+                                         bloqueadas=bloqueadas and bloqueadas[tipo])
+            if len(indices) < cantidad:
+                return False, {}
+            elegidas[tipo] = indices
+        for tipo, indices in elegidas.items():
+            self.marcar(tipo, indices, franjas, True)
+        return True, {tipo: indices.tolist() for tipo, indices in elegidas.items()}
+
+    def marcar(self, tipo, indices, franjas, ocupado):
+        """Marca (o libera) un conjunto de salas en un conjunto de franjas"""
+        if len(indices):
+            franjas, indices = np.unique(franjas), np.unique(indices)
+            celdas = np.ix_(franjas, indices)
+            # El árbol de libres solo cambia en las celdas que cambian de estado
+            filas, columnas = np.nonzero(self.ocupacion[tipo][celdas] != ocupado)
+            self.ocupacion[tipo][celdas] = ocupado
+            if len(filas):
+                self.libres[tipo].sumar(franjas[filas], indices[columnas], -1 if ocupado else 1)
+
+    def nombres(self, tipo, indices):
+        return [self.ids[tipo][i] for i in indices]
+
+    def serializar(self):
+        """Bitsets empaquetados (8 franjas-sala por byte) para snapshots y sincronización completa"""
+        return (DIMENSIONES.pack(len(self.ids["salones"]), len(self.ids["laboratorios"]), self.num_franjas)
+                + b"".join(np.packbits(self.ocupacion[tipo]).tobytes() for tipo in TIPOS_SALA))
+
+    def cargar(self, datos):
+        """Restaura la ocupación desde serializar(). Falla si cambió el tamaño del inventario."""
+        dimensiones = DIMENSIONES.unpack_from(datos)
+        esperadas = (len(self.ids["salones"]), len(self.ids["laboratorios"]), self.num_franjas)
+        if dimensiones != esperadas:
+            raise ValueError(f"Dimensiones del inventario {dimensiones} != configuradas {esperadas}")
+        offset = DIMENSIONES.size
+        for tipo in TIPOS_SALA:
+            forma = self.ocupacion[tipo].shape
+            largo = (forma[0] * forma[1] + 7) // 8
+            bits = np.frombuffer(datos, dtype=np.uint8, count=largo, offset=offset)
+            self.ocupacion[tipo] = np.unpackbits(bits, count=forma[0] * forma[1]).astype(bool).reshape(forma)
+            offset += largo
+        self._reconstruir_libres()
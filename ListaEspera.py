@@ -0,0 +1,108 @@
+import heapq
+from bisect import bisect_right, insort
+
+INFINITO = float("inf")
+
+
+class ListaEspera:
+    """Solicitudes rechazadas que esperan capacidad, por prioridad y orden de llegada.
+
+    Se indexan por tamaño pedido (salones, laboratorios): cada tamaño tiene su propio heap
+    de (-prioridad, llegada). Al liberarse capacidad solo se miran los tamaños que caben en
+    lo disponible (bisect sobre los tamaños ordenados) y se toma la mejor cabeza entre
+    ellos, sin recorrer la lista completa."""
+
+    def __init__(self, max_entradas=10000):
+        self.max_entradas = max_entradas
+        self.entradas = {}  # id_espera -> entrada
+        self.cubetas = {}  # (salones, laboratorios) -> heap [(-prioridad, id_espera)]; el id crece con la llegada
+        self.tamanos = []  # claves de cubetas no vacías, ordenadas
+        self.por_clave = {}  # clave del llamador (id_solicitud) -> id_espera
+        self.llegadas = 0
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def agregar(self, facultad, salones, laboratorios, prioridad=0, datos=None, clave=None):
+        """Encola una solicitud. Retorna su id_espera, o None si la lista está llena.
+        Con clave, buscar(clave) la encuentra mientras siga en la lista."""
+        if len(self.entradas) >= self.max_entradas:
+            return None
+        self.llegadas += 1
+        id_espera = self.llegadas
+        self.entradas[id_espera] = {
+            "id_espera": id_espera,
+            "facultad": facultad,
+            "salones": salones,
+            "laboratorios": laboratorios,
+            "prioridad": prioridad,
+            "datos": datos or {},
+            "clave": clave
+        }
+        if clave is not None:
+            self.por_clave[clave] = id_espera
+        self._empujar(id_espera, (-prioridad, id_espera))
+        return id_espera
+
+    def _empujar(self, id_espera, item):
+        entrada = self.entradas[id_espera]
+        clave = (entrada["salones"], entrada["laboratorios"])
+        if clave not in self.cubetas:
+            self.cubetas[clave] = []
+            insort(self.tamanos, clave)
+        heapq.heappush(self.cubetas[clave], item)
+
+    def buscar(self, clave):
+        """Entrada que sigue en la lista con esa clave, o None"""
+        return self.entradas.get(self.por_clave.get(clave))
+
+    def cancelar(self, id_espera):
+        """Saca una solicitud de la lista. Su item en el heap se descarta al llegar a la cabeza."""
+        entrada = self.entradas.pop(id_espera, None)
+        if entrada is not None:
+            self.por_clave.pop(entrada["clave"], None)
+        return entrada
+
+    def _cabeza(self, clave):
+        """Cabeza vigente de una cubeta; limpia canceladas y cubetas vacías"""
+        cubeta = self.cubetas[clave]
+        while cubeta and cubeta[0][1] not in self.entradas:
+            heapq.heappop(cubeta)
+        if not cubeta:
+            del self.cubetas[clave]
+            self.tamanos.remove(clave)
+            return None
+        return cubeta[0]
+
+    def atender(self, disponibles, asignar):
+        """Asigna todo lo que ahora cabe, de mayor a menor prioridad.
+
+        disponibles() -> (salones, laboratorios) libres; asignar(entrada) -> bool intenta la
+        asignación real (puede fallar por la cuota de la facultad). Retorna las entradas
+        atendidas; las que no pasaron su cuota vuelven a la lista con su lugar."""
+        atendidas, omitidas = [], []
+        while self.entradas:
+            salones, laboratorios = disponibles()
+            mejor = None
+            for clave in list(self.tamanos[:bisect_right(self.tamanos, (salones, INFINITO))]):
+                if clave[1] > laboratorios:
+                    continue
+                cabeza = self._cabeza(clave)
+                if cabeza is not None and (mejor is None or cabeza < mejor[0]):
+                    mejor = (cabeza, clave)
+            if mejor is None:
+                break
+
+            item, clave = mejor
+            heapq.heappop(self.cubetas[clave])
+            entrada = self.entradas.pop(item[1])
+            if asignar(entrada):
+                self.por_clave.pop(entrada["clave"], None)
+                atendidas.append(entrada)
+            else:
+                omitidas.append((item, entrada))
+
+        for item, entrada in omitidas:
+            self.entradas[entrada["id_espera"]] = entrada
+            self._empujar(entrada["id_espera"], item)
+        return atendidas
@@ -0,0 +1,92 @@
+import base64
+import json
+import secrets
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+
+PBKDF2 = "pbkdf2-sha256"
+SCRYPT = "scrypt"
+LONGITUD_HASH = 32
+POLITICA_POR_DEFECTO = {"kdf": PBKDF2, "iteraciones": 100000, "salt_size": 32}
+SCRYPT_POR_DEFECTO = {"n": 2 ** 14, "r": 8, "p": 1}
+
+# Cada credencial guarda sus propios parámetros junto al salt y el hash:
+#   {"kdf": "pbkdf2-sha256", "iteraciones": 100000, "salt": "<b64>", "hash": "<b64>"}
+#   {"kdf": "scrypt", "n": 16384, "r": 8, "p": 1, "salt": "<b64>", "hash": "<b64>"}
+# Las del formato anterior (un solo base64 de salt + hash) usan "iteraciones" y
+# "salt_size" del encabezado del archivo.
+
+
+def cargar_politica(ruta, nombre="Autenticacion"):
+    """Política de derivación de la instalación; sin archivo, PBKDF2 con 100.000 iteraciones"""
+    politica = dict(POLITICA_POR_DEFECTO)
+    if ruta:
+        try:
+            with open(ruta, 'r') as f:
+                politica.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"[{nombre}] ⚠️ No se pudo cargar la política de {ruta}: {e} - Se usa {describir(politica)}")
+    if politica["kdf"] == SCRYPT:
+        politica = dict(SCRYPT_POR_DEFECTO, **politica)
+    elif politica["kdf"] != PBKDF2:
+        raise ValueError(f"Algoritmo de derivación desconocido: {politica['kdf']}")
+    return politica
+
+
+def parametros(politica):
+    """Parámetros que se guardan con cada credencial derivada bajo la política"""
+    if politica["kdf"] == SCRYPT:
+        return {"kdf": SCRYPT, "n": int(politica["n"]), "r": int(politica["r"]), "p": int(politica["p"])}
+    return {"kdf": PBKDF2, "iteraciones": int(politica["iteraciones"])}
+
+
+def describir(politica):
+    if politica["kdf"] == SCRYPT:
+        return f"scrypt (n={politica['n']}, r={politica['r']}, p={politica['p']})"
+    return f"PBKDF2-SHA256 con {politica['iteraciones']:,} iteraciones"
+
+
+def derivar(password, salt, parametros):
+    if parametros["kdf"] == SCRYPT:
+        kdf = Scrypt(salt=salt, length=LONGITUD_HASH, n=parametros["n"], r=parametros["r"], p=parametros["p"])
+    else:
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=LONGITUD_HASH,
+            salt=salt,
+            iterations=parametros["iteraciones"],
+        )
+    return kdf.derive(password.encode())
+
+
+def verificar(password, salt, hash_original, parametros):
+    """Recalcula la derivación y compara en tiempo constante. Es función de módulo para
+    que el pool de procesos pueda enviarla a sus workers."""
+    return secrets.compare_digest(hash_original, derivar(password, salt, parametros))
+
+
+def codificar(password, politica):
+    """Credencial nueva para guardar en el archivo, con salt único y los parámetros vigentes"""
+    salt = secrets.token_bytes(politica["salt_size"])
+    parametros_vigentes = parametros(politica)
+    return dict(parametros_vigentes,
+                salt=base64.b64encode(salt).decode('utf-8'),
+                hash=base64.b64encode(derivar(password, salt, parametros_vigentes)).decode('utf-8'))
+
+
+def decodificar(valor, iteraciones_archivo, salt_size_archivo):
+    """(parámetros, salt, hash) de una credencial guardada, en cualquiera de los dos formatos"""
+    if isinstance(valor, str):
+        combined = base64.b64decode(valor.encode('utf-8'))
+        return ({"kdf": PBKDF2, "iteraciones": iteraciones_archivo},
+                combined[:salt_size_archivo], combined[salt_size_archivo:])
+    parametros_guardados = {clave: dato for clave, dato in valor.items() if clave not in ("salt", "hash")}
+    return parametros_guardados, base64.b64decode(valor["salt"]), base64.b64decode(valor["hash"])
+
+
+def desactualizada(parametros_guardados, salt, politica):
+    """True si la credencial se derivó con parámetros distintos de los vigentes"""
+    return parametros_guardados != parametros(politica) or len(salt) != politica["salt_size"]
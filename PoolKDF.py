@@ -0,0 +1,106 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from PoliticaKDF import verificar as verificar_kdf
+
+
+class PoolSaturado(Exception):
+    """No hay cupo para otra verificación pendiente"""
+
+
+class PoolKDF:
+    """Pool acotado para las derivaciones de clave de la autenticación.
+
+    Las verificaciones corren en hilos o en procesos (estos últimos no comparten el GIL)
+    y como mucho max_pendientes esperan a la vez: pasado ese límite verificar() lanza
+    PoolSaturado y el llamador contesta "Ocupado" en vez de encolar sin fin. Para un bucle
+    de sockets hay además una tubería en orden: encolar() guarda cada verificación con su
+    contexto, listos() entrega las terminadas en el orden en que se enviaron y fileno()
+    se vuelve legible al terminar cualquiera, así el bucle la registra en su zmq.Poller."""
+
+    def __init__(self, num_workers=2, tipo="procesos", max_pendientes=64, nombre="DTI"):
+        self.num_workers = num_workers
+        self.tipo = tipo
+        self.max_pendientes = max_pendientes
+        if tipo == "procesos":
+            # spawn: el proceso que lo crea ya tiene hilos y sockets ZMQ que no deben heredarse
+            self.executor = ProcessPoolExecutor(max_workers=num_workers,
+                                                mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="kdf")
+        self.lock = threading.Lock()
+        self.en_curso = 0
+
+        self.aviso_lectura, self.aviso_escritura = os.pipe()
+        os.set_blocking(self.aviso_lectura, False)
+        os.set_blocking(self.aviso_escritura, False)
+        self.en_vuelo = deque()  # (future, contexto) en orden de envío
+
+        # Los workers arrancan ya: el pico de verificaciones llega justo tras un failover
+        for future in [self.executor.submit(os.getpid) for _ in range(num_workers)]:
+            future.result()
+        print(f"[{nombre}] 🔐 Pool de verificación de credenciales: {num_workers} {tipo}, "
+              f"hasta {max_pendientes} pendientes")
+
+    def verificar(self, password, salt, hash_original, parametros):
+        """Envía una verificación. Retorna un Future[bool]; PoolSaturado si no hay cupo."""
+        with self.lock:
+            if self.en_curso >= self.max_pendientes:
+                raise PoolSaturado(f"{self.max_pendientes} verificaciones pendientes")
+            self.en_curso += 1
+        try:
+            future = self.executor.submit(verificar_kdf, password, salt, hash_original, parametros)
+        except Exception:
+            self._liberar_cupo()
+            raise
+        future.add_done_callback(self._terminada)
+        return future
+
+    def _liberar_cupo(self):
+        with self.lock:
+            self.en_curso -= 1
+
+    def _terminada(self, future):
+        self._liberar_cupo()
+        self._avisar()
+
+    def _avisar(self):
+        try:
+            os.write(self.aviso_escritura, b"x")
+        except BlockingIOError:
+            pass  # La tubería ya tiene avisos sin leer
+
+    def pendientes(self):
+        return self.en_curso
+
+    # Tubería en orden para el bucle de sockets
+
+    def encolar(self, future, contexto):
+        self.en_vuelo.append((future, contexto))
+        if future.done():
+            self._avisar()  # Ya resuelto sin pasar por el pool (caché, usuario inexistente)
+
+    def fileno(self):
+        return self.aviso_lectura
+
+    def listos(self):
+        """(future, contexto) terminados, en orden de envío. Una verificación lenta retiene
+        a las que vinieron después aunque ya hayan terminado."""
+        try:
+            while os.read(self.aviso_lectura, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        listos = []
+        while self.en_vuelo and self.en_vuelo[0][0].done():
+            listos.append(self.en_vuelo.popleft())
+        return listos
+
+    def cerrar(self):
+        # Se espera a los workers: un aviso tardío escrito en la tubería ya cerrada caería en
+        # el descriptor que el sistema le haya reasignado a otro
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        os.close(self.aviso_lectura)
+        os.close(self.aviso_escritura)
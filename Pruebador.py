@@ -11,6 +11,9 @@ from collections import defaultdict
 import csv
 from datetime import datetime
 import os
+from EstadoMapeado import EstadoMapeado
+from PoolKDF import PoolKDF
+import PoliticaKDF
 
 
 class Pruebador:
@@ -47,6 +50,9 @@ class Pruebador:
             "Facultad de Tecnología": "tecnologia2024"
         }
         
+        # Lectores de los archivos mapeados (recursos_*.mmap) cuando el servidor los publica
+        self.lectores_mapeados = {}
+
         # Facultad por defecto para pruebas
         self.facultad_prueba = "Facultad de Ingeniería"
         self.password_facultad = self.credenciales_facultades[self.facultad_prueba]
@@ -106,6 +112,8 @@ class Pruebador:
         print("19. Información archivos de autenticación")
         print("20. Escenario 1: 5 Facultades - Prueba intensiva (7-2 aulas/labs)")
         print("21. Escenario 2: 5 Facultades - Prueba máxima (10-4 aulas/labs)")
+        print("22. Throughput directo al servidor (REP simple vs un hilo con cola justa vs pool de workers)")
+        print("23. Ráfaga de verificaciones de credenciales (pool KDF 1/2/4/8 workers)")
         print("0.  Salir")
         print("="*60)
         
@@ -852,6 +860,22 @@ class Pruebador:
             if socket:
                 socket.close()
     
+    def _leer_recursos(self, archivo):
+        """Lee los recursos del archivo mapeado si el servidor lo publica, si no del JSON"""
+        ruta_mmap = archivo.replace('.json', '.mmap')
+        if os.path.exists(ruta_mmap):
+            try:
+                if ruta_mmap not in self.lectores_mapeados:
+                    self.lectores_mapeados[ruta_mmap] = EstadoMapeado(ruta_mmap, solo_lectura=True)
+                contenido = self.lectores_mapeados[ruta_mmap].leer()
+                if contenido is not None:
+                    return contenido
+            except Exception as e:
+                print(f"⚠ No se pudo leer {ruta_mmap}: {e}")
+        
+        with open(archivo, 'r') as f:
+            return json.load(f)
+
     def _actualizar_grafica_recursos(self, ax):
         """Actualiza la gráfica de recursos disponibles"""
         recursos_data = []
@@ -860,8 +884,7 @@ class Pruebador:
         for archivo in self.archivos_recursos:
             if os.path.exists(archivo):
                 try:
-                    with open(archivo, 'r') as f:
-                        contenido = json.load(f)
+                    contenido = self._leer_recursos(archivo)
                     
                     nombre = archivo.replace('recursos_', '').replace('.json', '')
                     labels.append(nombre)
@@ -1469,8 +1492,9 @@ class Pruebador:
             except Exception as e:
                 print(f"✗ Error leyendo {archivo}: {e}")
         
-        # Verificar si están sincronizados
-        if len(set(str(sorted(cont.items())) for cont in contenidos.values())) == 1:
+        # Verificar si están sincronizados (el lsn es propio de cada servidor)
+        claves = ("salones_disponibles", "laboratorios_disponibles")
+        if len(set(tuple(cont.get(c) for c in claves) for cont in contenidos.values())) == 1:
             print("✓ Todos los archivos están sincronizados")
         else:
             print("✗ Los archivos NO están sincronizados:")
@@ -1484,8 +1508,7 @@ class Pruebador:
         for archivo in self.archivos_recursos:
             if os.path.exists(archivo):
                 try:
-                    with open(archivo, 'r') as f:
-                        contenido = json.load(f)
+                    contenido = self._leer_recursos(archivo)
                     
                     print(f"\n📁 {archivo}:")
                     print(f"   Salones disponibles: {contenido.get('salones_disponibles', 'N/A')}")
@@ -2014,6 +2037,96 @@ class Pruebador:
             print("   Ejecute DTI.py o facultad.py para crear los archivos")
 
 
+    def prueba_throughput_servidor(self):
+        """Mide solicitudes/s directamente contra un servidor con clientes concurrentes.
+        Ejecutarla con el servidor en --modo rep-simple (línea base: socket REP sin cola), en
+        --modo rep (un hilo con cola justa y CoDel, el modo por defecto) y en --modo workers."""
+        print("\n[THROUGHPUT] Prueba directa contra el servidor (sin broker)")
+        print("Compara modos reiniciando el servidor con --modo rep-simple (REP sin cola), --modo rep "
+              "(un hilo con cola justa y CoDel; puede responder Ocupado) y --modo workers")
+        puerto = int(input("Puerto del servidor (6000 DTI / 5999 Backup, default 6000): ") or "6000")
+        num_clientes = int(input("Clientes concurrentes (default 8): ") or "8")
+        solicitudes_por_cliente = int(input("Solicitudes por cliente (default 25): ") or "25")
+        
+        ip = self._get_ip_for_port(puerto)
+        latencias = []
+        errores = [0]
+        lock = threading.Lock()
+        
+        def cliente(indice):
+            socket = self.context.socket(zmq.REQ)
+            socket.setsockopt(zmq.RCVTIMEO, 10000)
+            socket.setsockopt(zmq.LINGER, 0)
+            socket.connect(f"tcp://{ip}:{puerto}")
+            try:
+                for i in range(solicitudes_por_cliente):
+                    # 0 salones / 0 labs: mide el camino completo sin agotar recursos
+                    solicitud = self._crear_solicitud_autenticada(
+                        programa=f"Throughput {indice}-{i}", salones=0, laboratorios=0
+                    )
+                    inicio = time.time()
+                    socket.send_json(solicitud)
+                    socket.recv_json()
+                    with lock:
+                        latencias.append(time.time() - inicio)
+            except Exception as e:
+                with lock:
+                    errores[0] += 1
+                print(f"  ✗ Cliente {indice}: {e}")
+            finally:
+                socket.close()
+        
+        inicio_total = time.time()
+        hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(num_clientes)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.time() - inicio_total
+        
+        if not latencias:
+            print("✗ No se obtuvieron respuestas")
+            return
+        
+        latencias_ms = np.array(latencias) * 1000
+        print(f"\n--- THROUGHPUT {ip}:{puerto} ---")
+        print(f"Clientes: {num_clientes} | Respuestas: {len(latencias)} | Errores: {errores[0]}")
+        print(f"Throughput: {len(latencias) / duracion:.1f} solicitudes/s")
+        print(f"Latencia p50: {np.percentile(latencias_ms, 50):.2f} ms | p99: {np.percentile(latencias_ms, 99):.2f} ms")
+
+    def prueba_pool_kdf(self):
+        """Ráfaga de verificaciones como la de muchas facultades reconectando tras un failover:
+        en serie y con el pool de hilos y de procesos a 1, 2, 4 y 8 workers. Usa la política
+        de politica_kdf.json, así sirve para ajustar el costo por login al hardware."""
+        print("\n[POOL KDF] Ráfaga de verificaciones de credenciales (local, sin servidores)")
+        rafaga = int(input("Verificaciones por ráfaga (default 64): ") or "64")
+        politica = PoliticaKDF.cargar_politica("politica_kdf.json", nombre="Pruebador")
+        parametros = PoliticaKDF.parametros(politica)
+        salt = os.urandom(politica["salt_size"])
+        hash_original = PoliticaKDF.derivar("ingenieria2024", salt, parametros)
+        print(f"Política: {PoliticaKDF.describir(politica)} | CPUs disponibles: {os.cpu_count()}")
+        
+        inicio = time.time()
+        for _ in range(rafaga):
+            PoliticaKDF.verificar("ingenieria2024", salt, hash_original, parametros)
+        base = rafaga / (time.time() - inicio)
+        print(f"\n{'Modo':<10}{'Workers':>8}{'Verif/s':>12}{'Speedup':>10}")
+        print(f"{'serie':<10}{1:>8}{base:>12.1f}{1.0:>10.2f}")
+        
+        for tipo in ("hilos", "procesos"):
+            for num_workers in (1, 2, 4, 8):
+                pool = PoolKDF(num_workers, tipo, max_pendientes=rafaga, nombre="Pruebador")
+                try:
+                    inicio = time.time()
+                    futures = [pool.verificar("ingenieria2024", salt, hash_original, parametros)
+                               for _ in range(rafaga)]
+                    correctas = sum(future.result() for future in futures)
+                    throughput = rafaga / (time.time() - inicio)
+                finally:
+                    pool.cerrar()
+                aviso = "" if correctas == rafaga else f"  ⚠️ {rafaga - correctas} fallidas"
+                print(f"{tipo:<10}{num_workers:>8}{throughput:>12.1f}{throughput / base:>10.2f}{aviso}")
+
     def ejecutar(self):
         try:
             while True:
@@ -2071,6 +2184,10 @@ class Pruebador:
                         self.escenario_1_prueba_intensiva()
                     elif opcion == "21":
                         self.escenario_2_prueba_maxima()
+                    elif opcion == "22":
+                        self.prueba_throughput_servidor()
+                    elif opcion == "23":
+                        self.prueba_pool_kdf()
                     else:
                         print("❌ Opción no válida")
                     
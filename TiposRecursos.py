@@ -0,0 +1,81 @@
+import json
+import numpy as np
+
+# Siempre primero y en este orden: cuotas, franjas, arriendos y lista de espera trabajan sobre ellos
+BASICOS = ("salones", "laboratorios")
+INICIALES_BASICOS = {"salones": 380, "laboratorios": 60}
+
+
+class TiposRecursos:
+    """Catálogo configurable de tipos de recurso y su cantidad inicial.
+
+    Internamente toda demanda es un vector denso en el orden del catálogo, así que verificar
+    y descontar cuesta lo mismo con dos tipos que con veinte. Las solicitudes traen los tipos
+    extra dispersos ("recursos": {"proyectores": 2}); agregar un tipo es solo agregarlo al
+    archivo."""
+
+    def __init__(self, ruta=None):
+        catalogo = dict(INICIALES_BASICOS)
+        if ruta:
+            try:
+                with open(ruta, 'r') as f:
+                    catalogo.update(json.load(f))
+            except FileNotFoundError:
+                pass
+        self.nombres = list(BASICOS) + [nombre for nombre in catalogo if nombre not in BASICOS]
+        self.extras = self.nombres[len(BASICOS):]
+        self.indice = {nombre: i for i, nombre in enumerate(self.nombres)}
+        self.iniciales = np.array([int(catalogo[nombre]) for nombre in self.nombres], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def vector(self, salones=0, laboratorios=0, otros=None, estricto=True):
+        """Demanda densa a partir de salones, laboratorios y los extra dispersos. Un tipo
+        desconocido o una cantidad negativa es ValueError; con estricto=False (reaplicación
+        del WAL con un catálogo que ya no lo tiene) el tipo se ignora."""
+        if estricto and (int(salones) < 0 or int(laboratorios) < 0):
+            raise ValueError("Cantidad negativa de salones o laboratorios")
+        demanda = np.zeros(len(self.nombres), dtype=np.int64)
+        demanda[0], demanda[1] = salones, laboratorios
+        for nombre, cantidad in (otros or {}).items():
+            if nombre not in self.indice or nombre in BASICOS:
+                if estricto:
+                    raise ValueError(f"Tipo de recurso desconocido: {nombre}")
+                continue
+            if estricto and int(cantidad) < 0:
+                raise ValueError(f"Cantidad negativa de {nombre}")
+            demanda[self.indice[nombre]] = int(cantidad)
+        return demanda
+
+    def matriz(self, salones, laboratorios, otros=None):
+        """Demandas de un lote como matriz (ítems x tipos) y máscara de ítems válidos"""
+        demanda = np.zeros((len(salones), len(self.nombres)), dtype=np.int64)
+        demanda[:, 0] = np.asarray(salones, dtype=np.int64)
+        demanda[:, 1] = np.asarray(laboratorios, dtype=np.int64)
+        validos = np.ones(len(salones), dtype=bool)
+        for i, extra in enumerate(otros or []):
+            if not extra:
+                continue
+            try:
+                demanda[i] = self.vector(demanda[i, 0], demanda[i, 1], extra)
+            except (ValueError, TypeError, AttributeError):
+                validos[i] = False
+        return demanda, validos & (demanda >= 0).all(axis=1)
+
+    def otros(self, vector, con_ceros=False):
+        """Parte dispersa de los tipos extra de un vector: {nombre: cantidad}"""
+        return {nombre: int(vector[self.indice[nombre]]) for nombre in self.extras
+                if con_ceros or vector[self.indice[nombre]]}
+
+    def como_recursos(self, vector):
+        """Vista por nombre con las claves de siempre: {"<tipo>_disponibles": cantidad}"""
+        return {f"{nombre}_disponibles": int(valor) for nombre, valor in zip(self.nombres, vector)}
+
+    def desde_recursos(self, recursos, base):
+        """Vector a partir de una vista por nombre; los tipos que no trae conservan base"""
+        vector = np.array(base, dtype=np.int64)
+        for nombre, i in self.indice.items():
+            if f"{nombre}_disponibles" in recursos:
+                vector[i] = recursos[f"{nombre}_disponibles"]
+        return vector
@@ -30,6 +30,8 @@ class BrokerBalanceador:
         }
         
         self.servidores_activos = ["dti", "backup"]
+        # Servidores que respondieron "Ocupado": no reciben solicitudes nuevas hasta esta hora
+        self.ocupado_hasta = {"dti": 0.0, "backup": 0.0}
         self.indice_actual = 0
         self.lock = threading.Lock()
         self.mapa_respuestas = {}
@@ -43,7 +45,8 @@ class BrokerBalanceador:
             "solicitudes_backup": 0,
             "errores": 0,
             "timeouts": 0,
-            "failovers": 0
+            "failovers": 0,
+            "ocupados": 0
         }
         
         print("[Broker] 🚀 Inicializando Broker Balanceador...")
@@ -90,13 +93,16 @@ class BrokerBalanceador:
                 print(f"[Broker] ❌ Error en notificaciones: {e}")
                 time.sleep(1)
     
-    def seleccionar_servidor(self):
-        """Selecciona el siguiente servidor usando Round-Robin"""
+    def seleccionar_servidor(self, excluir=None):
+        """Selecciona el siguiente servidor usando Round-Robin, saltando los que están ocupados"""
         with self.lock:
-            if not self.servidores_activos:
+            ahora = time.time()
+            candidatos = [s for s in self.servidores_activos
+                          if s != excluir and self.ocupado_hasta.get(s, 0.0) <= ahora]
+            if not candidatos:
                 return None, None
             
-            servidor = self.servidores_activos[self.indice_actual % len(self.servidores_activos)]
+            servidor = candidatos[self.indice_actual % len(candidatos)]
             socket_destino = self.servidores[servidor]
             
             # Avanzar al siguiente servidor
@@ -158,6 +164,11 @@ class BrokerBalanceador:
         """Envía solicitud con capacidad de failover automático"""
         servidor, socket_destino = self.seleccionar_servidor()
         
+        if not servidor and self._todos_ocupados():
+            # Mejor responder ya con la sugerencia que mandar más carga a un servidor saturado
+            self._responder_ocupado(identidad, facultad)
+            return
+
         if not servidor or not socket_destino:
             print(f"[Broker] ❌ Sin servidores para '{facultad}' - Rechazando solicitud")
             
@@ -200,6 +211,26 @@ class BrokerBalanceador:
     
 
 
+    def _todos_ocupados(self):
+        with self.lock:
+            ahora = time.time()
+            return bool(self.servidores_activos) and all(
+                self.ocupado_hasta.get(s, 0.0) > ahora for s in self.servidores_activos)
+
+    def _responder_ocupado(self, identidad, facultad):
+        with self.lock:
+            espera = min(self.ocupado_hasta.get(s, 0.0) for s in self.servidores_activos) - time.time()
+        print(f"[Broker] 🚦 Servidores ocupados - '{facultad}' debe reintentar en {espera * 1000:.0f} ms")
+        respuesta = json.dumps({
+            "estado": "Ocupado",
+            "mensaje": "Servidores saturados, reintente más tarde",
+            "reintentar_en_ms": max(0, int(espera * 1000)),
+            "facultad": facultad
+        }).encode()
+        self.frontend.send_multipart([identidad, b'', respuesta])
+        self.mapa_respuestas.pop(identidad, None)
+        self.estadisticas["ocupados"] += 1
+
     def _verificar_timeouts(self):
         """Verifica timeouts y ejecuta failover automático"""
         tiempo_actual = time.time()
@@ -270,9 +301,11 @@ class BrokerBalanceador:
             
             # Limpiar solicitud pendiente ya que recibimos respuesta
             with self.lock:
-                if identidad in self.solicitudes_pendientes:
-                    del self.solicitudes_pendientes[identidad]
+                datos = self.solicitudes_pendientes.pop(identidad, None)
             
+            if self._manejar_ocupado(servidor_nombre, identidad, respuesta, datos):
+                return
+
             if identidad in self.mapa_respuestas:
                 # Reenviar respuesta a la facultad
                 frontend_socket = self.mapa_respuestas[identidad]
@@ -297,6 +330,36 @@ class BrokerBalanceador:
 
 
 
+    def _manejar_ocupado(self, servidor_nombre, identidad, respuesta, datos):
+        """Si el servidor respondió "Ocupado", lo aparta por el tiempo sugerido y prueba el otro
+        una sola vez. Retorna True si la solicitud se reenvió."""
+        try:
+            resp_data = json.loads(respuesta.decode())
+        except ValueError:
+            return False
+        if resp_data.get("estado") != "Ocupado":
+            return False
+
+        reintentar_en = resp_data.get("reintentar_en_ms", 500) / 1000.0
+        with self.lock:
+            self.ocupado_hasta[servidor_nombre] = time.time() + reintentar_en
+        self.estadisticas["ocupados"] += 1
+        print(f"[Broker] 🚦 {servidor_nombre.upper()} ocupado por {reintentar_en * 1000:.0f} ms")
+
+        if not datos or datos["intentos"] >= 2:
+            return False
+        otro, socket_otro = self.seleccionar_servidor(excluir=servidor_nombre)
+        if not otro:
+            # El otro tampoco puede: la facultad recibe el "Ocupado" con la sugerencia
+            return False
+
+        socket_otro.send_multipart([identidad, b'', datos["mensaje"]])
+        with self.lock:
+            self.solicitudes_pendientes[identidad] = dict(datos, servidor=otro, timestamp=time.time(), intentos=2)
+        self.estadisticas["solicitudes_dti" if otro == "dti" else "solicitudes_backup"] += 1
+        print(f"[Broker] 🔀 Reintento en {otro.upper()} para '{datos['facultad']}' ({servidor_nombre.upper()} ocupado)")
+        return True
+
     def mostrar_estadisticas(self):
         """Muestra estadísticas del broker cada 30 segundos"""
         while True:
@@ -309,12 +372,13 @@ class BrokerBalanceador:
                 errores = self.estadisticas["errores"]
                 timeouts = self.estadisticas["timeouts"]
                 failovers = self.estadisticas["failovers"]
+                ocupados = self.estadisticas["ocupados"]
                 pendientes = len(self.solicitudes_pendientes)
                 
                 print(f"\n[Broker] 📊 ESTADÍSTICAS:")
                 print(f"    Servidores activos: {activos}/2 {self.servidores_activos}")
                 print(f"    Solicitudes: Total={total} | DTI={dti} | Backup={backup}")
-                print(f"    Problemas: Errores={errores} | Timeouts={timeouts} | Failovers={failovers}")
+                print(f"    Problemas: Errores={errores} | Timeouts={timeouts} | Failovers={failovers} | Ocupados={ocupados}")
                 print(f"    Pendientes: {pendientes} | Mapeadas: {len(self.mapa_respuestas)}")
 
                 
@@ -1,30 +1,62 @@
+import argparse
 import zmq
 import json
 import time
+import random
+import uuid
 import getpass
 from AutenticacionFacultad import AutenticacionFacultad
+from PoolKDF import PoolKDF, PoolSaturado
 
 class Facultad:
-    def __init__(self, nombre, puerto):
+    MAX_REINTENTOS_OCUPADO = 3  # Reintentos cuando el DTI responde "Ocupado"
+    TIMEOUT_TICKET_S = 15  # Sin decisión publicada en este tiempo se reenvía (mismo id_solicitud)
+    MAX_REENVIOS_TICKET = 2
+    TIMEOUT_LISTA_ESPERA_S = 120  # En lista de espera se confirma con un reenvío (menor que el TTL de idempotencia)
+    DURACION_ARRIENDO_S = 60
+    MARGEN_ARRIENDO_S = 5  # Se deja de aprobar localmente antes del vencimiento (el DTI recupera con gracia después)
+    INTERVALO_ARRIENDO_S = 2  # Cada cuánto se informa lo aprobado localmente y se repone el bloque
+
+    def __init__(self, nombre, puerto, modo_ticket=False, arriendo=None, workers_kdf=0, tipo_pool_kdf="procesos"):
         self.nombre = nombre
         self.puerto = puerto
         self.context = zmq.Context()
         self.password_facultad = None
+        # Token firmado que entrega el DTI al conectar: las solicitudes lo llevan en lugar de
+        # la contraseña, así el PBKDF2 corre una vez por conexión y no por solicitud
+        self.token_sesion = None
+        # Modo ticket: el DTI responde un ticket al instante y publica la decisión después,
+        # así la facultad puede tener muchas solicitudes de programas en vuelo a la vez
+        self.modo_ticket = modo_ticket
+        self.tickets = {}  # ticket -> {"sobre", "solicitud", "inicio", "vence", "reenvios", "ocupado"}
+        self.proxima_revision = 0.0
+        # Arriendo de cupo: (salones, laboratorios) que se mantienen arrendados al DTI para
+        # aprobar localmente sin ida y vuelta. El consumo y la reposición van aparte.
+        self.bloque_arriendo = arriendo
+        self.arriendo = None  # {"salones", "laboratorios", "vence"} saldo local, o None
+        self.consumo_sin_reportar = {"salones": 0, "laboratorios": 0}
+        self.proximo_arriendo = 0.0
         
 
         
 
-        # Sistema de autenticación para programas
-        self.auth = AutenticacionFacultad(nombre)
+        # Sistema de autenticación para programas. Con workers_kdf > 0 el PBKDF2 va a un pool
+        # y el bucle sigue recibiendo programas mientras se verifican las credenciales
+        self.pool_kdf = PoolKDF(workers_kdf, tipo_pool_kdf, nombre=nombre) if workers_kdf else None
+        self.auth = AutenticacionFacultad(nombre, pool=self.pool_kdf)
 
         # Sockets
-        self.socket_rep = self.context.socket(zmq.REP)
+        # En modo ticket o con pool el frente es ROUTER para contestar a cada programa cuando
+        # llegue su decisión o termine su verificación
+        self.usa_router = modo_ticket or self.pool_kdf is not None
+        self.socket_rep = self.context.socket(zmq.ROUTER if self.usa_router else zmq.REP)
         self.socket_req = self.context.socket(zmq.REQ)
         self.socket_sub = self.context.socket(zmq.SUB)
 
         self._solicitar_password_facultad()
         self.configurar_conexiones()
         self.notificar_conexion()
+        self._revisar_arriendo()
 
     def _solicitar_password_facultad(self):
         """Solicita la contraseña de la facultad al administrador"""
@@ -42,13 +74,16 @@ class Facultad:
     def configurar_conexiones(self):
         self.socket_rep.bind(f"tcp://*:{self.puerto}")
         self.socket_req.connect("tcp://10.43.96.34:7001")  # Conexión al Broker
+        # Decisiones del modo ticket publicadas por el DTI y por el backup
         self.socket_sub.connect("tcp://10.43.103.206:6001")
+        self.socket_sub.connect("tcp://10.43.102.243:5996")
         self.socket_sub.setsockopt_string(zmq.SUBSCRIBE, self.nombre)
 
-        print(f"[{self.nombre}] Facultad activa en puerto {self.puerto}.")
+        print(f"[{self.nombre}] Facultad activa en puerto {self.puerto}"
+              + (" (modo ticket)." if self.modo_ticket else "."))
 
     def notificar_conexion(self):
-        """Notifica la conexión al DTI con autenticación"""
+        """Notifica la conexión al DTI con autenticación y guarda el token de sesión"""
         mensaje = {
             "tipo": "conexion", 
             "facultad": self.nombre,
@@ -56,10 +91,11 @@ class Facultad:
         }
         
         try:
-            self.socket_req.send_json(mensaje)
-            respuesta = self.socket_req.recv_json()
+            # Tras un failover muchas facultades reconectan a la vez: "Ocupado" se reintenta
+            respuesta = self.enviar_al_dti(mensaje)
             
             if respuesta.get("estado") == "Conexión aceptada":
+                self.token_sesion = respuesta.get("token_sesion")
                 print(f"[{self.nombre}] ✓ Autenticada exitosamente en el DTI")
                 #self.auth.mostrar_credenciales_iniciales()
             else:
@@ -71,49 +107,102 @@ class Facultad:
             print(f"[{self.nombre}] ✗ Error conectando al DTI: {e}")
             exit(1)
 
+    def _renovar_sesion(self):
+        """Repite la conexión para obtener un token nuevo. Retorna True si lo obtuvo."""
+        respuesta = self.enviar_al_dti({"tipo": "conexion", "facultad": self.nombre, "password": self.password_facultad})
+        if respuesta.get("estado") != "Conexión aceptada":
+            print(f"[{self.nombre}] ✗ No se pudo renovar la sesión: {respuesta.get('mensaje', respuesta.get('estado'))}")
+            return False
+        self.token_sesion = respuesta.get("token_sesion")
+        print(f"[{self.nombre}] 🔑 Sesión renovada con {respuesta.get('servidor')}")
+        return True
+
+    def enviar_al_dti(self, solicitud_dti, reintentar_ocupado=True):
+        """Envía al DTI; si responde Ocupado espera lo sugerido y reintenta (acotado). Con
+        reintentar_ocupado=False el Ocupado se retorna de una vez: el bucle de tickets programa
+        el reintento sin dormir. Si el token de sesión venció se renueva una vez y se reenvía."""
+        sesion_renovada = False
+        for intento in range(self.MAX_REINTENTOS_OCUPADO + 1 if reintentar_ocupado else 1):
+            self.socket_req.send_json(solicitud_dti)
+            respuesta = self.socket_req.recv_json()
+            if respuesta.get("renovar_sesion") and not sesion_renovada and self._renovar_sesion():
+                sesion_renovada = True
+                solicitud_dti["token_sesion"] = self.token_sesion
+                self.socket_req.send_json(solicitud_dti)
+                respuesta = self.socket_req.recv_json()
+            if (respuesta.get("estado") != "Ocupado" or not reintentar_ocupado
+                    or intento == self.MAX_REINTENTOS_OCUPADO):
+                return respuesta
+            # Jitter para que las facultades rechazadas no vuelvan todas a la vez
+            espera = respuesta.get("reintentar_en_ms", 500) / 1000.0 * random.uniform(1.0, 1.5)
+            print(f"[{self.nombre}] 🚦 DTI ocupado - Reintento {intento + 1}/{self.MAX_REINTENTOS_OCUPADO} en {espera:.2f} s")
+            time.sleep(espera)
+        return respuesta
+
+    def _faltan_credenciales(self, solicitud):
+        """Retorna la respuesta de error si la solicitud no trae usuario y contraseña, o None"""
+        if not solicitud.get("usuario") or not solicitud.get("password_programa"):
+            print(f"[{self.nombre}] ✗ Solicitud rechazada: Faltan credenciales")
+            return {
+                "estado": "Error de autenticación",
+                "mensaje": "Usuario y contraseña requeridos"
+            }
+        return None
+
+    def _autenticar_programa(self, solicitud):
+        """Retorna la respuesta de error si el programa no se autentica, o None"""
+        respuesta_error = self._faltan_credenciales(solicitud)
+        if respuesta_error is not None:
+            return respuesta_error
+        return self._resultado_autenticacion(
+            solicitud["usuario"], self.auth.verificar_programa(solicitud["usuario"], solicitud["password_programa"]))
+
+    def _resultado_autenticacion(self, usuario, es_valida):
+        if not es_valida:
+            print(f"[{self.nombre}] ✗ Solicitud rechazada: Credenciales inválidas para {usuario}")
+            return {
+                "estado": "Acceso denegado",
+                "mensaje": "Credenciales inválidas"
+            }
+
+        print(f"[{self.nombre}] ✓ Programa autenticado: {usuario}")
+        return None
+
+    def _preparar_solicitud_dti(self, solicitud):
+        # Agregar credenciales de la facultad a la solicitud: el token de sesión, o la
+        # contraseña si el DTI no entregó token
+        solicitud_dti = solicitud.copy()
+        if self.token_sesion:
+            solicitud_dti["token_sesion"] = self.token_sesion
+        else:
+            solicitud_dti["password_facultad"] = self.password_facultad
+        # Clave de idempotencia: los reintentos y el failover del broker reusan la misma
+        solicitud_dti["id_solicitud"] = uuid.uuid4().hex
+        return solicitud_dti
+
     def escuchar_solicitudes(self):
         print(f"[{self.nombre}] Esperando solicitudes académicas...")
         try:
+            if self.usa_router:
+                self._escuchar_con_router()
+                return
+
             while True:
+                self._revisar_arriendo()
+                if not self.socket_rep.poll(200):
+                    continue
                 solicitud = self.socket_rep.recv_json()
                 print(f"[{self.nombre}] Solicitud recibida del programa: {solicitud}")
 
                 # Verificar autenticación del programa
-                usuario = solicitud.get("usuario")
-                password_programa = solicitud.get("password_programa")
-                
-                if not usuario or not password_programa:
-                    respuesta_error = {
-                        "estado": "Error de autenticación",
-                        "mensaje": "Usuario y contraseña requeridos"
-                    }
-                    self.socket_rep.send_json(respuesta_error)
-                    print(f"[{self.nombre}] ✗ Solicitud rechazada: Faltan credenciales")
-                    continue
-                
-                if not self.auth.verificar_programa(usuario, password_programa):
-                    respuesta_error = {
-                        "estado": "Acceso denegado",
-                        "mensaje": "Credenciales inválidas"
-                    }
+                respuesta_error = self._autenticar_programa(solicitud)
+                if respuesta_error is not None:
                     self.socket_rep.send_json(respuesta_error)
-                    print(f"[{self.nombre}] ✗ Solicitud rechazada: Credenciales inválidas para {usuario}")
                     continue
 
-                print(f"[{self.nombre}] ✓ Programa autenticado: {usuario}")
-
-                # Agregar credenciales de la facultad a la solicitud
-                solicitud_dti = solicitud.copy()
-                solicitud_dti["password_facultad"] = self.password_facultad
-                
-                # Enviar solicitud al DTI y medir el tiempo de respuesta
-                inicio = time.time()
-                self.socket_req.send_json(solicitud_dti)
-                respuesta = self.socket_req.recv_json()
-                fin = time.time()
-
-                print(f"[{self.nombre}] Respuesta recibida del DTI: {respuesta}")
-                print(f"[{self.nombre}] Tiempo de respuesta del DTI: {fin - inicio:.4f} segundos")
+                respuesta = self._aprobar_con_arriendo(solicitud)
+                if respuesta is None:
+                    respuesta = self._atender_en_linea(solicitud)
 
                 self.socket_rep.send_json(respuesta)
                 print(f"[{self.nombre}] Respuesta enviada al programa académico.\n")
@@ -123,11 +212,321 @@ class Facultad:
         finally:
             self.cerrar()
 
+    def _atender_en_linea(self, solicitud):
+        """Envía la solicitud al DTI y espera su decisión"""
+        solicitud_dti = self._preparar_solicitud_dti(solicitud)
+        
+        # Enviar solicitud al DTI y medir el tiempo de respuesta
+        inicio = time.time()
+        respuesta = self.enviar_al_dti(solicitud_dti)
+        fin = time.time()
+
+        print(f"[{self.nombre}] Respuesta recibida del DTI: {respuesta}")
+        print(f"[{self.nombre}] Tiempo de respuesta del DTI: {fin - inicio:.4f} segundos")
+        return respuesta
+
+    # Frente ROUTER: modo ticket y/o pool de verificación
+
+    def _escuchar_con_router(self):
+        """Atiende programas, decisiones publicadas y verificaciones terminadas a la vez; el
+        REQ hacia el broker solo se ocupa lo que tarda el DTI en entregar el ticket (o la
+        decisión, sin modo ticket)"""
+        poller = zmq.Poller()
+        poller.register(self.socket_rep, zmq.POLLIN)
+        poller.register(self.socket_sub, zmq.POLLIN)
+        if self.pool_kdf is not None:
+            poller.register(self.pool_kdf.fileno(), zmq.POLLIN)
+
+        while True:
+            socks = dict(poller.poll(200))
+
+            if self.socket_rep in socks:
+                *sobre, mensaje = self.socket_rep.recv_multipart()
+                self._recibir_programa(sobre, mensaje)
+
+            if self.socket_sub in socks:
+                _, datos = self.socket_sub.recv_multipart()
+                self._recibir_decision(json.loads(datos))
+
+            if self.pool_kdf is not None:
+                # En el orden en que llegaron los programas
+                for future, (sobre, solicitud) in self.pool_kdf.listos():
+                    es_valida = not future.cancelled() and future.exception() is None and future.result()
+                    self._continuar_programa(sobre, solicitud,
+                                             self._resultado_autenticacion(solicitud["usuario"], es_valida))
+
+            self._revisar_tickets()
+            self._revisar_arriendo()
+
+    def _responder_programa(self, sobre, respuesta):
+        self.socket_rep.send_multipart(sobre + [json.dumps(respuesta).encode()])
+
+    def _recibir_programa(self, sobre, mensaje):
+        try:
+            solicitud = json.loads(mensaje)
+        except ValueError:
+            self._responder_programa(sobre, {"estado": "Error", "mensaje": "Solicitud inválida"})
+            return
+        print(f"[{self.nombre}] Solicitud recibida del programa: {solicitud}")
+
+        if self.pool_kdf is None:
+            self._continuar_programa(sobre, solicitud, self._autenticar_programa(solicitud))
+            return
+
+        respuesta_error = self._faltan_credenciales(solicitud)
+        if respuesta_error is not None:
+            self._responder_programa(sobre, respuesta_error)
+            return
+        try:
+            future = self.auth.verificar_programa_diferido(solicitud["usuario"], solicitud["password_programa"])
+        except PoolSaturado:
+            print(f"[{self.nombre}] 🚦 Ocupado: {self.pool_kdf.pendientes()} verificaciones pendientes")
+            self._responder_programa(sobre, {
+                "estado": "Ocupado",
+                "mensaje": "Verificación de credenciales saturada, reintente más tarde",
+                "reintentar_en_ms": 200
+            })
+            return
+        self.pool_kdf.encolar(future, (sobre, solicitud))
+
+    def _continuar_programa(self, sobre, solicitud, respuesta_error):
+        """Sigue con una solicitud cuya autenticación ya terminó"""
+        if respuesta_error is not None:
+            self._responder_programa(sobre, respuesta_error)
+            return
+
+        respuesta = self._aprobar_con_arriendo(solicitud)
+        if respuesta is not None:
+            self._responder_programa(sobre, respuesta)
+            return
+
+        if not self.modo_ticket:
+            self._responder_programa(sobre, self._atender_en_linea(solicitud))
+            print(f"[{self.nombre}] Respuesta enviada al programa académico.\n")
+            return
+
+        solicitud_dti = self._preparar_solicitud_dti(solicitud)
+        solicitud_dti["modo"] = "ticket"
+        self.tickets[solicitud_dti["id_solicitud"]] = {
+            "sobre": sobre, "solicitud": solicitud_dti, "inicio": time.time(),
+            "vence": 0.0, "reenvios": 0, "ocupado": 0
+        }
+        self._pedir_ticket(solicitud_dti["id_solicitud"])
+
+    def _pedir_ticket(self, id_solicitud):
+        """Envía (o reenvía) la solicitud; el DTI contesta con el ticket sin procesarla aún.
+        Un Ocupado no se espera aquí: el reenvío lo hace _revisar_tickets cuando vence la espera,
+        y mientras tanto el bucle sigue atendiendo a los demás programas."""
+        entrada = self.tickets[id_solicitud]
+        respuesta = self.enviar_al_dti(entrada["solicitud"], reintentar_ocupado=False)
+        if respuesta.get("estado") == "Ocupado" and self._programar_reintento(id_solicitud, entrada, respuesta):
+            return
+        if respuesta.get("estado") != "En proceso":
+            # Sin ticket (broker sin servidores, Ocupado persistente...): se contesta de una vez
+            del self.tickets[id_solicitud]
+            self._responder_programa(entrada["sobre"], respuesta)
+            return
+        entrada["vence"] = time.time() + self.TIMEOUT_TICKET_S
+        print(f"[{self.nombre}] 🎫 Ticket {respuesta['ticket']} de {respuesta.get('servidor')} "
+              f"- En vuelo: {len(self.tickets)}")
+
+    def _recibir_decision(self, decision):
+        entrada = self.tickets.get(decision.get("ticket"))
+        if entrada is None:
+            return  # Ya atendida (decisión repetida tras un reenvío)
+
+        ticket = decision["ticket"]
+        if decision.get("renovar_sesion") and not entrada.get("sesion_renovada") and self._renovar_sesion():
+            entrada["sesion_renovada"] = True
+            entrada["solicitud"]["token_sesion"] = self.token_sesion
+            self._pedir_ticket(ticket)
+            return
+
+        if decision.get("estado") == "Ocupado" and self._programar_reintento(ticket, entrada, decision):
+            return
+
+        if decision.get("estado") == "En espera":
+            # La asignación llega por este mismo canal cuando se libere capacidad. El reenvío
+            # periódico (mismo id_solicitud) solo confirma que sigue en la lista; si el servidor
+            # se reinició o cayó, la vuelve a encolar en el que la reciba.
+            entrada["vence"] = time.time() + self.TIMEOUT_LISTA_ESPERA_S
+            entrada["reenvio_programado"] = True
+            print(f"[{self.nombre}] ⏳ Ticket {ticket} en lista de espera (id {decision.get('id_espera')}, "
+                  f"{decision.get('en_espera')} en espera)")
+            return
+
+        del self.tickets[ticket]
+        print(f"[{self.nombre}] Decisión publicada por el DTI: {decision}")
+        print(f"[{self.nombre}] Tiempo hasta la decisión: {time.time() - entrada['inicio']:.4f} segundos")
+        self._responder_programa(entrada["sobre"], decision)
+        print(f"[{self.nombre}] Respuesta enviada al programa académico.\n")
+
+    def _programar_reintento(self, ticket, entrada, respuesta):
+        """Programa el reenvío de un ticket rechazado con Ocupado para cuando venza la espera
+        sugerida, con jitter como en enviar_al_dti. Retorna False si ya no quedan reintentos."""
+        if entrada["ocupado"] >= self.MAX_REINTENTOS_OCUPADO:
+            return False
+        entrada["ocupado"] += 1
+        espera = respuesta.get("reintentar_en_ms", 500) / 1000.0 * random.uniform(1.0, 1.5)
+        entrada["vence"] = time.time() + espera
+        entrada["reenvio_programado"] = True  # Este reenvío no cuenta como timeout
+        print(f"[{self.nombre}] 🚦 DTI ocupado - Ticket {ticket} se reenvía en {espera:.2f} s "
+              f"({entrada['ocupado']}/{self.MAX_REINTENTOS_OCUPADO})")
+        return True
+
+    def _revisar_tickets(self):
+        """Reenvía los tickets vencidos; el id_solicitud hace que el DTI no asigne dos veces"""
+        ahora = time.time()
+        if ahora < self.proxima_revision:
+            return
+        self.proxima_revision = ahora + 0.2
+
+        for ticket, entrada in list(self.tickets.items()):
+            if entrada["vence"] > ahora:
+                continue
+            if not entrada.pop("reenvio_programado", False):
+                entrada["reenvios"] += 1
+            if entrada["reenvios"] > self.MAX_REENVIOS_TICKET:
+                del self.tickets[ticket]
+                print(f"[{self.nombre}] ❌ Ticket {ticket} sin decisión del DTI")
+                self._responder_programa(entrada["sobre"], {
+                    "estado": "Error",
+                    "mensaje": "Sin decisión del DTI",
+                    "ticket": ticket
+                })
+                continue
+            print(f"[{self.nombre}] ⏰ Ticket {ticket} - Reenvío (timeouts: {entrada['reenvios']})")
+            self._pedir_ticket(ticket)
+
+    # Arriendo de cupo
+
+    def _aprobar_con_arriendo(self, solicitud):
+        """Aprueba contra el saldo arrendado sin pasar por el DTI. Retorna la respuesta, o None
+        si la solicitud tiene que ir al DTI (sin saldo, por vencer o no es una asignación simple)."""
+        if self.arriendo is None or any(campo in solicitud for campo in ("tipo", "franjas", "dia", "recursos")):
+            return None
+        try:
+            salones = int(solicitud.get("salones", 0))
+            laboratorios = int(solicitud.get("laboratorios", 0))
+        except (TypeError, ValueError):
+            return None
+        if (salones < 0 or laboratorios < 0
+                or time.time() > self.arriendo["vence"] - self.MARGEN_ARRIENDO_S
+                or salones > self.arriendo["salones"] or laboratorios > self.arriendo["laboratorios"]):
+            return None
+
+        self.arriendo["salones"] -= salones
+        self.arriendo["laboratorios"] -= laboratorios
+        self.consumo_sin_reportar["salones"] += salones
+        self.consumo_sin_reportar["laboratorios"] += laboratorios
+        print(f"[{self.nombre}] 📦 Aprobada con el arriendo local - Saldo: {self.arriendo['salones']} salones, "
+              f"{self.arriendo['laboratorios']} laboratorios")
+        return {
+            "facultad": self.nombre,
+            "programa": solicitud.get("programa", "Desconocido"),
+            "estado": "Aceptado",
+            "salones": salones,
+            "laboratorios": laboratorios,
+            "servidor": self.nombre,
+            "desde_arriendo": True
+        }
+
+    def _revisar_arriendo(self):
+        """Fuera del camino de las solicitudes: informa lo aprobado localmente y repone el
+        bloque cuando baja el saldo o se acerca el vencimiento"""
+        if self.bloque_arriendo is None:
+            return
+        ahora = time.time()
+        if ahora < self.proximo_arriendo:
+            return
+        self.proximo_arriendo = ahora + self.INTERVALO_ARRIENDO_S
+
+        if self.arriendo is not None:
+            bloque_s, bloque_l = self.bloque_arriendo
+            saldo_bajo = self.arriendo["salones"] < bloque_s / 2 or self.arriendo["laboratorios"] < bloque_l / 2
+            por_vencer = self.arriendo["vence"] - ahora < self.DURACION_ARRIENDO_S / 2
+            if not (saldo_bajo or por_vencer or any(self.consumo_sin_reportar.values())):
+                return
+        self._renovar_arriendo()
+
+    def _renovar_arriendo(self):
+        bloque_s, bloque_l = self.bloque_arriendo
+        saldo_s = self.arriendo["salones"] if self.arriendo else 0
+        saldo_l = self.arriendo["laboratorios"] if self.arriendo else 0
+        consumido, self.consumo_sin_reportar = self.consumo_sin_reportar, {"salones": 0, "laboratorios": 0}
+        solicitud_dti = self._preparar_solicitud_dti({
+            "tipo": "renovar_arriendo" if self.arriendo is not None else "arrendar",
+            "facultad": self.nombre,
+            "salones": max(0, bloque_s - saldo_s),
+            "laboratorios": max(0, bloque_l - saldo_l),
+            "duracion_s": self.DURACION_ARRIENDO_S,
+            "consumido": consumido
+        })
+        respuesta = self.enviar_al_dti(solicitud_dti)
+        self._informar_consumo_tardio(respuesta)
+
+        if respuesta.get("estado") == "Arrendado":
+            # El saldo del DTI ya descuenta lo informado y nada se aprobó mientras tanto
+            self.arriendo = {
+                "salones": respuesta["saldo"]["salones"],
+                "laboratorios": respuesta["saldo"]["laboratorios"],
+                "vence": time.time() + respuesta["vence_en_s"]
+            }
+            print(f"[{self.nombre}] 📦 Arriendo vigente: {self.arriendo['salones']} salones, "
+                  f"{self.arriendo['laboratorios']} laboratorios por {respuesta['vence_en_s']:.0f} s")
+        elif respuesta.get("estado") == "Sin arriendo":
+            # Lo consumido ya quedó registrado en el DTI (consumo_tardio); solo se descarta el saldo
+            if self.arriendo is not None:
+                print(f"[{self.nombre}] ⚠️ El DTI ya había recuperado el arriendo - Saldo local descartado")
+            self.arriendo = None
+        else:
+            # No llegó al DTI: lo consumido se informa en el próximo intento
+            for tipo, cantidad in consumido.items():
+                self.consumo_sin_reportar[tipo] += cantidad
+            print(f"[{self.nombre}] ⚠️ No se pudo renovar el arriendo: {respuesta.get('mensaje', respuesta.get('estado'))}")
+
+    def _informar_consumo_tardio(self, respuesta):
+        """Lo aprobado localmente que llegó al DTI después de que recuperara el arriendo se cobra
+        como una asignación normal; si ya no cabía, esas aprobaciones quedaron sin cupo"""
+        tardio = respuesta.get("consumo_tardio")
+        if tardio is None:
+            return
+        if tardio["aceptado"]:
+            print(f"[{self.nombre}] 📦 {tardio['salones']} salones y {tardio['laboratorios']} laboratorios aprobados "
+                  f"localmente se cobraron como asignación (el arriendo ya estaba recuperado)")
+        else:
+            print(f"[{self.nombre}] ❌ {tardio['salones']} salones y {tardio['laboratorios']} laboratorios aprobados "
+                  f"localmente quedaron sin cupo en el DTI: el arriendo se recuperó antes de informarlos")
+
+    def _devolver_arriendo(self):
+        """Al cerrar: informa lo aprobado y devuelve el saldo para que no espere al vencimiento"""
+        solicitud_dti = self._preparar_solicitud_dti({
+            "tipo": "devolver_arriendo",
+            "facultad": self.nombre,
+            "consumido": self.consumo_sin_reportar
+        })
+        try:
+            self.socket_req.send_json(solicitud_dti)
+            if self.socket_req.poll(2000):
+                respuesta = self.socket_req.recv_json()
+                self._informar_consumo_tardio(respuesta)
+                print(f"[{self.nombre}] 📦 Arriendo devuelto: {respuesta.get('salones')} salones, "
+                      f"{respuesta.get('laboratorios')} laboratorios")
+                return
+        except zmq.ZMQError as e:
+            print(f"[{self.nombre}] ⚠️ No se pudo devolver el arriendo: {e}")
+        print(f"[{self.nombre}] ⚠️ Sin respuesta del DTI - El arriendo se recupera al vencer")
+        self.socket_req.setsockopt(zmq.LINGER, 0)
+
     def cerrar(self):
+        if self.arriendo is not None:
+            self._devolver_arriendo()
         self.socket_rep.close()
         self.socket_req.close()
         self.socket_sub.close()
         self.context.term()
+        if self.pool_kdf is not None:
+            self.pool_kdf.cerrar()
 
 # Esta función va fuera de la clase
 def seleccionar_facultad():
@@ -159,6 +558,18 @@ def seleccionar_facultad():
             print("Ingrese un número válido.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Facultad: recibe solicitudes de programas y las envía al DTI")
+    parser.add_argument("--modo-ticket", action="store_true",
+                        help="El DTI responde un ticket al instante y publica la decisión después")
+    parser.add_argument("--arriendo", type=int, nargs=2, metavar=("SALONES", "LABORATORIOS"),
+                        help="Bloque de cupo arrendado al DTI para aprobar localmente")
+    parser.add_argument("--workers-kdf", type=int, default=0,
+                        help="Workers del pool de verificación de contraseñas de programas (0: en el bucle)")
+    parser.add_argument("--tipo-pool-kdf", choices=("procesos", "hilos"), default="procesos")
+    args = parser.parse_args()
+
     nombre, puerto = seleccionar_facultad()
-    facultad = Facultad(nombre, puerto)
+    facultad = Facultad(nombre, puerto, modo_ticket=args.modo_ticket,
+                        arriendo=tuple(args.arriendo) if args.arriendo else None,
+                        workers_kdf=args.workers_kdf, tipo_pool_kdf=args.tipo_pool_kdf)
     facultad.escuchar_solicitudes()
\ No newline at end of file
@@ -1,13 +1,15 @@
 import zmq
 import time
 import json
-import threading
 
 # Configuración de servidores
 DTI_IP = "10.43.103.206"
 DTI_PORT = 6000
 BACKUP_IP = "10.43.102.243"
 BACKUP_PORT = 5999
+# Endpoints de salud dedicados: no hacen fila detrás de las asignaciones
+DTI_HEALTH_PORT = 6010
+BACKUP_HEALTH_PORT = 5997
 BROKER_PUB_PORT = 7000
 
 # Nuevos puertos para notificar a los servidores
@@ -16,6 +18,7 @@ BACKUP_NOTIFICATION_PORT = 5998 # Puerto para notificar al Backup
 
 INTERVALO = 3   # segundos entre chequeos
 TIMEOUT = 2.0   # timeout de espera
+MAX_SIN_RESPONDER = 10.0  # s con trabajo pendiente y sin atender nada: servidor colgado
 
 context = zmq.Context()
 
@@ -54,7 +57,22 @@ def probar_servidor(nombre, ip, puerto):
         # Verificar respuesta válida
         estado_ok = respuesta.get("estado") == "OK"
         servidor_info = respuesta.get("servidor", "Desconocido")
-        print(f"[HealthCheck] ✅ {nombre} ({ip}:{puerto}) - {servidor_info}: {respuesta}")
+
+        # El endpoint responde aunque el servidor esté saturado; solo se da de baja si tiene
+        # trabajo pendiente y lleva demasiado sin terminar ninguna solicitud
+        pendientes = respuesta.get("en_cola", 0) + respuesta.get("en_proceso", 0)
+        if estado_ok and pendientes and respuesta.get("sin_responder_s", 0) > MAX_SIN_RESPONDER:
+            print(f"[HealthCheck] ❌ {nombre} ({ip}:{puerto}) - {servidor_info}: colgado "
+                  f"({pendientes} pendientes, {respuesta['sin_responder_s']:.1f}s sin responder)")
+            return False
+
+        if "latencia_p99_ms" in respuesta:
+            print(f"[HealthCheck] ✅ {nombre} ({ip}:{puerto}) - {servidor_info}: "
+                  f"en cola={respuesta.get('en_cola')} | en proceso={respuesta.get('en_proceso')} "
+                  f"| p99={respuesta['latencia_p99_ms']:.1f} ms | espera p99={respuesta.get('espera_cola_p99_ms', 0.0):.1f} ms "
+                  f"| atendidas={respuesta.get('solicitudes_atendidas')} | ocupado={respuesta.get('rechazadas_ocupado')}")
+        else:
+            print(f"[HealthCheck] ✅ {nombre} ({ip}:{puerto}) - {servidor_info}: {respuesta}")
         return estado_ok
         
     except zmq.Again:
@@ -158,6 +176,7 @@ def monitorear_servidores():
     print("[HealthCheck] 🚀 Iniciando monitor de servidores mejorado...")
     print(f"[HealthCheck] ⏰ Intervalo: {INTERVALO}s | Timeout: {TIMEOUT}s")
     print(f"[HealthCheck] 📡 Puerto broker: {BROKER_PUB_PORT}")
+    print(f"[HealthCheck] 💓 Salud DTI: {DTI_HEALTH_PORT} | Salud Backup: {BACKUP_HEALTH_PORT}")
     print(f"[HealthCheck] 📡 Puerto notif DTI: {DTI_NOTIFICATION_PORT}")
     print(f"[HealthCheck] 📡 Puerto notif Backup: {BACKUP_NOTIFICATION_PORT}")
     print("=" * 70)
@@ -173,8 +192,8 @@ def monitorear_servidores():
             
             # Verificar estado de ambos servidores
             estado_actual = {
-                "dti": probar_servidor("DTI Principal", DTI_IP, DTI_PORT),
-                "backup": probar_servidor("DTI Backup", BACKUP_IP, BACKUP_PORT)
+                "dti": probar_servidor("DTI Principal", DTI_IP, DTI_HEALTH_PORT),
+                "backup": probar_servidor("DTI Backup", BACKUP_IP, BACKUP_HEALTH_PORT)
             }
             
             # Crear lista para el broker
@@ -143,6 +143,25 @@ class ProgramaAcademico:
         while True:
             try:
                 salones_input = input("\nIngrese el número de salones necesarios: ")
+                if salones_input.strip().lower() == "lote":
+                    items = [{"programa": self.programa,
+                              "salones": random.randint(0, 30),
+                              "laboratorios": random.randint(0, 20)} for _ in range(20)]
+                    modo_lote = input("Modo del lote (todo_o_nada / mejor_esfuerzo) [mejor_esfuerzo]: ").strip() or "mejor_esfuerzo"
+                    self.enviar_lote(items, modo_lote)
+                    continue
+                if salones_input.strip().lower() == "franja":
+                    self.solicitar_franja()
+                    continue
+                if salones_input.strip().lower() == "liberar":
+                    self.solicitar_liberacion()
+                    continue
+                if salones_input.strip().lower() == "espera":
+                    self.solicitar_con_espera()
+                    continue
+                if salones_input.strip().lower() == "otros":
+                    self.solicitar_otros_recursos()
+                    continue
                 if salones_input.strip().lower() == "prueba":
                     for _ in range(20):
                         salones = random.randint(0, 30)
@@ -172,7 +191,62 @@ class ProgramaAcademico:
     
         return salones, laboratorios
 
-    def enviar_solicitud(self, salones, laboratorios):
+    def solicitar_franja(self):
+        """Pide salas concretas para un día y una hora de la grilla semanal"""
+        try:
+            dia = input("Día (lunes-sabado): ").strip().lower()
+            hora = int(input("Hora de inicio (7-20): "))
+            horas = int(input("Duración en horas [1]: ").strip() or 1)
+            salones = int(input("Salones: "))
+            laboratorios = int(input("Laboratorios: "))
+        except ValueError:
+            print("Ingrese un número válido.")
+            return
+        franja = {"dia": dia, "hora": hora, "horas": horas}
+        # Opcional: solo salas de un edificio (o de cualquier edificio de un campus)
+        edificio = input("Edificio [cualquiera]: ").strip()
+        campus = input("Campus [cualquiera]: ").strip() if not edificio else ""
+        if edificio:
+            franja["edificio"] = edificio
+        if campus:
+            franja["campus"] = campus
+        self.enviar_solicitud(salones, laboratorios, franja=franja)
+
+    def solicitar_otros_recursos(self):
+        """Pide salones y laboratorios junto con otros tipos de recurso (proyectores, auditorios...)"""
+        try:
+            salones = int(input("Salones: "))
+            laboratorios = int(input("Laboratorios: "))
+            texto = input("Otros recursos (ej. proyectores=2, auditorios=1): ")
+            otros = {nombre.strip(): int(cantidad) for nombre, cantidad
+                     in (par.split("=") for par in texto.split(",") if par.strip())}
+        except ValueError:
+            print("Use el formato tipo=cantidad separado por comas.")
+            return
+        self.enviar_solicitud(salones, laboratorios, campos={"recursos": otros})
+
+    def solicitar_liberacion(self):
+        """Devuelve salones y laboratorios asignados antes; con ellos se atiende la lista de espera"""
+        try:
+            salones = int(input("Salones a liberar: "))
+            laboratorios = int(input("Laboratorios a liberar: "))
+        except ValueError:
+            print("Ingrese un número válido.")
+            return
+        self.enviar_solicitud(salones, laboratorios, campos={"tipo": "liberar"})
+
+    def solicitar_con_espera(self):
+        """Pide recursos y, si no hay cupo, queda en lista de espera hasta que se liberen"""
+        try:
+            salones = int(input("Salones: "))
+            laboratorios = int(input("Laboratorios: "))
+            prioridad = int(input("Prioridad (mayor se atiende primero) [0]: ").strip() or 0)
+        except ValueError:
+            print("Ingrese un número válido.")
+            return
+        self.enviar_solicitud(salones, laboratorios, campos={"lista_espera": True, "prioridad": prioridad})
+
+    def enviar_solicitud(self, salones, laboratorios, franja=None, campos=None):
         solicitud = {
             "facultad": self.facultad,
             "programa": self.programa,
@@ -181,6 +255,10 @@ class ProgramaAcademico:
             "usuario": self.usuario,
             "password_programa": self.password_programa
         }
+        if franja:
+            solicitud.update(franja)
+        if campos:
+            solicitud.update(campos)
         
         print(f"\n[{self.programa}] Enviando solicitud: {solicitud}")
         
@@ -200,6 +278,38 @@ class ProgramaAcademico:
         except Exception as e:
             print(f"[{self.programa}] Error enviando solicitud: {e}")
 
+    def enviar_lote(self, items, modo_lote="mejor_esfuerzo"):
+        """Envía varias solicitudes en un solo mensaje; el DTI responde el resultado de cada una"""
+        solicitud = {
+            "tipo": "lote",
+            "facultad": self.facultad,
+            "programa": self.programa,
+            "modo_lote": modo_lote,
+            "solicitudes": items,
+            "usuario": self.usuario,
+            "password_programa": self.password_programa
+        }
+        
+        print(f"\n[{self.programa}] Enviando lote de {len(items)} solicitudes ({modo_lote})")
+        
+        try:
+            inicio = time.time()
+            self.socket.send_json(solicitud)
+            respuesta = self.socket.recv_json()
+            fin = time.time()
+            
+            if respuesta.get("estado") in ["Error de autenticación", "Acceso denegado", "Error"]:
+                print(f"[{self.programa}] ✗ {respuesta['estado']}: {respuesta.get('mensaje', '')}")
+                return
+            
+            for i, resultado in enumerate(respuesta.get("resultados", []), 1):
+                print(f"  {i:2}. Salones={resultado['salones']:2} Labs={resultado['laboratorios']:2} -> {resultado['estado']}")
+            print(f"[{self.programa}] Aceptadas: {respuesta.get('aceptadas')}/{respuesta.get('total')}")
+            print(f"[{self.programa}] Tiempo de respuesta del lote: {fin - inicio:.4f} segundos\n")
+                
+        except Exception as e:
+            print(f"[{self.programa}] Error enviando lote: {e}")
+
     def ejecutar(self):
         self.autenticar_usuario()
         programas = self.seleccionar_facultad()